@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Офлайн-бенчмарк пропускной способности extract_vacancy_ids.py и src/fetch_vacancies.py
+на локальной заглушке API HH.ru (src/hh_stub.py).
+Usage: python benchmark.py --vacancies 3000 --concurrency 1 8 32
+"""
+import asyncio
+import csv
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from hh_stub import HHStubServer, StubConfig
+from http_client import BASE_URL_ENV
+from fetch_vacancies import VacancyFetcher
+from extract_vacancy_ids import VacancyIDExtractor
+
+
+def print_result(mode: str, count: int, elapsed: float, metrics, rate_limiter):
+    """Печатает строку отчета: вакансий в секунду и p95 задержки"""
+    p95 = max((stats['p95_ms'] or 0 for stats in metrics.summary().values()), default=0)
+    print(f"{mode:<28} {count:>7} vacancies  {count / elapsed:>9.1f} vac/s  "
+          f"p95 {p95:>7.1f} ms  throttled {rate_limiter.throttle_events}")
+
+
+async def bench_ids(workdir: str, concurrency: int, rps: float):
+    """Сбор ID поиском (с разбиением на срезы и параллельными страницами)"""
+    extractor = VacancyIDExtractor(os.path.join(workdir, "ids.csv"), rps=rps, max_rps=rps,
+                                   concurrency=concurrency, db_path=os.path.join(workdir, f"ids_{concurrency}.db"))
+    async with extractor:
+        start = time.perf_counter()
+        vacancies = await extractor.extract_all_vacancy_ids("benchmark")
+        elapsed = time.perf_counter() - start
+    extractor.save_to_csv(vacancies)
+    print_result(f"ids (concurrency={concurrency})", len(vacancies), elapsed,
+                 extractor.metrics, extractor.rate_limiter)
+    return [v['id'] for v in vacancies]
+
+
+async def bench_fetch(workdir: str, vacancy_ids: List[str], concurrency: int, rps: float):
+    """Загрузка деталей вакансий в свежую БД"""
+    csv_file = os.path.join(workdir, "ids.csv")
+    with open(csv_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id"])
+        writer.writerows([vid] for vid in vacancy_ids)
+
+    db_path = os.path.join(workdir, f"fetch_{concurrency}.db")
+    fetcher = VacancyFetcher(csv_file, db_path, concurrency=concurrency, rps=rps, max_rps=rps,
+                             cache_dir=os.path.join(workdir, f"raw_cache_{concurrency}"))
+    async with fetcher:
+        start = time.perf_counter()
+        await fetcher.run()
+        elapsed = time.perf_counter() - start
+    print_result(f"fetch (concurrency={concurrency})", len(vacancy_ids), elapsed,
+                 fetcher.metrics, fetcher.rate_limiter)
+
+
+async def run_benchmark(args):
+    config = StubConfig(args.vacancies, args.latency, args.jitter, args.throttle_rate,
+                        args.retry_after, args.cassette)
+    with HHStubServer(config) as server, tempfile.TemporaryDirectory() as workdir:
+        os.environ[BASE_URL_ENV] = server.base_url
+        print(f"Stub {server.base_url}: {args.vacancies} vacancies, latency {args.latency}s, "
+              f"429 rate {args.throttle_rate}, rps cap {args.rps}")
+
+        vacancy_ids: List[str] = []
+        for concurrency in args.concurrency:
+            vacancy_ids = await bench_ids(workdir, concurrency, args.rps)
+
+        fetch_ids = vacancy_ids[:args.fetch_limit] if args.fetch_limit else vacancy_ids
+        for concurrency in args.concurrency:
+            await bench_fetch(workdir, fetch_ids, concurrency, args.rps)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Offline throughput benchmark against a local HH API stand-in')
+    parser.add_argument('--vacancies', type=int, default=3000, help='Number of synthetic vacancies')
+    parser.add_argument('--latency', type=float, default=0.05, help='Stub response latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.02, help='Extra random stub latency (seconds)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=0.5, help='Retry-After for injected 429s')
+    parser.add_argument('--cassette', help='Replay this cassette before falling back to synthetic data')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help='Worker counts to compare')
+    parser.add_argument('--rps', type=float, default=500.0, help='Request rate cap for every mode')
+    parser.add_argument('--fetch-limit', type=int, default=500, help='How many vacancies to fetch per fetch mode')
+
+    args = parser.parse_args()
+
+    # Бенчмарк печатает только итоговые строки
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
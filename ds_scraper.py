@@ -1,14 +1,47 @@
-import pandas as pd
-import requests
+import asyncio
+import csv
 import json
+import os
+import sys
 import time
-from typing import Dict, Any, Optional, List
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Set
+import httpx
 import pyarrow as pa
 import pyarrow.parquet as pq
 
-def extract_vacancy_data(vacancy_json: Dict[str, Any]) -> Dict[str, Any]:
-    """Извлекает нужные поля из JSON ответа API HH.ru"""
-    
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from rate_limiter import RateLimiter, THROTTLE_STATUSES, parse_retry_after
+from http_client import ClientMetrics, create_client
+
+# Схема итогового hh_vacancies_data.parquet
+VACANCY_SCHEMA = pa.schema([
+    ('employer_id', pa.string()),
+    ('employer_name', pa.string()),
+    ('id', pa.string()),
+    ('name', pa.string()),
+    ('area_name', pa.string()),
+    ('salary_from', pa.float64()),
+    ('salary_to', pa.float64()),
+    ('salary_currency', pa.string()),
+    ('salary_gross', pa.bool_()),
+    ('experience_name', pa.string()),
+    ('work_format', pa.list_(pa.string())),
+    ('raw_json', pa.string()),
+    ('key_skills', pa.list_(pa.string())),
+    # HTML описания отдельной колонкой, чтобы следующие этапы не разбирали raw_json
+    ('description', pa.string()),
+])
+
+# Сколько строк пишем одной row group и сколько строк держим в одном файле-части
+ROW_GROUP_SIZE = 50
+PART_SIZE = 1000
+
+
+def extract_vacancy_data(raw: bytes) -> Dict[str, Any]:
+    """Извлекает нужные поля из ответа API HH.ru; сам ответ сохраняется в raw_json как есть"""
+    vacancy_json = json.loads(raw)
+
     def safe_get(obj, *keys):
         """Безопасно извлекает вложенные значения"""
         for key in keys:
@@ -16,22 +49,22 @@ def extract_vacancy_data(vacancy_json: Dict[str, Any]) -> Dict[str, Any]:
                 return None
             obj = obj.get(key)
         return obj
-    
+
     # Извлекаем salary информацию
     salary = vacancy_json.get('salary')
     salary_from = safe_get(salary, 'from') if salary else None
     salary_to = safe_get(salary, 'to') if salary else None
     salary_currency = safe_get(salary, 'currency') if salary else None
     salary_gross = safe_get(salary, 'gross') if salary else None
-    
+
     # Извлекаем key_skills как список строк
     key_skills = vacancy_json.get('key_skills', [])
     key_skills_list = [skill.get('name', '') for skill in key_skills] if key_skills else []
-    
+
     # Извлекаем work_format
     work_format_list = vacancy_json.get('work_format', [])
     work_format = [wf.get('name', '') for wf in work_format_list] if work_format_list else []
-    
+
     return {
         'employer_id': safe_get(vacancy_json, 'employer', 'id'),
         'employer_name': safe_get(vacancy_json, 'employer', 'name'),
@@ -44,97 +77,239 @@ def extract_vacancy_data(vacancy_json: Dict[str, Any]) -> Dict[str, Any]:
         'salary_gross': salary_gross,
         'experience_name': safe_get(vacancy_json, 'experience', 'name'),
         'work_format': work_format,
-        'raw_json': json.dumps(vacancy_json, ensure_ascii=False),
-        'key_skills': key_skills_list
+        'raw_json': raw.decode('utf-8'),
+        'key_skills': key_skills_list,
+        'description': vacancy_json.get('description')
     }
 
-def fetch_vacancy(vacancy_id: str, max_retries: int = 3) -> Optional[Dict[str, Any]]:
-    """Получает данные о вакансии по ID с повторными попытками"""
-    url = f"https://api.hh.ru/vacancies/{vacancy_id}"
-    
+
+async def fetch_vacancy(client: httpx.AsyncClient, rate_limiter: RateLimiter, vacancy_id: str,
+                        max_retries: int = 3) -> Optional[bytes]:
+    """Получает исходные байты ответа по вакансии с повторными попытками"""
+    url = f"/vacancies/{vacancy_id}"
+
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, timeout=10)
-            
+            await rate_limiter.acquire()
+            response = await client.get(url)
+
+            if response.status_code in THROTTLE_STATUSES:
+                # Rate limiting - общий регулятор снижает частоту для всех воркеров
+                rate_limiter.on_throttle(parse_retry_after(response.headers.get("Retry-After")))
+                print(f"Rate limit для {vacancy_id}, частота снижена до {rate_limiter.rate:.2f} запросов/сек")
+                continue
+
+            rate_limiter.on_success()
             if response.status_code == 200:
-                return response.json()
+                return response.content
             elif response.status_code == 404:
                 print(f"Вакансия {vacancy_id} не найдена (404)")
                 return None
-            elif response.status_code == 429:
-                # Rate limiting - ждем дольше
-                wait_time = 2 ** attempt
-                print(f"Rate limit для {vacancy_id}, ждем {wait_time} сек...")
-                time.sleep(wait_time)
-                continue
             else:
                 print(f"Ошибка {response.status_code} для вакансии {vacancy_id}")
                 return None
-                
-        except requests.exceptions.RequestException as e:
+
+        except httpx.HTTPError as e:
             print(f"Ошибка запроса для {vacancy_id}: {e}")
             if attempt < max_retries - 1:
-                time.sleep(1)
+                await asyncio.sleep(1)
                 continue
             return None
-    
+
     return None
 
-def main():
+
+class ParquetPartWriter:
+    """Дописывает строки row group'ами в файлы-части, закрывая часть каждые PART_SIZE строк"""
+
+    def __init__(self, parts_dir: Path):
+        self.parts_dir = parts_dir
+        self.parts_dir.mkdir(exist_ok=True)
+        self.buffer: List[Dict[str, Any]] = []
+        self.writer: Optional[pq.ParquetWriter] = None
+        self.rows_in_part = 0
+        self.rows_written = 0
+
+    def _next_part_path(self) -> Path:
+        existing = sorted(self.parts_dir.glob('part-*.parquet'))
+        index = int(existing[-1].stem.split('-')[1]) + 1 if existing else 0
+        return self.parts_dir / f'part-{index:05d}.parquet'
+
+    def append(self, row: Dict[str, Any]):
+        self.buffer.append(row)
+        if len(self.buffer) >= ROW_GROUP_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Пишет накопленные строки отдельной row group"""
+        if not self.buffer:
+            return
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self._next_part_path(), VACANCY_SCHEMA)
+        self.writer.write_table(pa.Table.from_pylist(self.buffer, schema=VACANCY_SCHEMA))
+        self.rows_in_part += len(self.buffer)
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+        # Закрытый файл читается при возобновлении, поэтому не копим в одной части слишком много
+        if self.rows_in_part >= PART_SIZE:
+            self.close_part()
+
+    def close_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.rows_in_part = 0
+
+    def close(self):
+        self.flush()
+        self.close_part()
+
+
+def readable_parquet_files(output_file: Path, parts_dir: Path) -> List[Path]:
+    """Возвращает итоговый файл и части прошлых запусков; недописанные части удаляет"""
+    files = [output_file] if output_file.exists() else []
+    if parts_dir.exists():
+        for part in sorted(parts_dir.glob('part-*.parquet')):
+            try:
+                pq.ParquetFile(part)
+                files.append(part)
+            except Exception:
+                print(f"Часть {part} повреждена (прерванная запись), ее вакансии будут загружены заново")
+                part.unlink()
+    return files
+
+
+def load_done_ids(files: List[Path]) -> Set[str]:
+    """Собирает ID вакансий, уже сохраненных на диске"""
+    done_ids = set()
+    for path in files:
+        done_ids.update(pq.read_table(path, columns=['id']).column('id').to_pylist())
+    return done_ids
+
+
+def conform_to_schema(table: pa.Table) -> pa.Table:
+    """Приводит таблицу к VACANCY_SCHEMA; колонки, которых не было в старых файлах, заполняются null"""
+    for field in VACANCY_SCHEMA:
+        if field.name not in table.column_names:
+            table = table.append_column(field.name, pa.nulls(table.num_rows, field.type))
+    return table.select(VACANCY_SCHEMA.names).cast(VACANCY_SCHEMA)
+
+
+def merge_parts(output_file: Path, parts_dir: Path):
+    """Собирает итоговый файл из частей потоково, по одной row group"""
+    files = readable_parquet_files(output_file, parts_dir)
+    if all(path == output_file for path in files):
+        return
+
+    tmp_file = output_file.with_name(output_file.name + '.tmp')
+    with pq.ParquetWriter(tmp_file, VACANCY_SCHEMA) as writer:
+        for path in files:
+            parquet_file = pq.ParquetFile(path)
+            for i in range(parquet_file.num_row_groups):
+                writer.write_table(conform_to_schema(parquet_file.read_row_group(i)))
+    os.replace(tmp_file, output_file)
+
+    for path in files:
+        if path != output_file:
+            path.unlink()
+    if parts_dir.exists() and not any(parts_dir.iterdir()):
+        parts_dir.rmdir()
+
+
+def read_vacancy_ids(input_file: str) -> List[str]:
+    """Читает ID вакансий из CSV (колонка id)"""
+    with open(input_file, newline='', encoding='utf-8') as f:
+        return [row['id'] for row in csv.DictReader(f)]
+
+
+async def scrape(input_file: str, output_file: str, concurrency: int, rps: float, max_rps: float):
+    output_path = Path(output_file)
+    parts_dir = output_path.with_name(output_path.stem + '.parts')
+
     # Читаем CSV файл с ID вакансий
-    print("Читаем ds_vacancies.csv...")
-    df_ids = pd.read_csv('ds_vacancies.csv')
-    vacancy_ids = df_ids['id'].astype(str).tolist()
-    
-    print(f"Найдено {len(vacancy_ids)} вакансий для обработки")
-    
-    # Список для хранения обработанных данных
-    processed_vacancies = []
-    
-    # Обрабатываем каждую вакансию
-    for i, vacancy_id in enumerate(vacancy_ids, 1):
-        print(f"Обрабатываем {i}/{len(vacancy_ids)}: {vacancy_id}")
-        
-        # Получаем данные о вакансии
-        vacancy_data = fetch_vacancy(vacancy_id)
-        
-        if vacancy_data:
-            # Извлекаем нужные поля
-            extracted_data = extract_vacancy_data(vacancy_data)
-            processed_vacancies.append(extracted_data)
-            print(f"✓ Успешно обработано: {extracted_data['name'][:50]}...")
-        else:
-            print(f"✗ Не удалось получить данные для {vacancy_id}")
-        
-        # Пауза между запросами чтобы не нагружать API
-        time.sleep(0.5)
-        
-        # Промежуточное сохранение каждые 50 вакансий
-        if i % 50 == 0:
-            print(f"Промежуточное сохранение после {i} вакансий...")
-            df_temp = pd.DataFrame(processed_vacancies)
-            df_temp.to_parquet(f'vacancies_temp_{i}.parquet', index=False)
-    
-    # Создаем итоговый DataFrame
-    if processed_vacancies:
-        df_result = pd.DataFrame(processed_vacancies)
-        
-        print(f"\nОбработано {len(processed_vacancies)} из {len(vacancy_ids)} вакансий")
-        print(f"Столбцы: {list(df_result.columns)}")
-        
-        # Сохраняем в parquet
-        output_file = 'hh_vacancies_data.parquet'
-        df_result.to_parquet(output_file, index=False)
-        print(f"Данные сохранены в {output_file}")
-        
-        # Показываем статистику
-        print(f"\nСтатистика:")
-        print(f"- Вакансий с зарплатой: {df_result['salary_from'].notna().sum()}")
-        print(f"- Уникальных работодателей: {df_result['employer_name'].nunique()}")
-        print(f"- Уникальных городов: {df_result['area_name'].nunique()}")
-        
-    else:
+    print(f"Читаем {input_file}...")
+    vacancy_ids = read_vacancy_ids(input_file)
+
+    # Возобновление: пропускаем вакансии, которые уже есть в итоговом файле или частях
+    done_ids = load_done_ids(readable_parquet_files(output_path, parts_dir))
+    pending_ids = [vid for vid in vacancy_ids if vid not in done_ids]
+    print(f"Найдено {len(vacancy_ids)} вакансий, уже сохранено {len(vacancy_ids) - len(pending_ids)}, "
+          f"к обработке {len(pending_ids)}")
+
+    rate_limiter = RateLimiter(rps, max_rate=max_rps)
+    writer = ParquetPartWriter(parts_dir)
+    queue: asyncio.Queue = asyncio.Queue()
+    for vacancy_id in pending_ids:
+        queue.put_nowait(vacancy_id)
+
+    stats = {'done': 0, 'failed': 0}
+    start_time = time.time()
+
+    async def worker(client: httpx.AsyncClient):
+        while True:
+            try:
+                vacancy_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            vacancy_data = await fetch_vacancy(client, rate_limiter, vacancy_id)
+            stats['done'] += 1
+            if vacancy_data:
+                extracted_data = extract_vacancy_data(vacancy_data)
+                writer.append(extracted_data)
+                print(f"✓ [{stats['done']}/{len(pending_ids)}] {extracted_data['name'][:50]}...")
+            else:
+                stats['failed'] += 1
+                print(f"✗ [{stats['done']}/{len(pending_ids)}] Не удалось получить данные для {vacancy_id}")
+
+            if stats['done'] % 50 == 0:
+                elapsed = time.time() - start_time
+                print(f"Прогресс: {stats['done']}/{len(pending_ids)}, "
+                      f"{stats['done'] / elapsed:.1f} вакансий/сек, частота API {rate_limiter.rate:.2f} запросов/сек")
+
+    metrics = ClientMetrics()
+    try:
+        async with create_client("HH DS Scraper 1.0", metrics=metrics, max_connections=max(10, concurrency),
+                                 max_keepalive_connections=max(10, concurrency), read_timeout=10.0) as client:
+            await asyncio.gather(*(worker(client) for _ in range(max(1, min(concurrency, len(pending_ids))))))
+    finally:
+        # Закрываем текущую часть даже при прерывании, чтобы ее можно было прочитать при возобновлении
+        writer.close()
+
+    print(f"\nОбработано {writer.rows_written} из {len(pending_ids)} вакансий, ошибок: {stats['failed']}")
+    for host, host_stats in metrics.summary().items():
+        print(f"HTTP {host}: {host_stats}")
+
+    # Собираем итоговый parquet из прошлого результата и новых частей
+    merge_parts(output_path, parts_dir)
+    if not output_path.exists():
         print("Не удалось обработать ни одной вакансии")
+        return
+
+    df_result = pq.read_table(output_path, columns=['salary_from', 'employer_name', 'area_name']).to_pandas()
+    print(f"Данные сохранены в {output_file} ({len(df_result)} вакансий)")
+
+    # Показываем статистику
+    print(f"\nСтатистика:")
+    print(f"- Вакансий с зарплатой: {df_result['salary_from'].notna().sum()}")
+    print(f"- Уникальных работодателей: {df_result['employer_name'].nunique()}")
+    print(f"- Уникальных городов: {df_result['area_name'].nunique()}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Загружает вакансии по ID из CSV в parquet')
+    parser.add_argument('--input', default='ds_vacancies.csv', help='CSV файл с колонкой id')
+    parser.add_argument('--output', default='hh_vacancies_data.parquet', help='Итоговый parquet файл')
+    parser.add_argument('--concurrency', type=int, default=5, help='Количество параллельных запросов')
+    parser.add_argument('--rps', type=float, default=2.0, help='Начальная частота запросов в секунду')
+    parser.add_argument('--max-rps', type=float, default=10.0, help='Максимальная частота запросов в секунду')
+
+    args = parser.parse_args()
+    asyncio.run(scrape(args.input, args.output, args.concurrency, args.rps, args.max_rps))
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
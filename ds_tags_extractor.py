@@ -4,6 +4,7 @@
 """
 
 import json
+import logging
 import time
 import re
 from datetime import datetime
@@ -11,6 +12,9 @@ from typing import Dict, List, Optional, Any
 import pandas as pd
 from openai import OpenAI
 
+# Строки о каждой вакансии и каждом запросе к API - на уровне DEBUG (--verbose)
+logger = logging.getLogger(__name__)
+
 
 class DSTagsExtractor:
     """Извлекает DS-теги и характеристики компаний из вакансий с помощью LLM."""
@@ -125,6 +129,13 @@ class DSTagsExtractor:
         
         return text
     
+    def get_description(self, vacancy: Dict) -> str:
+        """Очищенное описание: из колонки description, а для файлов без нее - из raw_json"""
+        description = vacancy.get('description')
+        if isinstance(description, str):
+            return self.clean_html(description)
+        return self.extract_description_from_raw_json(vacancy.get('raw_json', ''))
+    
     def extract_description_from_raw_json(self, raw_json_str: str) -> str:
         """Извлекает и очищает описание из raw_json"""
         try:
@@ -147,8 +158,7 @@ class DSTagsExtractor:
         # Формируем данные вакансий
         vacancies_data = []
         for vacancy in vacancies:
-            # Извлекаем описание из raw_json
-            description = self.extract_description_from_raw_json(vacancy.get('raw_json', ''))
+            description = self.get_description(vacancy)
             
             vacancy_data = {
                 "vacancy_id": str(vacancy.get('id', '')),
@@ -258,7 +268,7 @@ class DSTagsExtractor:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                print(f"Отправляю запрос к {self.model} (попытка {attempt + 1}/{max_retries})...")
+                logger.debug(f"Отправляю запрос к {self.model} (попытка {attempt + 1}/{max_retries})...")
                 
                 response = self.client.chat.completions.create(
                     extra_headers={
@@ -280,7 +290,7 @@ class DSTagsExtractor:
                 if response.choices and response.choices[0].message:
                     llm_response = response.choices[0].message.content
                     if llm_response:
-                        print(f"Получен ответ длиной {len(llm_response)} символов")
+                        logger.debug(f"Получен ответ длиной {len(llm_response)} символов")
                     else:
                         print("Получен пустой ответ от модели")
                         continue
@@ -292,7 +302,7 @@ class DSTagsExtractor:
                 extracted_data = self.parse_llm_response(llm_response)
                 
                 if extracted_data:
-                    print(f"Успешно извлечено {len(extracted_data)} записей")
+                    logger.debug(f"Успешно извлечено {len(extracted_data)} записей")
                     return extracted_data
                 else:
                     print(f"Не удалось извлечь данные из ответа (попытка {attempt + 1})")
@@ -372,7 +382,7 @@ class DSTagsExtractor:
                 
                 validated_data.append(validated_item)
             
-            print(f"Валидировано {len(validated_data)} из {len(data)} записей")
+            logger.debug(f"Валидировано {len(validated_data)} из {len(data)} записей")
             return validated_data
             
         except json.JSONDecodeError as e:
@@ -436,7 +446,7 @@ class DSTagsExtractor:
             batch_data = []
             for _, row in batch_df.iterrows():
                 row_dict = row.to_dict()
-                print(f"Обрабатываю vacancy_id: {row_dict.get('id', 'Unknown')}")
+                logger.debug(f"Обрабатываю vacancy_id: {row_dict.get('id', 'Unknown')}")
                 batch_data.append(row_dict)
             
             # Извлекаем данные через LLM с актуальными категориями
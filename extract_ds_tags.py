@@ -6,8 +6,13 @@ Usage: python extract_ds_tags.py --start 0 --end 100
 
 import argparse
 import os
+import sys
+from pathlib import Path
 from ds_tags_extractor import DSTagsExtractor
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from log_setup import setup_logging
+
 
 def main():
     """Основная точка входа в скрипт."""
@@ -38,8 +43,11 @@ def main():
                        help="Выходной parquet файл (по умолчанию: data/ds_vacancies.parquet)")
     parser.add_argument("--batch-size", type=int, default=5,
                        help="Размер батча для API запросов (по умолчанию: 5)")
+    parser.add_argument("--verbose", action="store_true",
+                       help="Печатать строки о каждой вакансии и каждом запросе к API")
     
     args = parser.parse_args()
+    setup_logging("DEBUG" if args.verbose else "INFO", queued=False)
     
     # Проверяем корректность аргументов
     if args.start < 0:
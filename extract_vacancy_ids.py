@@ -1,24 +1,121 @@
 import asyncio
 import csv
+import hashlib
+import json
 import logging
+import os
+import sys
 import urllib.parse
-from typing import List, Dict, Any
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Union, Tuple
 import httpx
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from rate_limiter import RateLimiter, THROTTLE_STATUSES, parse_retry_after
+from storage import VacancyStorage
+from snapshots import SnapshotStore
+from http_client import ClientMetrics, create_client
+from log_setup import setup_logging
+
+# Поиск HH.ru отдает не больше 2000 результатов на запрос (per_page * page < 2000)
+MAX_SEARCH_DEPTH = 2000
+# Окно, отделяемое от открытой нижней границы дат при разбиении, и минимальная ширина окна
+SEARCH_PERIOD = timedelta(days=31)
+MIN_DATE_WINDOW = timedelta(minutes=10)
+HH_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+MSK = timezone(timedelta(hours=3))
+# Перекрытие окна при инкрементальной синхронизации на случай задержки индексации поиска
+INCREMENTAL_OVERLAP = timedelta(minutes=30)
+PER_PAGE = 100
+# Максимальная пауза между повторами неудачной страницы
+PAGE_RETRY_MAX_DELAY = 30
+# Разделитель имен запросов в колонке queries выходного CSV
+QUERIES_SEPARATOR = ";"
+
+# Реестр именованных поисковых запросов: имя -> текст запроса HH.ru
+QUERY_REGISTRY: Dict[str, str] = {
+    "frontend": """(
+  ("frontend" OR "front-end" OR "front end" OR фронтенд OR "фронт-енд" OR "фронт энд")
+  AND ("developer" OR разработчик)
+  AND (javascript OR typescript OR react OR vue OR angular OR "next.js" OR "nuxt.js" OR svelte)
+)
+AND NOT (
+  fullstack OR "full-stack" OR backend OR "node.js" OR "react native" OR mobile OR android OR ios OR flutter
+  OR qa OR тестировщик OR devops OR data OR analyst OR analytics OR ml OR "machine learning"
+  OR golang OR python OR php OR java OR ".net" OR c# OR "c++" OR 1c OR bitrix OR "bitrix24"
+  OR водитель OR курьер OR грузчик OR кладовщик OR комплектовщик OR фасовщик OR прораб
+  OR сварщик OR слесарь OR электрик OR токарь OR монтажник OR разнорабоч OR уборщик
+  OR кассир OR продавец OR официант OR бармен OR повар OR тракторист
+)""",
+    "data_science": """"data scientist" OR "data science" OR "machine learning" OR "ml engineer" OR "ai engineer" """,
+}
+
+
+class SearchPageError(Exception):
+    """Страницу поиска не удалось получить после всех повторов"""
+
+
+def resolve_queries(names: List[str], custom: Optional[List[str]] = None) -> Dict[str, str]:
+    """Собирает запросы из реестра по именам и из строк вида name=text"""
+    queries = {}
+    for name in names:
+        if name not in QUERY_REGISTRY:
+            raise ValueError(f"Unknown query '{name}', known: {', '.join(QUERY_REGISTRY)}")
+        queries[name] = QUERY_REGISTRY[name]
+    for spec in custom or []:
+        name, sep, text = spec.partition("=")
+        name = name.strip()
+        if not sep or not name or not text.strip() or QUERIES_SEPARATOR in name:
+            raise ValueError(f"Custom query must look like name=text: {spec!r}")
+        queries[name] = text
+    return queries
+
+
+def crawl_scope(params: Dict[str, str]) -> Dict[str, str]:
+    """Параметры обхода без date_to: верхняя граница фиксируется при старте и у продолжения совпадает"""
+    return {key: value for key, value in params.items() if key != 'date_to'}
+
 
 class VacancyIDExtractor:
-    def __init__(self, output_file: str = "vacancy_ids.csv", delay: float = 1.0):
+    def __init__(self, output_file: str = "vacancy_ids.csv", delay: float = 1.0,
+                 rps: Optional[float] = None, max_rps: Optional[float] = None,
+                 max_retries: int = 5, rate_limiter: Optional[RateLimiter] = None,
+                 concurrency: int = 4, db_path: str = "vacancies.db",
+                 max_connections: Optional[int] = None, lite: bool = False,
+                 storage: Optional[VacancyStorage] = None):
         self.output_file = output_file
         self.delay = delay
+        self.db_path = db_path
+        self.max_retries = max_retries
         self.logger = logging.getLogger(__name__)
+        # Водяные знаки инкрементальной синхронизации и чекпоинты обхода страниц
+        self.storage = storage or VacancyStorage(db_path)
+        # Дневные снимки выдачи запросов (только по полным обходам)
+        self.snapshots = SnapshotStore(storage=self.storage)
+        # Lite-режим: элементы выдачи сразу сохраняются в vacancies без запросов деталей
+        self.lite = lite
+        
+        # Ограничение одновременных запросов при параллельной обработке срезов
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        # Дерево регионов HH.ru: id родителя (None - корень) -> id дочерних регионов
+        self._area_children: Optional[Dict[Optional[str], List[str]]] = None
+        self._areas_lock = asyncio.Lock()
         
-        # HTTP клиент с настройками
-        self.client = httpx.AsyncClient(
-            timeout=30.0,
-            headers={
-                "User-Agent": "HH Vacancy ID Extractor 1.0",
-                "Accept": "application/json"
-            }
+        # Регулятор частоты можно разделить с VacancyFetcher, передав общий объект
+        if rate_limiter is None:
+            if not rps:
+                rps = 1.0 / delay if delay > 0 else 1.0
+            rate_limiter = RateLimiter(rps, max_rate=max_rps)
+        self.rate_limiter = rate_limiter
+        
+        # HTTP клиент с пулом соединений под число параллельных запросов и метриками соединений
+        self.metrics = ClientMetrics()
+        self.client = create_client(
+            "HH Vacancy ID Extractor 1.0",
+            metrics=self.metrics,
+            max_connections=max_connections or max(10, concurrency),
+            max_keepalive_connections=max_connections or max(10, concurrency)
         )
     
     async def __aenter__(self):
@@ -29,108 +126,273 @@ class VacancyIDExtractor:
     
     def get_frontend_filter(self) -> str:
         """Возвращает фильтр для frontend вакансий"""
-        return """(
-  ("frontend" OR "front-end" OR "front end" OR фронтенд OR "фронт-енд" OR "фронт энд")
-  AND ("developer" OR разработчик)
-  AND (javascript OR typescript OR react OR vue OR angular OR "next.js" OR "nuxt.js" OR svelte)
-)
-AND NOT (
-  fullstack OR "full-stack" OR backend OR "node.js" OR "react native" OR mobile OR android OR ios OR flutter
-  OR qa OR тестировщик OR devops OR data OR analyst OR analytics OR ml OR "machine learning"
-  OR golang OR python OR php OR java OR ".net" OR c# OR "c++" OR 1c OR bitrix OR "bitrix24"
-  OR водитель OR курьер OR грузчик OR кладовщик OR комплектовщик OR фасовщик OR прораб
-  OR сварщик OR слесарь OR электрик OR токарь OR монтажник OR разнорабоч OR уборщик
-  OR кассир OR продавец OR официант OR бармен OR повар OR тракторист
-)"""
+        return QUERY_REGISTRY["frontend"]
     
     def get_data_science_ml_filter(self) -> str:
         """Возвращает фильтр для Data Science и Machine Learning вакансий"""
-        return """"data scientist" OR "data science" OR "machine learning" OR "ml engineer" OR "ai engineer" """
+        return QUERY_REGISTRY["data_science"]
     
-    async def fetch_vacancies_page(self, text_filter: str, page: int = 0, per_page: int = 100) -> Dict[str, Any]:
-        """Получает страницу вакансий из API HH.ru"""
-        base_url = "https://api.hh.ru/vacancies"
+    async def fetch_vacancies_page(self, text_filter: str, page: int = 0, per_page: int = 100,
+                                   slice_params: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Получает страницу вакансий из API HH.ru
+        
+        Ограничение частоты (429/503), таймауты и ошибки сервера повторяются;
+        если страницу так и не удалось получить, поднимается SearchPageError,
+        а не возвращается пустой ответ, который выглядел бы как конец выдачи.
+        """
+        base_url = "/vacancies"
         
         params = {
             "per_page": per_page,
             "page": page,
-            "text": text_filter
+            "text": text_filter,
+            **(slice_params or {})
         }
         
-        try:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
             self.logger.debug(f"Fetching page {page} with {per_page} items")
-            response = await self.client.get(base_url, params=params)
+            try:
+                async with self.semaphore:
+                    response = await self.client.get(base_url, params=params)
+            except httpx.HTTPError as e:
+                last_error = f"{type(e).__name__}: {e}"
+                self.logger.warning(f"Error fetching page {page} of {slice_params or 'all'} "
+                                    f"(attempt {attempt + 1}/{self.max_retries + 1}): {last_error}")
+                await asyncio.sleep(min(2 ** attempt, PAGE_RETRY_MAX_DELAY))
+                continue
+            
+            if response.status_code in THROTTLE_STATUSES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                self.rate_limiter.on_throttle(retry_after)
+                last_error = f"HTTP {response.status_code}"
+                self.logger.warning(f"HTTP {response.status_code} for page {page} "
+                                    f"(attempt {attempt + 1}/{self.max_retries + 1}), "
+                                    f"rate lowered to {self.rate_limiter.rate:.2f} req/s")
+                continue
             
+            self.rate_limiter.on_success()
             if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 400:
-                self.logger.error(f"Bad request (400): {response.text}")
-                return {}
-            elif response.status_code == 429:
-                self.logger.warning("Rate limit exceeded, waiting longer...")
-                await asyncio.sleep(10)
-                return await self.fetch_vacancies_page(text_filter, page, per_page)
+                data = response.json()
+                if 'items' in data:
+                    return data
+                last_error = "response without items"
+            elif response.status_code >= 500:
+                last_error = f"HTTP {response.status_code}"
             else:
-                self.logger.error(f"HTTP {response.status_code}: {response.text}")
-                return {}
-                
-        except httpx.TimeoutException:
-            self.logger.error(f"Timeout fetching page {page}")
-            return {}
-        except Exception as e:
-            self.logger.error(f"Error fetching page {page}: {e}")
-            return {}
+                # Ошибки клиента (400 и т.п.) повтором не исправить
+                raise SearchPageError(f"HTTP {response.status_code} for page {page} of "
+                                      f"{slice_params or 'all'}: {response.text}")
+            
+            self.logger.warning(f"{last_error} for page {page} of {slice_params or 'all'} "
+                                f"(attempt {attempt + 1}/{self.max_retries + 1})")
+            await asyncio.sleep(min(2 ** attempt, PAGE_RETRY_MAX_DELAY))
+        
+        raise SearchPageError(f"Giving up on page {page} of {slice_params or 'all'} "
+                              f"after {self.max_retries + 1} attempts: {last_error}")
     
-    async def extract_all_vacancy_ids(self, text_filter: str) -> List[Dict[str, str]]:
-        """Извлекает все ID и названия вакансий по фильтру"""
-        vacancies = []
-        page = 0
-        per_page = 100
+    async def get_child_areas(self, area_id: Optional[str]) -> List[str]:
+        """Возвращает дочерние регионы (для None - регионы верхнего уровня)"""
+        async with self._areas_lock:
+            if self._area_children is None:
+                self._area_children = {}
+                try:
+                    await self.rate_limiter.acquire()
+                    async with self.semaphore:
+                        response = await self.client.get("/areas")
+                    response.raise_for_status()
+                    self.rate_limiter.on_success()
+                    
+                    stack = [(None, area) for area in response.json()]
+                    while stack:
+                        parent_id, area = stack.pop()
+                        self._area_children.setdefault(parent_id, []).append(area['id'])
+                        stack.extend((area['id'], child) for child in area.get('areas', []))
+                except Exception as e:
+                    self.logger.warning(f"Could not load area tree, partitioning by dates only: {e}")
         
-        self.logger.info("Starting vacancy extraction...")
+        return self._area_children.get(area_id, [])
+    
+    async def split_slice(self, slice_params: Dict[str, str]) -> List[Dict[str, str]]:
+        """Делит срез поиска на непересекающиеся части: сначала по регионам, затем по датам"""
+        area_id = slice_params.get('area')
+        child_areas = await self.get_child_areas(area_id)
+        if child_areas:
+            return [{**slice_params, 'area': child_id} for child_id in child_areas]
         
-        while True:
-            data = await self.fetch_vacancies_page(text_filter, page, per_page)
-            
-            if not data or 'items' not in data:
-                break
-            
-            items = data['items']
-            if not items:
-                break
-            
-            # Извлекаем ID и названия
+        # Без явных границ окно отсчитывается от date_to, чтобы после перезапуска срезы делились так же
+        date_to = (datetime.strptime(slice_params['date_to'], HH_DATE_FORMAT)
+                   if 'date_to' in slice_params else datetime.now(MSK))
+        if 'date_from' not in slice_params:
+            # Нижняя граница открыта: отделяем последние SEARCH_PERIOD, а вакансии, опубликованные раньше,
+            # остаются в срезе с той же открытой границей (при необходимости он делится так же)
+            boundary = (date_to - SEARCH_PERIOD).strftime(HH_DATE_FORMAT)
+            return [
+                {**slice_params, 'date_from': boundary, 'date_to': date_to.strftime(HH_DATE_FORMAT)},
+                {**slice_params, 'date_to': boundary},
+            ]
+        date_from = datetime.strptime(slice_params['date_from'], HH_DATE_FORMAT)
+        if date_to - date_from <= MIN_DATE_WINDOW:
+            return []
+        
+        middle = date_from + (date_to - date_from) / 2
+        return [
+            {**slice_params, 'date_from': date_from.strftime(HH_DATE_FORMAT), 'date_to': middle.strftime(HH_DATE_FORMAT)},
+            {**slice_params, 'date_from': middle.strftime(HH_DATE_FORMAT), 'date_to': date_to.strftime(HH_DATE_FORMAT)},
+        ]
+    
+    async def fetch_checkpointed_page(self, query_key: str, text_filter: str, slice_params: Dict[str, str],
+                                      page: int, done_pages: Dict[Tuple[str, int], Tuple[int, int]]) -> Tuple[int, int]:
+        """Возвращает (found, pages) страницы: из чекпоинта или запросив ее и сохранив вакансии"""
+        slice_key = json.dumps(slice_params, sort_keys=True)
+        if (slice_key, page) in done_pages:
+            return done_pages[(slice_key, page)]
+        
+        data = await self.fetch_vacancies_page(text_filter, page, PER_PAGE, slice_params)
+        found, pages = data.get('found', 0), data.get('pages', 0)
+        if self.lite:
+            self.storage.save_search_items(data['items'])
+        self.storage.save_search_page(query_key, slice_key, page, found, pages, data['items'])
+        done_pages[(slice_key, page)] = (found, pages)
+        return found, pages
+    
+    async def extract_slice(self, query_key: str, text_filter: str, slice_params: Dict[str, str],
+                            done_pages: Dict[Tuple[str, int], Tuple[int, int]]) -> int:
+        """
+        Сохраняет вакансии одного среза в чекпоинт, рекурсивно деля срез, если результатов больше 2000.
+        Уже сохраненные страницы (done_pages) повторно не запрашиваются.
+        
+        Returns:
+            Число найденных вакансий среза (found первой страницы)
+        """
+        found, total_pages = await self.fetch_checkpointed_page(query_key, text_filter, slice_params, 0, done_pages)
+        
+        if found > MAX_SEARCH_DEPTH:
+            parts = await self.split_slice(slice_params)
+            if parts:
+                self.logger.info(f"Slice {slice_params or 'all'}: {found} found, splitting into {len(parts)} parts")
+                covered = sum(await asyncio.gather(*(
+                    self.extract_slice(query_key, text_filter, part, done_pages) for part in parts
+                )))
+                # Вакансии, привязанные к самому региону, а не к дочерним, поиск по дочерним не находит
+                if covered < found and parts[0].get('area') != slice_params.get('area'):
+                    self.logger.warning(f"Slice {slice_params or 'all'}: child areas cover {covered} of {found} "
+                                        f"vacancies, {found - covered} attached to the area itself are missed")
+                return found
+            self.logger.warning(f"Slice {slice_params} has {found} results and cannot be split further, "
+                                f"only the first {MAX_SEARCH_DEPTH} are reachable")
+        
+        # После первой страницы число страниц известно - запрашиваем остальные параллельно,
+        # темп задает общий rate_limiter
+        await asyncio.gather(*(
+            self.fetch_checkpointed_page(query_key, text_filter, slice_params, page, done_pages)
+            for page in range(1, total_pages)
+        ))
+        
+        self.logger.info(f"Slice {slice_params or 'all'}: {total_pages} pages of {found} vacancies saved")
+        return found
+    
+    async def extract_query(self, name: str, text_filter: str,
+                            base_params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Обходит один запрос, продолжая с чекпоинта, если прошлый обход не был завершен"""
+        query_key = self.get_query_key(name, text_filter)
+        # Верхняя граница дат фиксируется при старте обхода: новые вакансии не сдвигают страницы,
+        # а разбиение на срезы после перезапуска совпадает с исходным
+        crawl_params = {'date_to': datetime.now(MSK).strftime(HH_DATE_FORMAT), **base_params}
+        params = self.storage.start_search_crawl(query_key, crawl_params)
+        # Чекпоинт с другими параметрами (полный обход против инкрементального с date_from) не продолжаем:
+        # его страницы не относятся к текущему обходу
+        if crawl_scope(params) != crawl_scope(crawl_params):
+            self.logger.warning(f"Discarding checkpoint of {query_key} started with other params {params}")
+            self.storage.clear_search_crawl(query_key)
+            params = self.storage.start_search_crawl(query_key, crawl_params)
+        done_pages = self.storage.get_search_pages(query_key)
+        if done_pages:
+            self.logger.info(f"Resuming {query_key} from checkpoint: {len(done_pages)} pages already saved")
+        
+        await self.extract_slice(query_key, text_filter, params, done_pages)
+        return self.storage.get_search_items(query_key)
+    
+    async def extract_all_vacancy_ids(self, text_filter: str,
+                                      base_params: Optional[Dict[str, str]] = None,
+                                      query_name: str = "query") -> List[Dict[str, str]]:
+        """Извлекает все ID и названия вакансий по фильтру, обходя лимит глубины поиска"""
+        return await self.extract_queries({query_name: text_filter}, {query_name: base_params or {}})
+    
+    async def extract_queries(self, queries: Dict[str, str],
+                              base_params: Optional[Dict[str, Dict[str, str]]] = None) -> List[Dict[str, Any]]:
+        """
+        Выполняет несколько запросов параллельно под общим rate_limiter и семафором
+        
+        Args:
+            queries: Имя запроса -> текст запроса
+            base_params: Имя запроса -> дополнительные параметры поиска (например, date_from)
+        
+        Returns:
+            Вакансии без повторов; в 'queries' - имена всех запросов, нашедших вакансию
+        """
+        base_params = base_params or {}
+        self.logger.info(f"Starting vacancy extraction for {len(queries)} queries: {', '.join(queries)}")
+        
+        results = await asyncio.gather(*(
+            self.extract_query(name, text_filter, dict(base_params.get(name, {})))
+            for name, text_filter in queries.items()
+        ))
+        
+        # Срезы по датам пересекаются на границах окон, а разные запросы - по вакансиям,
+        # поэтому каждая вакансия попадает в результат один раз со списком нашедших ее запросов
+        vacancies: Dict[str, Dict[str, Any]] = {}
+        total_items = 0
+        for name, items in zip(queries, results):
+            total_items += len(items)
+            query_ids = set()
             for item in items:
-                vacancies.append({
-                    'id': item['id'],
-                    'name': item['name']
-                })
-            
-            self.logger.info(f"Page {page}: extracted {len(items)} vacancies (total: {len(vacancies)})")
-            
-            # Проверяем, есть ли еще страницы
-            total_pages = data.get('pages', 0)
-            if page >= total_pages - 1:
-                break
-            
-            page += 1
-            
-            # Задержка между запросами
-            await asyncio.sleep(self.delay)
+                query_ids.add(item['id'])
+                vacancy = vacancies.get(item['id'])
+                if vacancy is None:
+                    vacancies[item['id']] = {
+                        'id': item['id'],
+                        'name': item['name'],
+                        'published_at': item.get('published_at'),
+                        'queries': [name]
+                    }
+                elif name not in vacancy['queries']:
+                    vacancy['queries'].append(name)
+            self.logger.info(f"Query {name}: {len(query_ids)} unique vacancies")
         
-        self.logger.info(f"Extraction completed. Total vacancies: {len(vacancies)}")
-        return vacancies
+        self.logger.info(f"Extraction completed. Total vacancies: {len(vacancies)} "
+                         f"({total_items - len(vacancies)} duplicates removed)")
+        self.logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
+        self.metrics.log_summary(self.logger)
+        return list(vacancies.values())
+    
+    def complete_queries(self, queries: Dict[str, str]):
+        """Удаляет чекпоинты запросов, результат которых уже записан"""
+        for name, text_filter in queries.items():
+            self.storage.clear_search_crawl(self.get_query_key(name, text_filter))
+    
+    def save_snapshots(self, names: List[str], vacancies: List[Dict[str, Any]]):
+        """Сохраняет дневной снимок выдачи запросов; только для полного обхода, без окна date_from"""
+        for name in names:
+            self.snapshots.save(name, [v['id'] for v in vacancies if name in v['queries']])
+    
+    @staticmethod
+    def to_csv_row(vacancy: Dict[str, Any]) -> Dict[str, str]:
+        """Строка CSV: список запросов склеивается через разделитель"""
+        return {**vacancy, 'queries': QUERIES_SEPARATOR.join(vacancy.get('queries', []))}
     
     def save_to_csv(self, vacancies: List[Dict[str, str]]):
         """Сохраняет вакансии в CSV файл"""
         try:
             with open(self.output_file, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['id', 'name']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                fieldnames = ['id', 'name', 'queries', 'published_at']
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
                 
                 writer.writeheader()
                 for vacancy in vacancies:
-                    writer.writerow(vacancy)
+                    writer.writerow(self.to_csv_row(vacancy))
             
             self.logger.info(f"Saved {len(vacancies)} vacancies to {self.output_file}")
             
@@ -138,19 +400,59 @@ AND NOT (
             self.logger.error(f"Error saving to CSV: {e}")
             raise
     
-    async def run(self, filter_type: str = "data_science"):
+    def append_to_csv(self, vacancies: List[Dict[str, str]]) -> int:
+        """Дописывает в CSV только вакансии, которых в нем еще нет; возвращает их число"""
+        existing_ids = set()
+        fieldnames = ['id', 'name', 'queries', 'published_at']
+        if os.path.exists(self.output_file) and os.path.getsize(self.output_file) > 0:
+            with open(self.output_file, newline='', encoding='utf-8') as csvfile:
+                reader = csv.DictReader(csvfile)
+                existing_ids = {row['id'] for row in reader}
+                # CSV, созданный до появления колонки queries, продолжаем в его формате
+                fieldnames = reader.fieldnames or fieldnames
+        
+        new_vacancies = [v for v in vacancies if v['id'] not in existing_ids]
+        write_header = not os.path.exists(self.output_file) or os.path.getsize(self.output_file) == 0
+        
+        with open(self.output_file, 'a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            for vacancy in new_vacancies:
+                writer.writerow(self.to_csv_row(vacancy))
+        
+        self.logger.info(f"Appended {len(new_vacancies)} new vacancies to {self.output_file} "
+                         f"({len(vacancies) - len(new_vacancies)} already pending)")
+        return len(new_vacancies)
+    
+    @staticmethod
+    def get_query_key(filter_type: str, text_filter: str) -> str:
+        """Ключ запроса для хранения водяного знака: имя фильтра + хеш текста"""
+        digest = hashlib.sha1(text_filter.encode('utf-8')).hexdigest()[:12]
+        return f"{filter_type}:{digest}"
+    
+    @staticmethod
+    def get_max_published_at(vacancies: List[Dict[str, str]]) -> Optional[str]:
+        """Возвращает наибольший published_at среди вакансий"""
+        dates = [datetime.strptime(v['published_at'], HH_DATE_FORMAT)
+                 for v in vacancies if v.get('published_at')]
+        return max(dates).strftime(HH_DATE_FORMAT) if dates else None
+    
+    async def run(self, filter_types: Union[str, List[str]] = "data_science", incremental: bool = False,
+                  custom_queries: Optional[List[str]] = None):
         """Основная функция запуска извлечения"""
-        if filter_type == "frontend":
-            text_filter = self.get_frontend_filter()
-            self.logger.info("Using frontend developer filter")
-        elif filter_type == "data_science":
-            text_filter = self.get_data_science_ml_filter()
-            self.logger.info("Using data science/ML filter")
-        else:
-            raise ValueError("filter_type must be 'frontend' or 'data_science'")
+        if isinstance(filter_types, str):
+            filter_types = [filter_types]
+        queries = resolve_queries(filter_types, custom_queries)
+        if not queries:
+            raise ValueError("At least one query is required")
+        
+        if incremental:
+            await self.run_incremental(queries)
+            return
         
         # Извлекаем вакансии
-        vacancies = await self.extract_all_vacancy_ids(text_filter)
+        vacancies = await self.extract_queries(queries)
         
         if vacancies:
             # Сохраняем в CSV
@@ -158,18 +460,47 @@ AND NOT (
             self.logger.info(f"Successfully extracted and saved {len(vacancies)} vacancies")
         else:
             self.logger.warning("No vacancies found")
-
-
-def setup_logging(level: str = "INFO"):
-    """Настраивает логирование"""
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('vacancy_extraction.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+        self.save_snapshots(list(queries), vacancies)
+        self.complete_queries(queries)
+    
+    async def run_incremental(self, queries: Dict[str, str], full_crawl: bool = False) -> List[Dict[str, Any]]:
+        """
+        Забирает только вакансии, опубликованные после водяного знака каждого запроса, и дописывает их в CSV
+        
+        Args:
+            queries: Запросы (имя -> текст)
+            full_crawl: Обойти выдачу целиком, не глядя на водяной знак (ради дневного снимка выдачи)
+        
+        Returns:
+            Найденные вакансии (включая уже записанные в CSV из окна перекрытия)
+        """
+        query_keys = {name: self.get_query_key(name, text_filter) for name, text_filter in queries.items()}
+        run_started_at = datetime.now(MSK).strftime(HH_DATE_FORMAT)
+        
+        base_params = {}
+        for name, query_key in query_keys.items():
+            base_params[name] = {}
+            state = None if full_crawl else self.storage.get_sync_state(query_key)
+            if state and state['last_published_at']:
+                watermark = datetime.strptime(state['last_published_at'], HH_DATE_FORMAT)
+                base_params[name]['date_from'] = (watermark - INCREMENTAL_OVERLAP).strftime(HH_DATE_FORMAT)
+                self.logger.info(f"Incremental sync for {query_key} since {base_params[name]['date_from']}")
+            elif full_crawl:
+                self.logger.info(f"Full sync for {query_key}")
+            else:
+                self.logger.info(f"No watermark for {query_key}, running full sync")
+        
+        vacancies = await self.extract_queries(queries, base_params)
+        self.append_to_csv(vacancies)
+        
+        # Водяные знаки сдвигаем только после успешной записи в CSV, у каждого запроса - свой
+        for name, query_key in query_keys.items():
+            matched = [v for v in vacancies if name in v['queries']]
+            self.storage.save_sync_state(query_key, self.get_max_published_at(matched), run_started_at)
+        # Запрос без водяного знака прошел полным обходом - его выдача годится как снимок
+        self.save_snapshots([name for name in queries if not base_params[name]], vacancies)
+        self.complete_queries(queries)
+        return vacancies
 
 
 async def main():
@@ -177,19 +508,34 @@ async def main():
     
     parser = argparse.ArgumentParser(description='Extract vacancy IDs and names from HH.ru API')
     parser.add_argument('--output', default='vacancy_ids.csv', help='Output CSV file path')
-    parser.add_argument('--filter', choices=['frontend', 'data_science'], default='data_science', 
-                       help='Filter type: frontend or data_science')
+    parser.add_argument('--filter', nargs='+', choices=list(QUERY_REGISTRY), default=['data_science'],
+                       help='One or more registered queries to run together (IDs are deduped across them)')
+    parser.add_argument('--query', action='append', metavar='NAME=TEXT',
+                       help='Additional ad-hoc search query; may be repeated')
     parser.add_argument('--delay', type=float, default=1.0, help='Delay between requests (seconds)')
+    parser.add_argument('--rps', type=float, help='Initial requests-per-second rate (default: 1/delay)')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for a request throttled with 429/503')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum number of parallel search requests')
+    parser.add_argument('--max-connections', type=int, help='HTTP connection pool size (default: max(10, concurrency))')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Fetch only vacancies published since the last run and append them to the output CSV')
+    parser.add_argument('--lite', action='store_true',
+                       help='Store full search items in the vacancies table (detail_fetched = 0) '
+                            'so that only vacancies needing descriptions are fetched later')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path for sync watermarks and crawl checkpoints')
     parser.add_argument('--log-level', default='INFO', help='Logging level')
     
     args = parser.parse_args()
     
     # Настраиваем логирование
-    setup_logging(args.log_level)
+    setup_logging(args.log_level, 'vacancy_extraction.log')
     
     # Запускаем извлечение
-    async with VacancyIDExtractor(args.output, args.delay) as extractor:
-        await extractor.run(args.filter)
+    async with VacancyIDExtractor(args.output, args.delay, args.rps, args.max_rps, args.max_retries,
+                                  concurrency=args.concurrency, db_path=args.db,
+                                  max_connections=args.max_connections, lite=args.lite) as extractor:
+        await extractor.run(args.filter, incremental=args.incremental, custom_queries=args.query)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Непрерывная загрузка вакансий в одном процессе: инкрементальная синхронизация ID по расписанию
+каждого запроса, загрузка деталей из очереди fetch_jobs и плановое обновление загруженных вакансий
+выполняются кооперативными задачами asyncio под общим регулятором частоты. Первая синхронизация
+запроса за день обходит выдачу целиком и сохраняет дневной снимок (см. snapshots.py).
+
+Состояние пишется в JSON-файл статуса; SIGINT/SIGTERM завершают работу после текущих запросов.
+Usage: python ingest_daemon.py --filter data_science frontend --schedule frontend=6h --daily-requests 50000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import signal
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from extract_vacancy_ids import (VacancyIDExtractor, QUERY_REGISTRY, HH_DATE_FORMAT,
+                                 resolve_queries)
+from fetch_vacancies import VacancyFetcher, parse_duration, parse_query_weight
+from rate_limiter import RateLimiter
+from dictionaries import DictionaryCache
+from storage import VacancyStorage
+from log_setup import setup_logging
+
+# Через сколько повторить синхронизацию запроса после ошибки (если интервал запроса больше)
+SYNC_ERROR_RETRY = 600.0
+# Как часто проверять очередь, когда готовых задач нет
+FETCH_IDLE_POLL = 60.0
+# Как часто перезаписывать файл статуса
+STATUS_INTERVAL = 10.0
+# Как часто проверять, не устарели ли справочники (сами они перезагружаются раз в TTL)
+DICTIONARIES_CHECK_INTERVAL = 3600.0
+
+
+def parse_schedule(value: str):
+    """Разбирает --schedule name=interval (интервал в формате parse_duration)"""
+    name, sep, interval = value.partition("=")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"schedule must look like name=interval, got {value!r}")
+    return name.strip(), parse_duration(interval)
+
+
+def format_timestamp(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class IngestDaemon:
+    def __init__(self, queries: Dict[str, str], schedules: Dict[str, float], db_path: str = "vacancies.db",
+                 output_file: str = "vacancy_ids.csv", rps: float = 1.0, max_rps: float = 20.0,
+                 daily_requests: Optional[int] = None, concurrency: int = 4, fetch_slice: float = 300.0,
+                 refresh_age: Optional[float] = None, refresh_interval: float = 3600.0,
+                 status_file: Optional[str] = "ingest_status.json",
+                 query_weights: Optional[Dict[str, float]] = None, cache_dir: Optional[str] = "raw_cache"):
+        self.queries = queries
+        self.schedules = schedules
+        self.fetch_slice = fetch_slice
+        self.refresh_age = refresh_age
+        self.refresh_interval = refresh_interval
+        self.status_file = status_file
+        self.query_weights = query_weights
+        self.logger = logging.getLogger(__name__)
+
+        # Дневной бюджет запросов превращается в потолок частоты, чтобы запросы шли ровно, а не пачками
+        if daily_requests:
+            cap = daily_requests / 86400
+            max_rps = min(max_rps, cap)
+            rps = min(rps, cap)
+        self.rate_limiter = RateLimiter(rps, max_rate=max_rps)
+
+        # Одно соединение с БД на все циклы: пока загрузка деталей держит открытую пачку записей,
+        # запись синхронизации через второе соединение ждала бы блокировку, остановив цикл событий
+        self.storage = VacancyStorage(db_path)
+        self.extractor = VacancyIDExtractor(output_file, rate_limiter=self.rate_limiter,
+                                            concurrency=concurrency, db_path=db_path, storage=self.storage)
+        # Отложенные повторы fetcher не ждет: следующий срез загрузки запускает демон
+        self.fetcher = VacancyFetcher(None, db_path, concurrency=concurrency, rate_limiter=self.rate_limiter,
+                                      cache_dir=cache_dir, max_retry_wait=0, query_weights=query_weights,
+                                      storage=self.storage)
+        # Курсы валют и дерево регионов для конвертации зарплат и группировки по регионам
+        self.dictionaries = DictionaryCache(db_path, rate_limiter=self.rate_limiter, storage=self.storage)
+
+        # Поиск выполняет одна синхронизация за раз, остальные ждут своей очереди
+        self.sync_lock = asyncio.Lock()
+        self.stop_event = asyncio.Event()
+        # Будит загрузку деталей, когда синхронизация или обновление добавили задачи
+        self.fetch_wakeup = asyncio.Event()
+        self.cancellable: List[asyncio.Task] = []
+
+        self.started_at = time.time()
+        self.status = {
+            'sync': {name: {'interval': schedules[name], 'state': 'idle', 'last_run_at': None,
+                            'next_run_at': None, 'last_found': None, 'last_queued': None, 'last_error': None}
+                     for name in queries},
+            'fetch': {'state': 'idle', 'slices': 0, 'last_slice_at': None, 'last_error': None},
+            'refresh': {'state': 'idle' if refresh_age else 'disabled', 'last_run_at': None,
+                        'last_queued': None, 'last_error': None},
+        }
+
+    async def __aenter__(self):
+        await self.extractor.__aenter__()
+        await self.fetcher.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.fetcher.__aexit__(exc_type, exc_val, exc_tb)
+        await self.extractor.__aexit__(exc_type, exc_val, exc_tb)
+        self.storage.close()
+
+    def stop(self):
+        """Плавная остановка: загрузка доделывает начатые запросы, поиск прерывается (обход сохранен в чекпоинтах)"""
+        if self.stop_event.is_set():
+            return
+        self.logger.info("Shutdown requested, finishing in-flight requests")
+        self.stop_event.set()
+        self.fetcher.request_stop()
+        for task in self.cancellable:
+            task.cancel()
+
+    async def sleep_until(self, ts: float, wakeup: Optional[asyncio.Event] = None) -> bool:
+        """Ждет момента ts (или события wakeup); True - пришел запрос на остановку"""
+        waiters = [asyncio.ensure_future(self.stop_event.wait())]
+        if wakeup is not None:
+            waiters.append(asyncio.ensure_future(wakeup.wait()))
+        try:
+            await asyncio.wait(waiters, timeout=max(0.0, ts - time.time()), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+        return self.stop_event.is_set()
+
+    def next_sync_at(self, name: str) -> float:
+        """Время следующей синхронизации запроса: последний запуск (из БД) + интервал"""
+        query_key = self.extractor.get_query_key(name, self.queries[name])
+        state = self.storage.get_sync_state(query_key)
+        if not state or not state['last_run_at']:
+            return time.time()
+        last_run = datetime.strptime(state['last_run_at'], HH_DATE_FORMAT).timestamp()
+        return last_run + self.schedules[name]
+
+    async def sync_loop(self, name: str):
+        status = self.status['sync'][name]
+        due = self.next_sync_at(name)
+        while True:
+            status['next_run_at'] = format_timestamp(due)
+            if await self.sleep_until(due):
+                return
+            async with self.sync_lock:
+                status['state'] = 'running'
+                started = time.time()
+                try:
+                    # Первая синхронизация дня обходит выдачу целиком: ее результат - дневной снимок запроса
+                    today = date.today().isoformat()
+                    full_crawl = not self.storage.get_search_snapshots(name, today, today)
+                    vacancies = await self.extractor.run_incremental({name: self.queries[name]}, full_crawl)
+                    queued = self.storage.enqueue_fetch_jobs(vacancies, query_weights=self.query_weights)
+                    self.fetch_wakeup.set()
+                    status.update(last_found=len(vacancies), last_queued=queued, last_error=None)
+                    due = started + self.schedules[name]
+                    self.logger.info(f"Sync {name}{' (full crawl)' if full_crawl else ''}: {len(vacancies)} found, "
+                                     f"{queued} queued for fetching, next run at {format_timestamp(due)}")
+                except Exception as e:
+                    self.logger.error(f"Sync {name} failed: {e}")
+                    status['last_error'] = str(e)
+                    due = time.time() + min(self.schedules[name], SYNC_ERROR_RETRY)
+                finally:
+                    status.update(state='idle', last_run_at=format_timestamp(started))
+
+    async def fetch_loop(self):
+        status = self.status['fetch']
+        while not self.stop_event.is_set():
+            self.fetch_wakeup.clear()
+            status['state'] = 'running'
+            started = time.time()
+            try:
+                await self.fetcher.run(time_budget=self.fetch_slice)
+                status['last_error'] = None
+            except Exception as e:
+                self.logger.error(f"Fetch slice failed: {e}")
+                status['last_error'] = str(e)
+            status.update(state='idle', slices=status['slices'] + 1, last_slice_at=format_timestamp(started))
+
+            # Срез закончился раньше бюджета - готовых задач нет: ждем ближайшего повтора или новых задач
+            if time.time() - started < self.fetch_slice:
+                next_attempt_at = self.storage.get_next_fetch_attempt_at()
+                wake_at = time.time() + FETCH_IDLE_POLL
+                if next_attempt_at is not None:
+                    wake_at = min(wake_at, next_attempt_at.timestamp())
+                status['state'] = 'waiting'
+                if await self.sleep_until(wake_at, self.fetch_wakeup):
+                    return
+
+    async def refresh_loop(self):
+        """Ставит на обновление порцию самых давно загруженных вакансий так, чтобы за refresh_age обновились все"""
+        status = self.status['refresh']
+        while True:
+            status['state'] = 'running'
+            try:
+                active = self.storage.count_active_vacancies()
+                batch = math.ceil(active * self.refresh_interval / self.refresh_age)
+                queued = self.storage.enqueue_stale_vacancies(timedelta(seconds=self.refresh_age), batch,
+                                                              self.query_weights) if batch else 0
+                if queued:
+                    self.fetch_wakeup.set()
+                    self.logger.info(f"Refresh: {queued} stale vacancies queued")
+                status.update(last_queued=queued, last_error=None)
+            except Exception as e:
+                self.logger.error(f"Refresh failed: {e}")
+                status['last_error'] = str(e)
+            status.update(state='idle', last_run_at=format_timestamp(time.time()))
+            if await self.sleep_until(time.time() + self.refresh_interval):
+                return
+
+    async def dictionaries_loop(self):
+        while True:
+            try:
+                await self.dictionaries.refresh()
+            except Exception as e:
+                self.logger.error(f"Dictionary refresh failed: {e}")
+            if await self.sleep_until(time.time() + DICTIONARIES_CHECK_INTERVAL):
+                return
+
+    def write_status(self, state: str = "running"):
+        """Атомарно перезаписывает файл статуса"""
+        if not self.status_file:
+            return
+        payload = {
+            'state': state,
+            'pid': os.getpid(),
+            'started_at': format_timestamp(self.started_at),
+            'updated_at': format_timestamp(time.time()),
+            **self.status,
+            'fetch_queue': self.storage.get_fetch_job_counts(),
+            'rate_limiter': self.rate_limiter.stats(),
+        }
+        tmp_path = f"{self.status_file}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.status_file)
+
+    async def status_loop(self):
+        while True:
+            try:
+                self.write_status()
+            except Exception as e:
+                self.logger.error(f"Could not write status file: {e}")
+            if await self.sleep_until(time.time() + STATUS_INTERVAL):
+                return
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except NotImplementedError:
+                # Windows: остановка только через KeyboardInterrupt
+                pass
+
+        for name in self.queries:
+            self.logger.info(f"Query {name}: sync every {self.schedules[name] / 3600:.1f}h")
+        self.logger.info(f"Request rate {self.rate_limiter.rate:.3f} req/s (max {self.rate_limiter.max_rate:.3f})")
+
+        # Синхронизацию и обновление при остановке можно прервать, загрузку деталей - нет
+        self.cancellable = [asyncio.create_task(self.sync_loop(name)) for name in self.queries]
+        self.cancellable.append(asyncio.create_task(self.dictionaries_loop()))
+        if self.refresh_age:
+            self.cancellable.append(asyncio.create_task(self.refresh_loop()))
+        tasks = self.cancellable + [asyncio.create_task(self.fetch_loop()), asyncio.create_task(self.status_loop())]
+
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self.write_status("stopped")
+            self.logger.info(f"Ingest daemon stopped after {(time.time() - self.started_at) / 3600:.1f}h")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Run ID sync, detail fetching and refresh continuously')
+    parser.add_argument('--filter', nargs='+', choices=list(QUERY_REGISTRY), default=['data_science'],
+                        help='Registered queries to keep in sync')
+    parser.add_argument('--query', action='append', metavar='NAME=TEXT', help='Additional ad-hoc search query')
+    parser.add_argument('--sync-interval', type=parse_duration, default=3600.0,
+                        help='Default refresh interval of a query (90, 45s, 30m, 2h)')
+    parser.add_argument('--schedule', action='append', type=parse_schedule, default=[], metavar='NAME=INTERVAL',
+                        help='Refresh interval of one query, e.g. frontend=6h; may be repeated')
+    parser.add_argument('--query-weight', action='append', type=parse_query_weight, default=[],
+                        metavar='NAME=WEIGHT', help='Priority bonus for vacancies found by a query')
+    parser.add_argument('--refresh-age', type=parse_duration,
+                        help='Refetch open vacancies fetched longer ago than this (spread evenly); off by default')
+    parser.add_argument('--refresh-interval', type=parse_duration, default=3600.0,
+                        help='How often to queue the next portion of stale vacancies')
+    parser.add_argument('--fetch-slice', type=parse_duration, default=300.0,
+                        help='Length of one detail fetching run between queue checks')
+    parser.add_argument('--daily-requests', type=int,
+                        help='API request budget per day; caps the request rate at budget / 86400')
+    parser.add_argument('--rps', type=float, default=1.0, help='Initial requests-per-second rate')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--concurrency', type=int, default=4, help='Parallel requests for search and details')
+    parser.add_argument('--output', default='vacancy_ids.csv', help='CSV the synced IDs are appended to')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
+    parser.add_argument('--cache-dir', default='raw_cache', help='Directory for raw API responses')
+    parser.add_argument('--no-cache', action='store_true', help='Do not keep raw API responses')
+    parser.add_argument('--status-file', default='ingest_status.json', help='JSON file with the daemon state')
+    parser.add_argument('--log-level', default='INFO', help='Logging level')
+
+    args = parser.parse_args()
+
+    setup_logging(args.log_level, 'ingest_daemon.log')
+
+    queries = resolve_queries(args.filter, args.query)
+    schedules = {name: args.sync_interval for name in queries}
+    for name, interval in args.schedule:
+        if name not in queries:
+            parser.error(f"--schedule for unknown query {name!r}")
+        schedules[name] = interval
+
+    async with IngestDaemon(queries, schedules, args.db, args.output, args.rps, args.max_rps,
+                            args.daily_requests, args.concurrency, args.fetch_slice,
+                            args.refresh_age, args.refresh_interval, args.status_file,
+                            dict(args.query_weight) or None,
+                            None if args.no_cache else args.cache_dir) as daemon:
+        await daemon.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,11 @@ import dash_bootstrap_components as dbc
 import ast
 import json
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from dictionaries import load_currency_rates
 
 # Загрузка данных
 df = pd.read_parquet('data/ds_vacancies.parquet')
@@ -577,61 +582,32 @@ def normalize_skill(skill):
     return skill_normalization.get(skill_lower, skill)
 
 
-# Функция для нормализации зарплат в рубли
-def normalize_salary(row):
-    try:
-        salary_from = row['salary_from'] 
-        salary_to = row['salary_to']
-        currency = row['salary_currency']
-        is_gross = row['salary_gross']
-        
-        # Если нет данных о зарплате от, возвращаем None
-        if pd.isna(salary_from) or salary_from <= 0:
-            return pd.Series({'salary_from_rub': None, 'salary_to_rub': None})
-        
-        # Курсы валют (актуализированы для DS данных)
-        exchange_rates = {
-            'RUR': 1,      # Рубли - базовая валюта
-            'USD': 95,     # Доллары США
-            'EUR': 105,    # Евро
-            'KZT': 0.2,    # Казахстанский тенге
-            'UZS': 0.0075, # Узбекский сум
-            'BYR': 0.035,  # Белорусский рубль
-            'UAH': 2.5,    # Украинская гривна
-            'KGS': 1.1,    # Киргизский сом
-            'AZN': 55      # Азербайджанский манат
-        }
-        
-        # Проверяем валюту и используем курс, по умолчанию рубли
-        rate = exchange_rates.get(currency, 1) if pd.notna(currency) else 1
-        
-        # Конвертируем в рубли с проверкой типов
-        salary_from_rub = float(salary_from * rate) if pd.notna(salary_from) and salary_from > 0 else None
-        salary_to_rub = float(salary_to * rate) if pd.notna(salary_to) and salary_to > 0 else None
-        
-        # Если зарплата gross (с налогами), то чистая ~= gross * 0.87
-        if pd.notna(is_gross) and float(is_gross) == 1.0:
-            if salary_from_rub:
-                salary_from_rub = float(salary_from_rub * 0.87)
-            if salary_to_rub:
-                salary_to_rub = float(salary_to_rub * 0.87)
-        
-        # Ограничиваем разумными значениями (от 1000 до 10млн рублей)
-        if salary_from_rub and (salary_from_rub < 1000 or salary_from_rub > 10000000):
-            salary_from_rub = None
-        if salary_to_rub and (salary_to_rub < 1000 or salary_to_rub > 10000000):
-            salary_to_rub = None
-            
-        return pd.Series({
-            'salary_from_rub': salary_from_rub,
-            'salary_to_rub': salary_to_rub
-        })
-    except Exception as e:
-        # В случае ошибки возвращаем None
-        return pd.Series({'salary_from_rub': None, 'salary_to_rub': None})
+# Курсы валют из кеша справочников HH.ru (src/dictionaries.py); без него - прежние фиксированные курсы
+CURRENCY_RATES = load_currency_rates()
+
+
+# Функция для нормализации зарплат в рубли (по всем строкам сразу)
+def normalize_salary(df):
+    salary_from = pd.to_numeric(df['salary_from'], errors='coerce').to_numpy(dtype=float)
+    salary_to = pd.to_numeric(df['salary_to'], errors='coerce').to_numpy(dtype=float)
+    is_gross = pd.to_numeric(df['salary_gross'], errors='coerce').to_numpy(dtype=float) == 1.0
+    
+    # Курс валюты (неизвестная или пустая - рубли); если зарплата gross (с налогами), то чистая ~= gross * 0.87
+    factor = CURRENCY_RATES.rates_for(df['salary_currency']) * np.where(is_gross, 0.87, 1.0)
+    
+    # Если нет данных о зарплате от, обе границы пустые
+    has_from = salary_from > 0
+    salary_from_rub = np.where(has_from, salary_from * factor, np.nan)
+    salary_to_rub = np.where(has_from & (salary_to > 0), salary_to * factor, np.nan)
+    
+    # Ограничиваем разумными значениями (от 1000 до 10млн рублей)
+    for values in (salary_from_rub, salary_to_rub):
+        values[(values < 1000) | (values > 10000000)] = np.nan
+    
+    return pd.DataFrame({'salary_from_rub': salary_from_rub, 'salary_to_rub': salary_to_rub}, index=df.index)
 
 # Применяем нормализацию
-df[['salary_from_rub', 'salary_to_rub']] = df.apply(normalize_salary, axis=1)
+df[['salary_from_rub', 'salary_to_rub']] = normalize_salary(df)
 
 # Глобальная переменная для хранения предыдущих опций фильтров
 _previous_filter_options = {}
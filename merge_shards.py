@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Объединяет БД шардов, загруженных на разных машинах (fetch_vacancies.py --shard k/n --db shard_k.db),
+в одну БД.
+Usage: python merge_shards.py vacancies.db shard_0.db shard_1.db ...
+"""
+import logging
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from storage import VacancyStorage
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Merge per-shard SQLite databases into one')
+    parser.add_argument('output', help='Target SQLite database (created if missing)')
+    parser.add_argument('shards', nargs='+', help='Shard databases to merge')
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    storage = VacancyStorage(args.output)
+    for shard_path in args.shards:
+        if Path(shard_path).resolve() == Path(args.output).resolve():
+            logging.warning(f"Skipping {shard_path}: it is the output database")
+            continue
+        storage.merge_shard(shard_path)
+
+    stats = storage.get_stats()
+    print(f"Merged {len(args.shards)} shards into {args.output}: {stats['total_vacancies']} vacancies, "
+          f"{stats['total_employers']} employers, {stats['unique_skills']} unique skills")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Запись и чтение кассет с ответами API HH.ru для офлайн-бенчмарков.
+
+Кассета - gzip-файл в формате JSON Lines, одна строка на ответ:
+{"method": "GET", "url": "/vacancies/123", "status": 200, "headers": {...}, "body": "..."}
+"""
+import gzip
+import json
+from collections import defaultdict, deque
+from typing import Dict, Tuple, Deque, Optional
+import httpx
+
+# Заголовки ответа, которые нужны для воспроизведения (остальные не сохраняем ради компактности)
+RECORDED_HEADERS = ("content-type", "retry-after")
+
+
+def request_key(method: str, url: httpx.URL) -> Tuple[str, str]:
+    """Ключ запроса: метод и путь с отсортированными параметрами, без хоста"""
+    query = "&".join(sorted(url.query.decode().split("&"))) if url.query else ""
+    return method.upper(), url.path + (f"?{query}" if query else "")
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Обертка над транспортом, дописывающая каждый ответ в кассету"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, path: str):
+        self.transport = transport
+        self.file = gzip.open(path, "at", encoding="utf-8")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self.transport.handle_async_request(request)
+        body = await response.aread()
+
+        method, url = request_key(request.method, request.url)
+        entry = {
+            "method": method,
+            "url": url,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "body": body.decode("utf-8", errors="replace"),
+        }
+        self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        # aread() уже распаковал тело, поэтому заголовки сжатия и длины к новому ответу не относятся
+        headers = [(name, value) for name, value in response.headers.multi_items()
+                   if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=body,
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        self.file.close()
+        await self.transport.aclose()
+
+
+class Cassette:
+    """Записанные ответы, сгруппированные по запросу; повторы одного запроса отдаются по кругу"""
+
+    def __init__(self, path: str):
+        self.entries: Dict[Tuple[str, str], Deque[dict]] = defaultdict(deque)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[(entry["method"], entry["url"])].append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
+
+    def lookup(self, method: str, url: httpx.URL) -> Optional[dict]:
+        """Возвращает следующий записанный ответ на запрос или None"""
+        entries = self.entries.get(request_key(method, url))
+        if not entries:
+            return None
+        entry = entries[0]
+        entries.rotate(-1)
+        return entry
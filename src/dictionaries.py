@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Кеш справочников HH.ru: курсы валют из /dictionaries и дерево регионов из /areas.
+
+Справочники загружаются не чаще раза в TTL в таблицы currencies и areas SQLite БД, а для расчетов
+выдаются как отсортированные массивы numpy: конвертация зарплат и сворачивание городов до регионов
+выполняются векторно, без поиска по словарю для каждой строки.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+from storage import VacancyStorage
+from rate_limiter import RateLimiter
+from http_client import create_client
+from log_setup import setup_logging
+
+# БД со справочниками для дашбордов (по умолчанию vacancies.db в текущем каталоге)
+DB_ENV = "HH_DICTIONARIES_DB"
+DEFAULT_TTL = timedelta(days=1)
+
+# Рублей за единицу валюты, если справочник еще не загружался (прежние значения дашбордов)
+FALLBACK_RUB_RATES: Dict[str, float] = {
+    'RUR': 1,
+    'USD': 95,
+    'EUR': 105,
+    'KZT': 0.2,
+    'UZS': 0.0075,
+    'BYR': 0.035,
+    'UAH': 2.5,
+    'KGS': 1.1,
+    'AZN': 55,
+}
+
+
+class CurrencyRates:
+    """Курсы валют к рублю: отсортированные коды и выровненный с ними массив курсов"""
+
+    def __init__(self, rub_rates: Dict[str, float]):
+        # HH.ru использует код RUR, но в данных встречается и RUB
+        rub_rates = {**rub_rates, 'RUB': rub_rates.get('RUR', 1)}
+        codes = sorted(rub_rates)
+        self.codes = np.array(codes)
+        self.rub_per_unit = np.array([rub_rates[code] for code in codes], dtype=float)
+
+    def rates_for(self, currencies: Iterable, default: float = 1.0) -> np.ndarray:
+        """Курс к рублю для каждого элемента; неизвестная или пустая валюта получает default"""
+        currencies = np.asarray(currencies, dtype=object).astype(str)
+        index = np.minimum(np.searchsorted(self.codes, currencies), len(self.codes) - 1)
+        return np.where(self.codes[index] == currencies, self.rub_per_unit[index], default)
+
+    def to_rub(self, amounts: Iterable, currencies: Iterable, default: float = 1.0) -> np.ndarray:
+        """Суммы в рублях"""
+        return np.asarray(amounts, dtype=float) * self.rates_for(currencies, default)
+
+
+class AreaTree:
+    """Дерево регионов HH.ru в виде массивов, отсортированных по id"""
+
+    def __init__(self, rows: List[tuple]):
+        # rows: (id, parent_id, name, region_id, country_id, depth); нечисловых id в справочнике нет
+        rows = sorted(rows, key=lambda row: int(row[0]))
+        self.ids = np.array([int(row[0]) for row in rows], dtype=np.int64)
+        self.names = np.array([row[2] for row in rows], dtype=object)
+        self.region_ids = np.array([int(row[3]) for row in rows], dtype=np.int64)
+        self.country_ids = np.array([int(row[4]) for row in rows], dtype=np.int64)
+        self.depths = np.array([row[5] for row in rows], dtype=np.int64)
+
+        # Индекс по названию: при совпадении названий берется регион меньшей глубины
+        by_name = sorted(range(len(rows)), key=lambda i: (rows[i][2], rows[i][5]))
+        first = [i for n, i in enumerate(by_name) if n == 0 or rows[i][2] != rows[by_name[n - 1]][2]]
+        self.sorted_names = np.array([rows[i][2] for i in first])
+        self.name_positions = np.array(first, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def positions(self, area_ids: Iterable) -> np.ndarray:
+        """Позиции регионов в массивах (-1 для неизвестных)"""
+        area_ids = np.asarray(area_ids, dtype=np.int64)
+        if not len(self.ids):
+            return np.full(area_ids.shape, -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.ids, area_ids), len(self.ids) - 1)
+        return np.where(self.ids[index] == area_ids, index, -1)
+
+    def positions_by_name(self, area_names: Iterable) -> np.ndarray:
+        """Позиции регионов по названию (-1 для неизвестных)"""
+        area_names = np.asarray(area_names, dtype=object).astype(str)
+        if not len(self.sorted_names):
+            return np.full(area_names.shape, -1, dtype=np.int64)
+        index = np.minimum(np.searchsorted(self.sorted_names, area_names), len(self.sorted_names) - 1)
+        return np.where(self.sorted_names[index] == area_names, self.name_positions[index], -1)
+
+    def region_of(self, area_ids: Iterable) -> np.ndarray:
+        """id региона первого уровня (область, край, город федерального значения); -1 для неизвестных"""
+        positions = self.positions(area_ids)
+        if not len(self.ids):
+            return positions
+        return np.where(positions >= 0, self.region_ids[positions], -1)
+
+    def region_names(self, area_names: Iterable) -> np.ndarray:
+        """Названия регионов для названий городов; неизвестные названия остаются как есть"""
+        area_names = np.asarray(area_names, dtype=object)
+        if not len(self.ids):
+            return area_names
+        positions = self.positions_by_name(area_names)
+        regions = self.names[self.positions(self.region_ids[positions])]
+        return np.where(positions >= 0, regions, area_names)
+
+
+def flatten_areas(tree: List[dict]) -> List[tuple]:
+    """Строки таблицы areas из дерева /areas: страна - глубина 0, регион - предок глубины 1"""
+    rows = []
+    stack = [(area, None, 0, area['id'], area['id']) for area in tree]
+    while stack:
+        area, parent_id, depth, region_id, country_id = stack.pop()
+        rows.append((area['id'], parent_id, area['name'], region_id, country_id, depth))
+        for child in area.get('areas') or []:
+            # Для регионов первого уровня регион - они сами, глубже - унаследованный
+            child_region = child['id'] if depth == 0 else region_id
+            stack.append((child, area['id'], depth + 1, child_region, country_id))
+    return rows
+
+
+def parse_currencies(dictionaries: dict) -> List[Tuple]:
+    """Строки таблицы currencies из ответа /dictionaries"""
+    return [(item['code'], item.get('abbr'), item.get('name'), item.get('rate'), item.get('in_use'))
+            for item in dictionaries.get('currency', [])]
+
+
+def connect_readonly(db_path: str) -> Optional[sqlite3.Connection]:
+    """Подключение только для чтения; None, если БД нет (дашборд не должен создавать файл)"""
+    if not Path(db_path).exists():
+        return None
+    return sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+
+
+def load_currency_rates(db_path: Optional[str] = None) -> CurrencyRates:
+    """Курсы из кеша справочников поверх FALLBACK_RUB_RATES"""
+    db_path = db_path or os.environ.get(DB_ENV, "vacancies.db")
+    rub_rates = dict(FALLBACK_RUB_RATES)
+    try:
+        conn = connect_readonly(db_path)
+        if conn is not None:
+            with conn:
+                # В справочнике - единиц валюты за рубль
+                rub_rates.update((code, 1 / rate) for code, rate in
+                                 conn.execute("SELECT code, rate FROM currencies WHERE rate > 0"))
+            conn.close()
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"Using fallback currency rates: {e}")
+    return CurrencyRates(rub_rates)
+
+
+def load_area_tree(db_path: Optional[str] = None) -> AreaTree:
+    """Дерево регионов из кеша справочников (пустое, если справочник не загружался)"""
+    db_path = db_path or os.environ.get(DB_ENV, "vacancies.db")
+    rows = []
+    try:
+        conn = connect_readonly(db_path)
+        if conn is not None:
+            with conn:
+                rows = conn.execute(
+                    "SELECT id, parent_id, name, region_id, country_id, depth FROM areas"
+                ).fetchall()
+            conn.close()
+    except sqlite3.Error as e:
+        logging.getLogger(__name__).warning(f"Area tree is not available: {e}")
+    return AreaTree(rows)
+
+
+class DictionaryCache:
+    """Обновляет таблицы справочников, если они старше TTL"""
+
+    def __init__(self, db_path: str = "vacancies.db", ttl: timedelta = DEFAULT_TTL,
+                 rate_limiter: Optional[RateLimiter] = None, storage: Optional[VacancyStorage] = None):
+        self.db_path = db_path
+        self.storage = storage or VacancyStorage(db_path)
+        self.ttl = ttl
+        # Регулятор частоты можно разделить с другими загрузчиками, передав общий объект
+        self.rate_limiter = rate_limiter or RateLimiter(1.0)
+        self.logger = logging.getLogger(__name__)
+
+    def is_fresh(self, table: str) -> bool:
+        fetched_at = self.storage.get_dictionary_fetched_at(table)
+        return fetched_at is not None and datetime.now() - fetched_at < self.ttl
+
+    async def refresh(self, force: bool = False) -> Dict[str, int]:
+        """Загружает устаревшие справочники; при ошибке остаются прежние данные. Возвращает число строк"""
+        updated = {}
+        stale = [table for table in ("currencies", "areas") if force or not self.is_fresh(table)]
+        if not stale:
+            return updated
+
+        async with create_client("HH Dictionary Cache 1.0") as client:
+            for table in stale:
+                url = "/dictionaries" if table == "currencies" else "/areas"
+                try:
+                    await self.rate_limiter.acquire()
+                    response = await client.get(url)
+                    response.raise_for_status()
+                    self.rate_limiter.on_success()
+                    rows = parse_currencies(response.json()) if table == "currencies" else flatten_areas(response.json())
+                except Exception as e:
+                    self.logger.error(f"Could not refresh {table} from {url}: {e}")
+                    continue
+                self.storage.save_dictionary(table, rows)
+                updated[table] = len(rows)
+                self.logger.info(f"Refreshed {table}: {len(rows)} rows")
+        return updated
+
+    def currency_rates(self) -> CurrencyRates:
+        return load_currency_rates(self.db_path)
+
+    def area_tree(self) -> AreaTree:
+        return load_area_tree(self.db_path)
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh cached HH.ru dictionaries (currency rates, area tree)')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
+    parser.add_argument('--ttl-hours', type=float, default=24, help='Refetch dictionaries older than this')
+    parser.add_argument('--force', action='store_true', help='Refetch regardless of TTL')
+    parser.add_argument('--log-level', default='INFO', help='Logging level')
+
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+
+    cache = DictionaryCache(args.db, timedelta(hours=args.ttl_hours))
+    updated = await cache.refresh(args.force)
+    if not updated:
+        print("Dictionaries are fresh")
+    rates = cache.currency_rates()
+    print(f"{len(rates.codes)} currencies, {len(cache.area_tree())} areas")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Поиск вакансий через граф похожих вакансий HH.ru (/vacancies/{id}/similar_vacancies).
+
+Начиная с известных релевантных вакансий, обход в ширину расширяет фронтир похожими
+вакансиями с ограничением глубины и числа запросов. ID уже раскрытых вакансий хранятся между
+запусками в отсортированном массиве int64 (.npy), а найденные ID ставятся в очередь загрузки fetch_jobs.
+Эндпоинт требует токен соискателя: --token или переменная окружения HH_ACCESS_TOKEN.
+"""
+import asyncio
+import csv
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+import httpx
+import numpy as np
+
+from storage import VacancyStorage
+from rate_limiter import RateLimiter, THROTTLE_STATUSES, parse_retry_after
+from http_client import ClientMetrics, create_client
+from log_setup import setup_logging
+
+TOKEN_ENV = "HH_ACCESS_TOKEN"
+
+
+class VisitedSet:
+    """Компактное множество ID: отсортированный массив int64 на диске плюс буфер новых"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.ids = np.load(self.path) if self.path.exists() else np.empty(0, dtype=np.int64)
+        self.added: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.added)
+
+    def __contains__(self, vacancy_id: int) -> bool:
+        if vacancy_id in self.added:
+            return True
+        index = np.searchsorted(self.ids, vacancy_id)
+        return index < len(self.ids) and self.ids[index] == vacancy_id
+
+    def add(self, vacancy_id: int) -> bool:
+        """Добавляет ID; False - если он уже был"""
+        if vacancy_id in self:
+            return False
+        self.added.add(vacancy_id)
+        return True
+
+    def save(self):
+        """Вливает буфер в массив и атомарно перезаписывает файл"""
+        if self.added:
+            self.ids = np.union1d(self.ids, np.fromiter(self.added, dtype=np.int64, count=len(self.added)))
+            self.added.clear()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, self.ids)
+        os.replace(tmp_path, self.path)
+
+
+class RelatedVacancyCrawler:
+    def __init__(self, db_path: str = "vacancies.db", visited_path: str = "related_visited.npy",
+                 concurrency: int = 4, rps: float = 1.0, max_rps: Optional[float] = None,
+                 max_retries: int = 5, rate_limiter: Optional[RateLimiter] = None,
+                 token: Optional[str] = None, name_pattern: Optional[str] = None):
+        self.storage = VacancyStorage(db_path)
+        self.visited = VisitedSet(visited_path)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        # Расширяем фронтир только вакансиями, название которых подходит под шаблон (если задан)
+        self.name_pattern = re.compile(name_pattern, re.IGNORECASE) if name_pattern else None
+        self.logger = logging.getLogger(__name__)
+
+        # Регулятор частоты можно разделить с другими загрузчиками, передав общий объект
+        self.rate_limiter = rate_limiter or RateLimiter(rps, max_rate=max_rps)
+
+        self.metrics = ClientMetrics()
+        self.client = create_client(
+            "HH Related Vacancy Crawler 1.0",
+            metrics=self.metrics,
+            max_connections=max(10, self.concurrency),
+            max_keepalive_connections=max(10, self.concurrency)
+        )
+        token = token or os.environ.get(TOKEN_ENV)
+        if token:
+            self.client.headers["Authorization"] = f"Bearer {token}"
+        self.requests = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.client.aclose()
+
+    async def fetch_similar(self, vacancy_id: str, page: int = 0, per_page: int = 100) -> Optional[List[dict]]:
+        """Похожие вакансии (одна страница); None при ошибке (вакансия останется нераскрытой)"""
+        url = f"/vacancies/{vacancy_id}/similar_vacancies"
+        params = {"page": page, "per_page": per_page}
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire()
+                response = await self.client.get(url, params=params)
+
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.on_throttle(retry_after)
+                    self.logger.warning(f"HTTP {response.status_code} for similar to {vacancy_id} "
+                                        f"(attempt {attempt + 1}/{self.max_retries + 1}), "
+                                        f"rate lowered to {self.rate_limiter.rate:.2f} req/s")
+                    continue
+
+                self.rate_limiter.on_success()
+                if response.status_code == 200:
+                    return response.json().get('items', [])
+                if response.status_code == 404:
+                    # Вакансию удалили - раскрывать нечего
+                    return []
+                if response.status_code in (401, 403):
+                    self.logger.error(f"HTTP {response.status_code} for similar vacancies: "
+                                      f"an applicant token is required ({TOKEN_ENV})")
+                else:
+                    self.logger.error(f"HTTP {response.status_code} for similar to {vacancy_id}: {response.text}")
+                return None
+
+            self.logger.error(f"Giving up on similar to {vacancy_id} after {self.max_retries + 1} throttled attempts")
+            return None
+
+        except httpx.HTTPError as e:
+            self.logger.error(f"Error fetching similar to {vacancy_id}: {e}")
+            return None
+
+    def is_relevant(self, item: dict) -> bool:
+        return self.name_pattern is None or bool(self.name_pattern.search(item.get('name', '')))
+
+    async def run(self, seed_ids: Iterable[str], max_depth: int = 2, max_requests: int = 1000,
+                  pages_per_vacancy: int = 1) -> int:
+        """
+        Обходит граф похожих вакансий в ширину
+
+        Args:
+            seed_ids: Известные релевантные вакансии
+            max_depth: Сколько шагов от исходных вакансий делать
+            max_requests: Бюджет запросов на весь обход (повторы после 429/503 не считаются)
+            pages_per_vacancy: Сколько страниц похожих запрашивать для каждой вакансии
+
+        Returns:
+            Сколько новых вакансий поставлено в очередь загрузки
+        """
+        # В visited попадают только раскрытые вакансии: найденные на последнем шаге или
+        # не раскрытые из-за бюджета раскроются в следующем запуске, если их передать как исходные
+        seen = {int(vid) for vid in map(str, seed_ids) if vid.isdigit()}
+        frontier = [str(vid) for vid in sorted(seen) if vid not in self.visited]
+
+        start_time = time.time()
+        discovered = 0
+        self.logger.info(f"Starting related crawl from {len(frontier)} seeds "
+                         f"({len(self.visited)} IDs already expanded), depth {max_depth}, budget {max_requests} requests")
+
+        for depth in range(1, max_depth + 1):
+            if not frontier or self.requests >= max_requests:
+                break
+
+            queue: asyncio.Queue = asyncio.Queue()
+            for vacancy_id in frontier:
+                queue.put_nowait(vacancy_id)
+            found: List[dict] = []
+
+            async def worker():
+                while self.requests < max_requests:
+                    try:
+                        vacancy_id = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    for page in range(pages_per_vacancy):
+                        if self.requests >= max_requests:
+                            return
+                        # Бюджет резервируется до запроса, чтобы параллельные воркеры его не превысили
+                        self.requests += 1
+                        items = await self.fetch_similar(vacancy_id, page)
+                        if items is None:
+                            break
+                        found.extend(items)
+                        if len(items) < 100:
+                            self.visited.add(int(vacancy_id))
+                            break
+                    else:
+                        self.visited.add(int(vacancy_id))
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(frontier)))))
+
+            # Новые релевантные вакансии - следующий фронтир и задачи на загрузку деталей
+            new_items = []
+            for item in found:
+                vacancy_id = item.get('id', '')
+                if vacancy_id.isdigit() and int(vacancy_id) not in seen and self.is_relevant(item):
+                    seen.add(int(vacancy_id))
+                    if int(vacancy_id) not in self.visited:
+                        new_items.append(item)
+            self.storage.enqueue_fetch_jobs(
+                {'id': item['id'], 'published_at': item.get('published_at')} for item in new_items
+            )
+            self.visited.save()
+
+            discovered += len(new_items)
+            frontier = [item['id'] for item in new_items]
+            self.logger.info(f"Depth {depth}: {len(found)} similar vacancies, {len(new_items)} new, "
+                             f"{self.requests}/{max_requests} requests used")
+
+        self.logger.info(f"Related crawl completed in {time.time() - start_time:.1f}s: "
+                         f"{discovered} new vacancies queued for fetching")
+        self.logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
+        self.metrics.log_summary(self.logger)
+        return discovered
+
+
+def read_seed_ids(csv_file: str) -> List[str]:
+    """ID из первой колонки CSV"""
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # заголовок
+        return [row[0].strip() for row in reader if row and row[0].strip()]
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Discover vacancies through the HH.ru similar vacancies graph')
+    parser.add_argument('seeds', help='CSV file whose first column holds known relevant vacancy IDs')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database with the fetch queue')
+    parser.add_argument('--visited', default='related_visited.npy', help='Persisted set of already expanded IDs')
+    parser.add_argument('--depth', type=int, default=2, help='Maximum distance from the seed vacancies')
+    parser.add_argument('--budget', type=int, default=1000, help='Maximum number of API requests')
+    parser.add_argument('--pages', type=int, default=1, help='Pages of similar vacancies per vacancy')
+    parser.add_argument('--match', help='Only follow and queue vacancies whose name matches this regex')
+    parser.add_argument('--token', help=f'Applicant OAuth token (default: ${TOKEN_ENV})')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of parallel requests')
+    parser.add_argument('--rps', type=float, default=1.0, help='Initial requests-per-second rate')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--log-level', default='INFO', help='Logging level')
+
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+
+    async with RelatedVacancyCrawler(args.db, args.visited, args.concurrency, args.rps, args.max_rps,
+                                     token=args.token, name_pattern=args.match) as crawler:
+        await crawler.run(read_seed_ids(args.seeds), args.depth, args.budget, args.pages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
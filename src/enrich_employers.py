@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Скрипт для обогащения работодателей данными из /employers/{id} API HH.ru
+(отрасли, тип, сайт, регион, число открытых вакансий).
+Каждый работодатель запрашивается не чаще раза в TTL.
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+import httpx
+
+from models import EmployerDetails
+from storage import VacancyStorage
+from rate_limiter import RateLimiter, THROTTLE_STATUSES, parse_retry_after
+from http_client import ClientMetrics, create_client
+from log_setup import ProgressReporter, setup_logging
+
+
+class EmployerEnricher:
+    def __init__(self, db_path: str = "vacancies.db", concurrency: int = 4, rps: float = 1.0,
+                 max_rps: Optional[float] = None, max_retries: int = 5,
+                 rate_limiter: Optional[RateLimiter] = None):
+        self.storage = VacancyStorage(db_path)
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.logger = logging.getLogger(__name__)
+
+        # Регулятор частоты можно разделить с VacancyFetcher, передав общий объект
+        self.rate_limiter = rate_limiter or RateLimiter(rps, max_rate=max_rps)
+
+        self.metrics = ClientMetrics()
+        self.client = create_client(
+            "HH Employer Enricher 1.0",
+            metrics=self.metrics,
+            max_connections=max(10, self.concurrency),
+            max_keepalive_connections=max(10, self.concurrency)
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.client.aclose()
+
+    async def fetch_employer(self, employer_id: str) -> Optional[dict]:
+        """
+        Получает карточку работодателя
+
+        Returns:
+            JSON ответа; {} если работодатель не найден; None при ошибке (попробуем в следующий раз)
+        """
+        url = f"/employers/{employer_id}"
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire()
+                response = await self.client.get(url)
+
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.on_throttle(retry_after)
+                    self.logger.warning(f"HTTP {response.status_code} for employer {employer_id} "
+                                        f"(attempt {attempt + 1}/{self.max_retries + 1}), "
+                                        f"rate lowered to {self.rate_limiter.rate:.2f} req/s")
+                    continue
+
+                self.rate_limiter.on_success()
+                if response.status_code == 200:
+                    return response.json()
+                elif response.status_code == 404:
+                    self.logger.warning(f"Employer {employer_id} not found (404)")
+                    return {}
+                else:
+                    self.logger.error(f"HTTP {response.status_code} for employer {employer_id}: {response.text}")
+                    return None
+
+            self.logger.error(f"Giving up on employer {employer_id} after {self.max_retries + 1} throttled attempts")
+            return None
+
+        except httpx.TimeoutException:
+            self.logger.error(f"Timeout fetching employer {employer_id}")
+            return None
+        except Exception as e:
+            self.logger.error(f"Error fetching employer {employer_id}: {e}")
+            return None
+
+    async def enrich_employer(self, employer_id: str) -> bool:
+        """Получает и сохраняет данные одного работодателя"""
+        data = await self.fetch_employer(employer_id)
+        if data is None:
+            return False
+
+        try:
+            details = EmployerDetails(**data) if data else None
+        except Exception as e:
+            self.logger.error(f"Validation error for employer {employer_id}: {e}")
+            return False
+
+        self.storage.save_employer_details(employer_id, details)
+        return details is not None
+
+    async def run(self, ttl_days: float = 30, max_employers: Optional[int] = None):
+        """Обогащает всех работодателей, у которых нет данных или они старше TTL"""
+        employer_ids = self.storage.get_employers_to_enrich(timedelta(days=ttl_days), max_employers)
+        if not employer_ids:
+            self.logger.info("All employers are enriched within TTL")
+            return
+
+        total = len(employer_ids)
+        self.logger.info(f"Enriching {total} employers with {self.concurrency} workers (TTL {ttl_days} days)")
+
+        stats = {"done": 0, "successful": 0, "failed": 0}
+        start_time = time.time()
+        progress = ProgressReporter(self.logger, total, unit="employers")
+        queue: asyncio.Queue = asyncio.Queue()
+        for employer_id in employer_ids:
+            queue.put_nowait(employer_id)
+
+        async def worker():
+            while True:
+                try:
+                    employer_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+
+                success = await self.enrich_employer(employer_id)
+                stats["done"] += 1
+                stats["successful" if success else "failed"] += 1
+
+                progress.update(stats["done"], f"API rate: {self.rate_limiter.rate:.2f} req/s")
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        progress.finish(stats["done"], f"API rate: {self.rate_limiter.rate:.2f} req/s")
+
+        self.logger.info(f"Employer enrichment completed in {(time.time() - start_time) / 60:.1f} minutes")
+        self.logger.info(f"Enriched: {stats['successful']}, Failed or not found: {stats['failed']}")
+        self.logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
+        self.metrics.log_summary(self.logger)
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Enrich employers with data from /employers/{id}')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
+    parser.add_argument('--ttl-days', type=float, default=30, help='Refetch an employer after this many days')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of parallel requests')
+    parser.add_argument('--rps', type=float, default=1.0, help='Initial requests-per-second rate')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for a request throttled with 429/503')
+    parser.add_argument('--max', type=int, help='Maximum number of employers to enrich')
+    parser.add_argument('--log-level', default='INFO', help='Logging level')
+
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+
+    async with EmployerEnricher(args.db, args.concurrency, args.rps, args.max_rps, args.max_retries) as enricher:
+        await enricher.run(args.ttl_days, args.max)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -8,6 +8,7 @@ import argparse
 import os
 from dotenv import load_dotenv
 from technology_extractor import TechnologyExtractor
+from log_setup import setup_logging
 
 
 def main():
@@ -40,8 +41,11 @@ def main():
                        help="Выходной parquet файл (по умолчанию: data/vacancies.parquet)")
     parser.add_argument("--batch-size", type=int, default=5,
                        help="Размер батча для API запросов (по умолчанию: 5)")
+    parser.add_argument("--verbose", action="store_true",
+                       help="Печатать строки о каждой вакансии и каждом запросе к API")
     
     args = parser.parse_args()
+    setup_logging("DEBUG" if args.verbose else "INFO", queued=False)
     
     # Проверяем корректность аргументов
     if args.start < 0:
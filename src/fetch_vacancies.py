@@ -1,32 +1,101 @@
+import argparse
 import asyncio
 import csv
+import gzip
+import heapq
 import json
 import logging
+import os
+import socket
 import time
-from pathlib import Path
-from typing import List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 import httpx
-import pandas as pd
 from datetime import datetime
 
 from models import Vacancy, VacancyResponse
-from storage import VacancyStorage
+from storage import VacancyStorage, compute_content_hash, prepare_vacancy_record, shard_of
+from raw_cache import RawResponseCache
+from rate_limiter import RateLimiter, THROTTLE_STATUSES, parse_retry_after
+from http_client import ClientMetrics, create_client
+from log_setup import ProgressReporter, setup_logging
+
+# Сколько задач очереди забирать за раз (не меньше 4 на воркер)
+JOB_BATCH_SIZE = 100
+# Разделитель имен запросов в колонке queries CSV (см. extract_vacancy_ids.py)
+QUERIES_SEPARATOR = ";"
+
+
+def prepare_cached_vacancy(entry: Tuple[str, str, str]) -> Tuple[str, Optional[dict], Optional[str]]:
+    """Валидирует и конвертирует ответ из кеша (выполняется в пуле процессов)"""
+    vacancy_id, fetched_at, path = entry
+    try:
+        with gzip.open(path, "rb") as f:
+            raw = f.read()
+        vacancy = Vacancy.model_validate_json(raw)
+        vacancy.fetched_at = datetime.fromisoformat(fetched_at)
+        return vacancy_id, prepare_vacancy_record(vacancy, raw.decode("utf-8"), compute_content_hash(raw)), None
+    except Exception as e:
+        return vacancy_id, None, str(e)
+
+
+class FetchError(Exception):
+    """Ошибка загрузки вакансии; retryable - стоит ли повторять задачу позже, status_code - HTTP статус ответа"""
+    
+    def __init__(self, message: str, retryable: bool = True, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
 
 
 class VacancyFetcher:
-    def __init__(self, csv_file: str, db_path: str = "vacancies.db", delay: float = 1.0):
+    def __init__(self, csv_file: Optional[str], db_path: str = "vacancies.db", delay: float = 1.0,
+                 concurrency: int = 1, rps: Optional[float] = None, max_rps: Optional[float] = None,
+                 max_retries: int = 5, rate_limiter: Optional[RateLimiter] = None,
+                 max_connections: Optional[int] = None, cache_dir: Optional[str] = "raw_cache",
+                 max_attempts: int = 5, retry_base_delay: float = 30.0, max_retry_wait: float = 120.0,
+                 shard: Optional[Tuple[int, int]] = None, lease_ttl: float = 900.0,
+                 query_weights: Optional[Dict[str, float]] = None, progress_interval: float = 10.0,
+                 storage: Optional[VacancyStorage] = None):
         self.csv_file = csv_file
-        self.storage = VacancyStorage(db_path)
+        # Хранилище (и его соединение с пачкой незафиксированных записей) можно разделить с другими загрузчиками
+        self.storage = storage or VacancyStorage(db_path)
+        # Кеш всех полученных ответов для повторной обработки без запросов к API
+        self.raw_cache = RawResponseCache(cache_dir) if cache_dir else None
         self.delay = delay
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        # Повторы задач очереди: число попыток, базовая задержка и сколько ждать отложенный повтор в рамках запуска
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_wait = max_retry_wait
+        # Несколько процессов делят одну очередь (шард k из n и/или аренда задач с истечением)
+        self.shard = shard
+        self.lease_ttl = lease_ttl
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # Веса поисковых запросов в приоритете загрузки (см. priority.py)
+        self.query_weights = query_weights
+        # Сводка прогресса не чаще раза в progress_interval секунд; строки о каждой вакансии - на DEBUG
+        self.progress_interval = progress_interval
+        # Выставляется request_stop(): начатые запросы завершаются, новые задачи не берутся
+        self.stopping = False
         self.logger = logging.getLogger(__name__)
         
-        # HTTP клиент с настройками
-        self.client = httpx.AsyncClient(
-            timeout=30.0,
-            headers={
-                "User-Agent": "HH Vacancy Fetcher 1.0",
-                "Accept": "application/json"
-            }
+        # Общий регулятор частоты для всех воркеров (стартует с 1/delay или --rps)
+        if rate_limiter is None:
+            if not rps:
+                rps = 1.0 / delay if delay > 0 else 1.0
+            rate_limiter = RateLimiter(rps, max_rate=max_rps)
+        self.rate_limiter = rate_limiter
+        
+        # HTTP клиент с пулом соединений под число воркеров и метриками соединений
+        self.metrics = ClientMetrics()
+        self.client = create_client(
+            "HH Vacancy Fetcher 1.0",
+            metrics=self.metrics,
+            max_connections=max_connections or max(10, self.concurrency),
+            max_keepalive_connections=max_connections or max(10, self.concurrency)
         )
     
     async def __aenter__(self):
@@ -34,172 +103,257 @@ class VacancyFetcher:
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.client.aclose()
+        self.storage.flush()
+        if self.raw_cache is not None:
+            self.raw_cache.flush()
     
-    def load_vacancy_ids(self) -> List[str]:
-        """Загружает ID вакансий из CSV файла"""
-        vacancy_ids = []
-        try:
-            # Читаем CSV файл
-            df = pd.read_csv(self.csv_file)
-            # Предполагаем, что ID в первой колонке
-            vacancy_ids = df.iloc[:, 0].astype(str).tolist()
-            self.logger.info(f"Loaded {len(vacancy_ids)} vacancy IDs from {self.csv_file}")
-        except Exception as e:
-            self.logger.error(f"Error loading CSV file: {e}")
-            raise
-        
-        return vacancy_ids
+    def request_stop(self):
+        """Просит run() завершиться после текущих запросов (не начатые задачи вернутся в очередь)"""
+        self.stopping = True
     
-    def filter_new_vacancies(self, vacancy_ids: List[str]) -> List[str]:
-        """Фильтрует только новые вакансии (которых еще нет в БД)"""
-        processed_ids = set(self.storage.get_processed_vacancy_ids())
-        new_ids = [vid for vid in vacancy_ids if vid not in processed_ids]
-        
-        self.logger.info(f"Found {len(new_ids)} new vacancies out of {len(vacancy_ids)} total")
-        if processed_ids:
-            self.logger.info(f"Skipping {len(processed_ids)} already processed vacancies")
-        
-        return new_ids
+    def iter_vacancy_ids(self, start_index: Optional[int] = None,
+                         end_index: Optional[int] = None) -> Iterator[dict]:
+        """
+        Построчно читает CSV файла (срез [start_index:end_index]): ID из первой колонки,
+        а также published_at и queries, если такие колонки есть (для приоритета загрузки)
+        """
+        with open(self.csv_file, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            published_col = header.index('published_at') if 'published_at' in header else None
+            queries_col = header.index('queries') if 'queries' in header else None
+            rows = islice(reader, start_index or 0, end_index)
+            for row in rows:
+                if not row or not row[0].strip():
+                    continue
+                job = {'id': row[0].strip()}
+                if published_col is not None and published_col < len(row):
+                    job['published_at'] = row[published_col]
+                if queries_col is not None and queries_col < len(row):
+                    job['queries'] = [name for name in row[queries_col].split(QUERIES_SEPARATOR) if name]
+                yield job
     
-    async def fetch_vacancy(self, vacancy_id: str) -> Optional[dict]:
-        """Получает данные одной вакансии из API HH.ru"""
-        url = f"https://api.hh.ru/vacancies/{vacancy_id}"
+    async def fetch_vacancy(self, vacancy_id: str) -> dict:
+        """Получает данные одной вакансии из API HH.ru в виде словаря (см. fetch_vacancy_raw)"""
+        return json.loads(await self.fetch_vacancy_raw(vacancy_id))
+    
+    async def fetch_vacancy_raw(self, vacancy_id: str) -> bytes:
+        """
+        Получает исходные байты ответа API HH.ru по одной вакансии
+        
+        Raises:
+            FetchError: запрос не удался; retryable=False, если повтор не поможет (404 и т.п.)
+        """
+        url = f"/vacancies/{vacancy_id}"
         
         try:
-            self.logger.debug(f"Fetching vacancy {vacancy_id}")
-            response = await self.client.get(url)
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire()
+                self.logger.debug(f"Fetching vacancy {vacancy_id}")
+                response = await self.client.get(url)
+                
+                if response.status_code in THROTTLE_STATUSES:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    self.rate_limiter.on_throttle(retry_after)
+                    self.logger.warning(f"HTTP {response.status_code} for vacancy {vacancy_id} "
+                                        f"(attempt {attempt + 1}/{self.max_retries + 1}), "
+                                        f"rate lowered to {self.rate_limiter.rate:.2f} req/s")
+                    continue
+                
+                self.rate_limiter.on_success()
+                if response.status_code == 200:
+                    if self.raw_cache is not None:
+                        self.raw_cache.put(vacancy_id, response.content)
+                    return response.content
+                elif response.status_code == 404:
+                    raise FetchError("not found (404)", retryable=False, status_code=404)
+                elif response.status_code >= 500:
+                    raise FetchError(f"HTTP {response.status_code}", status_code=response.status_code)
+                else:
+                    raise FetchError(f"HTTP {response.status_code}: {response.text[:500]}", retryable=False,
+                                     status_code=response.status_code)
             
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                self.logger.warning(f"Vacancy {vacancy_id} not found (404)")
-                return None
-            elif response.status_code == 429:
-                self.logger.warning(f"Rate limit exceeded, waiting longer...")
-                await asyncio.sleep(5)  # Увеличиваем задержку при rate limit
-                return await self.fetch_vacancy(vacancy_id)  # Повторяем запрос
-            else:
-                self.logger.error(f"HTTP {response.status_code} for vacancy {vacancy_id}: {response.text}")
-                return None
+            raise FetchError(f"throttled {self.max_retries + 1} times")
                 
         except httpx.TimeoutException:
-            self.logger.error(f"Timeout fetching vacancy {vacancy_id}")
-            return None
-        except Exception as e:
-            self.logger.error(f"Error fetching vacancy {vacancy_id}: {e}")
-            return None
+            raise FetchError("timeout")
+        except httpx.HTTPError as e:
+            raise FetchError(f"{type(e).__name__}: {e}")
     
-    async def process_vacancy(self, vacancy_id: str) -> bool:
-        """Обрабатывает одну вакансию: получает данные и сохраняет в БД"""
+    async def process_vacancy(self, vacancy_id: str) -> None:
+        """
+        Обрабатывает одну вакансию: получает данные и сохраняет в БД
+        
+        Raises:
+            FetchError: вакансию не удалось получить, провалидировать или сохранить
+        """
+        # Получаем исходные байты ответа: они валидируются и сохраняются без промежуточного словаря
+        raw = await self.fetch_vacancy_raw(vacancy_id)
+        
+        # Неизменившаяся вакансия: только отмечаем, что видели ее, без разбора и перезаписи
+        content_hash = compute_content_hash(raw)
+        if self.storage.get_content_hash(vacancy_id) == content_hash:
+            self.storage.touch_vacancy(vacancy_id)
+            self.logger.debug(f"= Vacancy {vacancy_id} unchanged")
+            return
+        
+        # Валидируем и парсим данные через Pydantic; сам ответ остается в raw_cache для анализа
         try:
-            # Получаем данные из API
-            api_data = await self.fetch_vacancy(vacancy_id)
-            if not api_data:
-                return False
-            
-            # Валидируем и парсим данные через Pydantic
-            try:
-                vacancy = Vacancy(**api_data)
-                vacancy.fetched_at = datetime.now()
-            except Exception as e:
-                self.logger.error(f"Validation error for vacancy {vacancy_id}: {e}")
-                # Сохраняем проблемную запись в отдельный файл для анализа
-                self.save_failed_vacancy(vacancy_id, api_data, str(e))
-                return False
-            
-            # Сохраняем в базу данных
-            raw_json = json.dumps(api_data, ensure_ascii=False, default=str)
-            self.storage.save_vacancy(vacancy, raw_json)
-            
-            self.logger.info(f"✓ Vacancy {vacancy_id} processed successfully")
-            return True
-            
+            vacancy = Vacancy.model_validate_json(raw)
+            vacancy.fetched_at = datetime.now()
         except Exception as e:
-            self.logger.error(f"Error processing vacancy {vacancy_id}: {e}")
-            return False
-    
-    def save_failed_vacancy(self, vacancy_id: str, data: dict, error: str):
-        """Сохраняет проблемные вакансии для анализа"""
-        failed_dir = Path("failed_vacancies")
-        failed_dir.mkdir(exist_ok=True)
-        
-        failed_data = {
-            "vacancy_id": vacancy_id,
-            "error": error,
-            "timestamp": datetime.now().isoformat(),
-            "data": data
-        }
-        
-        with open(failed_dir / f"{vacancy_id}.json", "w", encoding="utf-8") as f:
-            json.dump(failed_data, f, ensure_ascii=False, indent=2, default=str)
+            raise FetchError(f"validation error: {e}", retryable=False)
+        
+        # Сохраняем в базу данных
+        try:
+            self.storage.save_vacancy(vacancy, raw.decode("utf-8"), content_hash)
+        except Exception as e:
+            raise FetchError(f"storage error: {e}")
+        
+        self.logger.debug(f"✓ Vacancy {vacancy_id} processed successfully")
     
-    async def run(self, resume: bool = True, max_vacancies: Optional[int] = None, start_index: Optional[int] = None, end_index: Optional[int] = None):
-        """Основная функция запуска обработки"""
+    async def run(self, resume: bool = True, max_vacancies: Optional[int] = None, start_index: Optional[int] = None, end_index: Optional[int] = None,
+                  missing_details: bool = False, time_budget: Optional[float] = None):
+        """
+        Основная функция запуска обработки
+        
+        ID из CSV (если задан) добавляются в очередь fetch_jobs, затем воркеры выполняют
+        готовые задачи пачками в порядке приоритета; неудачные задачи откладываются
+        с экспоненциальной задержкой. time_budget (секунды) ограничивает время запуска:
+        по его истечении новые задачи не начинаются.
+        """
         self.logger.info("Starting vacancy fetcher...")
         
-        # Загружаем ID вакансий
-        vacancy_ids = self.load_vacancy_ids()
+        if self.csv_file:
+            if start_index is not None and end_index is not None and end_index < start_index:
+                raise ValueError(f"end_index {end_index} должен быть >= start_index {start_index}")
+            vacancy_ids = self.iter_vacancy_ids(start_index, end_index)
+            if self.shard:
+                # В БД шарда попадают только его ID, чтобы на разных машинах очереди не пересекались
+                shard_index, shard_count = self.shard
+                vacancy_ids = (job for job in vacancy_ids if shard_of(job['id'], shard_count) == shard_index)
+            queued = self.storage.enqueue_fetch_jobs(vacancy_ids, refetch=not resume,
+                                                     query_weights=self.query_weights)
+            self.logger.info(f"Queued {queued} vacancies from {self.csv_file} for fetching")
         
-        # Фильтрация по индексам ПЕРЕД фильтрацией уже обработанных
-        if start_index is not None or end_index is not None:
-            original_count = len(vacancy_ids)
-            start_idx = start_index or 0
-            end_idx = end_index or len(vacancy_ids)
-            
-            # Валидация индексов
-            if start_idx < 0 or start_idx >= len(vacancy_ids):
-                raise ValueError(f"start_index {start_idx} вне диапазона [0, {len(vacancy_ids)-1}]")
-            if end_idx < start_idx or end_idx > len(vacancy_ids):
-                raise ValueError(f"end_index {end_idx} должен быть >= start_index и <= {len(vacancy_ids)}")
-            
-            vacancy_ids = vacancy_ids[start_idx:end_idx]
-            self.logger.info(f"Selected range [{start_idx}:{end_idx}] = {len(vacancy_ids)} vacancies from {original_count} total")
+        if missing_details:
+            queued = self.storage.enqueue_missing_details(self.query_weights)
+            self.logger.info(f"Queued {queued} search-only vacancies for detail fetching")
         
-        if resume:
-            vacancy_ids = self.filter_new_vacancies(vacancy_ids)
+        reset = self.storage.reset_stale_fetch_jobs()
+        if reset:
+            self.logger.info(f"Returned {reset} jobs with expired leases to the queue")
+        if self.shard:
+            self.logger.info(f"Worker {self.worker_id} handles shard {self.shard[0]}/{self.shard[1]}")
         
-        # max_vacancies применяется ПОСЛЕ фильтрации по диапазону и resume
+        counts = self.storage.get_fetch_job_counts(self.shard)
+        total = counts.get('pending', 0)
         if max_vacancies:
-            vacancy_ids = vacancy_ids[:max_vacancies]
+            total = min(total, max_vacancies)
             self.logger.info(f"Limited to {max_vacancies} vacancies for processing")
+        self.logger.info(f"Fetch queue: {counts}")
         
-        if not vacancy_ids:
+        if not total:
             self.logger.info("No vacancies to process")
             return
         
-        self.logger.info(f"Processing {len(vacancy_ids)} vacancies with {self.delay}s delay")
+        self.logger.info(f"Processing up to {total} vacancies with {self.concurrency} workers "
+                         f"starting at {self.rate_limiter.rate:.2f} req/s (max {self.rate_limiter.max_rate:.2f})")
         
         # Статистика
-        successful = 0
-        failed = 0
+        stats = {"done": 0, "successful": 0, "failed": 0}
         start_time = time.time()
+        progress = ProgressReporter(self.logger, total, self.progress_interval)
+        deadline = start_time + time_budget if time_budget else None
+        batch_size = max(JOB_BATCH_SIZE, self.concurrency * 4)
+        if deadline:
+            self.logger.info(f"Time budget: {time_budget / 60:.1f} minutes")
         
-        # Обрабатываем вакансии по одной
-        for i, vacancy_id in enumerate(vacancy_ids, 1):
-            self.logger.info(f"[{i}/{len(vacancy_ids)}] Processing vacancy {vacancy_id}")
-            
-            success = await self.process_vacancy(vacancy_id)
-            if success:
-                successful += 1
-            else:
-                failed += 1
+        async def worker(heap: List[Tuple[float, str]], completed: List[str], failures: List[Tuple[str, str, bool]]):
+            # Каждый воркер берет самую приоритетную из оставшихся задач
+            while heap:
+                if self.stopping or (deadline and time.time() >= deadline):
+                    return
+                _, vacancy_id = heapq.heappop(heap)
+                
+                self.logger.debug(f"[{stats['done'] + 1}/{total}] Processing vacancy {vacancy_id}")
+                try:
+                    await self.process_vacancy(vacancy_id)
+                    completed.append(vacancy_id)
+                    stats["successful"] += 1
+                except FetchError as e:
+                    self.logger.error(f"Vacancy {vacancy_id} failed: {e}")
+                    failures.append((vacancy_id, str(e), e.retryable))
+                    stats["failed"] += 1
+                except Exception as e:
+                    self.logger.error(f"Error processing vacancy {vacancy_id}: {e}")
+                    failures.append((vacancy_id, str(e), True))
+                    stats["failed"] += 1
+                stats["done"] += 1
+                
+                progress.update(stats["done"], f"API rate: {self.rate_limiter.rate:.2f} req/s, "
+                                               f"throttled: {self.rate_limiter.throttle_events}")
+        
+        while not max_vacancies or stats["done"] < max_vacancies:
+            if self.stopping:
+                self.logger.info("Stop requested")
+                break
+            if deadline and time.time() >= deadline:
+                self.logger.info("Time budget exhausted")
+                break
+            limit = batch_size if not max_vacancies else min(batch_size, max_vacancies - stats["done"])
+            jobs = self.storage.claim_fetch_jobs(limit, self.worker_id, self.lease_ttl, self.shard)
+            if not jobs:
+                # Ждем отложенные повторы (и освобождение чужих аренд), только если они наступят скоро
+                next_attempt_at = self.storage.get_next_fetch_attempt_at(self.shard)
+                if next_attempt_at is None:
+                    break
+                wait = (next_attempt_at - datetime.now()).total_seconds()
+                if wait > self.max_retry_wait or (deadline and time.time() + wait >= deadline):
+                    self.logger.info(f"Next retry is due at {next_attempt_at:%Y-%m-%d %H:%M:%S}, "
+                                     f"leaving it for the next run")
+                    break
+                self.logger.info(f"Waiting {wait:.0f}s for scheduled retries")
+                await asyncio.sleep(max(wait, 0))
+                if self.stopping:
+                    break
+                continue
             
-            # Показываем прогресс каждые 10 вакансий
-            if i % 10 == 0:
-                elapsed = time.time() - start_time
-                rate = i / elapsed * 60  # вакансий в минуту
-                eta = (len(vacancy_ids) - i) / (i / elapsed) if i > 0 else 0
-                self.logger.info(f"Progress: {i}/{len(vacancy_ids)} ({i/len(vacancy_ids)*100:.1f}%), "
-                               f"Rate: {rate:.1f}/min, ETA: {eta/60:.1f}min")
+            # Куча по убыванию приоритета (heapq - min-куча, поэтому приоритет со знаком минус)
+            heap = [(-priority, vacancy_id) for vacancy_id, priority in jobs]
+            heapq.heapify(heap)
+            completed: List[str] = []
+            failures: List[Tuple[str, str, bool]] = []
             
-            # Задержка между запросами
-            if i < len(vacancy_ids):  # Не ждем после последнего запроса
-                await asyncio.sleep(self.delay)
+            try:
+                # Темп задает rate_limiter, поэтому отдельная задержка между запросами не нужна
+                await asyncio.gather(*(worker(heap, completed, failures)
+                                       for _ in range(min(self.concurrency, len(jobs)))))
+            finally:
+                # И при отмене (Ctrl-C, остановка демона) пачка не остается в аренде до истечения lease_ttl:
+                # сохраненные вакансии отмечаются выполненными, остальные задачи возвращаются в очередь
+                claimed = {vacancy_id for vacancy_id, _ in jobs}
+                unfinished = claimed - set(completed) - {vacancy_id for vacancy_id, _, _ in failures}
+                # Индекс кеша фиксируется вместе с пачкой сохранений (complete_fetch_jobs фиксирует и ее)
+                if self.raw_cache is not None:
+                    self.raw_cache.flush()
+                # Результаты пачки фиксируются в очереди одной транзакцией на статус
+                self.storage.complete_fetch_jobs(completed)
+                self.storage.fail_fetch_jobs(failures, self.max_attempts, self.retry_base_delay)
+                # Не начатые из-за бюджета времени и прерванные задачи сразу возвращаем в очередь
+                self.storage.release_fetch_jobs(sorted(unfinished))
+        
+        successful, failed = stats["successful"], stats["failed"]
+        progress.finish(stats["done"], f"API rate: {self.rate_limiter.rate:.2f} req/s, "
+                                       f"throttled: {self.rate_limiter.throttle_events}")
         
         # Финальная статистика
         total_time = time.time() - start_time
-        self.logger.info(f"Completed! Processed {len(vacancy_ids)} vacancies in {total_time/60:.1f} minutes")
+        self.logger.info(f"Completed! Processed {stats['done']} vacancies in {total_time/60:.1f} minutes")
         self.logger.info(f"Successful: {successful}, Failed: {failed}")
+        self.logger.info(f"Fetch queue: {self.storage.get_fetch_job_counts(self.shard)}")
+        self.logger.info(f"Rate limiter: {self.rate_limiter.stats()}")
+        self.metrics.log_summary(self.logger)
         
         # Статистика базы данных
         stats = self.storage.get_stats()
@@ -207,43 +361,141 @@ class VacancyFetcher:
                         f"{stats['total_employers']} employers, {stats['unique_skills']} unique skills")
 
 
-def setup_logging(level: str = "INFO"):
-    """Настраивает логирование"""
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('vacancy_fetcher.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
+    def run_from_cache(self, workers: Optional[int] = None, batch_size: int = 500):
+        """Повторно валидирует, конвертирует и сохраняет последние ответы из кеша на всех ядрах"""
+        if self.raw_cache is None:
+            raise ValueError("--from-cache requires a cache directory")
+        
+        total = self.raw_cache.count_latest()
+        workers = workers or os.cpu_count() or 1
+        self.logger.info(f"Reprocessing {total} cached vacancies with {workers} processes")
+        
+        successful = 0
+        failed = 0
+        start_time = time.time()
+        progress = ProgressReporter(self.logger, total, self.progress_interval)
+        entries = self.raw_cache.iter_latest()
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while True:
+                batch = list(islice(entries, batch_size))
+                if not batch:
+                    break
+                
+                records = []
+                chunksize = max(1, len(batch) // (workers * 4))
+                for vacancy_id, record, error in executor.map(prepare_cached_vacancy, batch, chunksize=chunksize):
+                    if record is None:
+                        failed += 1
+                        self.logger.error(f"Validation error for cached vacancy {vacancy_id}: {error}")
+                    else:
+                        records.append(record)
+                
+                # Запись в SQLite остается в основном процессе, одной транзакцией на пачку
+                self.storage.save_records(records)
+                successful += len(records)
+                
+                progress.update(successful + failed)
+        self.storage.flush()
+        progress.finish(successful + failed)
+        
+        total_time = time.time() - start_time
+        self.logger.info(f"Reprocessed {successful + failed} cached vacancies in {total_time:.1f}s")
+        self.logger.info(f"Successful: {successful}, Failed: {failed}")
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Разбирает --shard k/n (k от 0 до n-1)"""
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must look like k/n, got {value!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, {count - 1}], got {value!r}")
+    return index, count
+
+
+def parse_duration(value: str) -> float:
+    """Разбирает длительность вида 90, 45s, 30m, 2h в секунды"""
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    value = value.strip().lower()
+    try:
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"duration must look like 90, 45s, 30m or 2h, got {value!r}")
+
+
+def parse_query_weight(value: str) -> Tuple[str, float]:
+    """Разбирает --query-weight name=weight"""
+    name, _, weight = value.partition("=")
+    try:
+        return name.strip(), float(weight)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"query weight must look like name=weight, got {value!r}")
 
 
 async def main():
-    import argparse
-    
     parser = argparse.ArgumentParser(description='Fetch vacancies from HH.ru API')
-    parser.add_argument('csv_file', help='CSV file with vacancy IDs')
+    parser.add_argument('csv_file', nargs='?', help='CSV file with vacancy IDs to add to the fetch queue')
     parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
     parser.add_argument('--delay', type=float, default=1.0, help='Delay between requests (seconds)')
-    parser.add_argument('--no-resume', action='store_true', help='Process all vacancies (ignore already processed)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Number of parallel workers')
+    parser.add_argument('--rps', type=float, help='Initial requests-per-second rate (default: 1/delay)')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries for a request throttled with 429/503')
+    parser.add_argument('--max-connections', type=int, help='HTTP connection pool size (default: max(10, concurrency))')
+    parser.add_argument('--no-resume', action='store_true', help='Re-queue vacancies from the CSV even if already fetched')
     parser.add_argument('--max', type=int, help='Maximum number of vacancies to process')
     parser.add_argument('--start', type=int, help='Start index in CSV (0-based)')
     parser.add_argument('--end', type=int, help='End index in CSV (exclusive)')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts per queued vacancy before giving up')
+    parser.add_argument('--retry-delay', type=float, default=30.0,
+                        help='Base delay before retrying a failed vacancy (doubles with each attempt)')
+    parser.add_argument('--time-budget', type=parse_duration, metavar='DURATION',
+                        help='Stop starting new vacancies after this long (e.g. 30m, 2h); highest priority goes first')
+    parser.add_argument('--query-weight', type=parse_query_weight, action='append', metavar='NAME=WEIGHT',
+                        help='Priority weight of vacancies matched by a search query; may be repeated')
+    parser.add_argument('--missing-details', action='store_true',
+                        help='Queue detail fetches for all vacancies stored by extract_vacancy_ids.py --lite')
+    parser.add_argument('--shard', type=parse_shard, metavar='K/N',
+                        help='Only handle vacancies of hash shard K of N (run N processes, K = 0..N-1)')
+    parser.add_argument('--lease-ttl', type=float, default=900.0,
+                        help='Seconds a claimed job stays leased before another process may take it over')
+    parser.add_argument('--cache-dir', default='raw_cache', help='Raw response cache directory')
+    parser.add_argument('--no-cache', action='store_true', help='Do not store raw responses in the cache')
+    parser.add_argument('--from-cache', action='store_true',
+                        help='Re-run validation, conversion and storage from cached responses without fetching')
+    parser.add_argument('--workers', type=int, help='Processes for --from-cache (default: CPU count)')
+    parser.add_argument('--progress-interval', type=float, default=10.0,
+                        help='Seconds between progress summaries (per-vacancy lines are logged at DEBUG)')
     parser.add_argument('--log-level', default='INFO', help='Logging level')
     
     args = parser.parse_args()
     
     # Настраиваем логирование
-    setup_logging(args.log_level)
+    setup_logging(args.log_level, 'vacancy_fetcher.log')
     
     # Запускаем обработку
-    async with VacancyFetcher(args.csv_file, args.db, args.delay) as fetcher:
+    async with VacancyFetcher(args.csv_file, args.db, args.delay, args.concurrency, args.rps,
+                              args.max_rps, args.max_retries, max_connections=args.max_connections,
+                              cache_dir=None if args.no_cache else args.cache_dir,
+                              max_attempts=args.max_attempts, retry_base_delay=args.retry_delay,
+                              shard=args.shard, lease_ttl=args.lease_ttl,
+                              query_weights=dict(args.query_weight or []),
+                              progress_interval=args.progress_interval) as fetcher:
+        if args.from_cache:
+            fetcher.run_from_cache(args.workers)
+            return
+        
         await fetcher.run(
             resume=not args.no_resume, 
             max_vacancies=args.max,
             start_index=args.start,
-            end_index=args.end
+            end_index=args.end,
+            missing_details=args.missing_details,
+            time_budget=args.time_budget
         )
 
 
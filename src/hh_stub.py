@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Локальная заглушка API HH.ru для офлайн-замеров пропускной способности.
+
+Отдает ответы из кассеты (см. cassette.py), а для остальных запросов - синтетические
+вакансии и работодатели с пагинацией поиска, лимитом глубины 2000, настраиваемой задержкой и 429.
+Запуск: python src/hh_stub.py --port 8080, затем HH_API_BASE_URL=http://127.0.0.1:8080
+"""
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, List
+from urllib.parse import urlsplit, parse_qs
+import httpx
+
+from cassette import Cassette
+
+FIRST_VACANCY_ID = 100000000
+MAX_SEARCH_DEPTH = 2000
+# Похожие вакансии - соседи по ID на расстоянии не больше SIMILAR_SPAN
+SIMILAR_SPAN = 3
+HH_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+MSK = timezone(timedelta(hours=3))
+
+# Небольшое дерево регионов: страна -> города
+STUB_AREAS = [
+    {"id": "113", "parent_id": None, "name": "Россия", "areas": [
+        {"id": "1", "parent_id": "113", "name": "Москва", "areas": []},
+        {"id": "2", "parent_id": "113", "name": "Санкт-Петербург", "areas": []},
+        {"id": "4", "parent_id": "113", "name": "Новосибирск", "areas": []},
+        {"id": "2019", "parent_id": "113", "name": "Московская область", "areas": [
+            {"id": "2034", "parent_id": "2019", "name": "Химки", "areas": []},
+        ]},
+    ]},
+    {"id": "40", "parent_id": None, "name": "Казахстан", "areas": [
+        {"id": "160", "parent_id": "40", "name": "Алматы", "areas": []},
+    ]},
+]
+# Справочники: только валюты (rate - единиц валюты за 1 рубль)
+STUB_DICTIONARIES = {
+    "currency": [
+        {"code": "RUR", "abbr": "₽", "name": "Рубли", "default": True, "rate": 1.0, "in_use": True},
+        {"code": "USD", "abbr": "$", "name": "Доллары", "default": False, "rate": 0.0125, "in_use": True},
+        {"code": "EUR", "abbr": "€", "name": "Евро", "default": False, "rate": 0.0108, "in_use": True},
+        {"code": "KZT", "abbr": "₸", "name": "Тенге", "default": False, "rate": 6.25, "in_use": True},
+    ],
+}
+LEAF_AREAS = [("1", "Москва", "113"), ("1", "Москва", "113"), ("2", "Санкт-Петербург", "113"),
+              ("4", "Новосибирск", "113"), ("160", "Алматы", "40")]
+
+
+class StubConfig:
+    """Параметры поведения заглушки"""
+
+    def __init__(self, vacancies: int = 5000, latency: float = 0.05, jitter: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0,
+                 cassette: Optional[str] = None, seed: int = 0):
+        self.vacancies = vacancies
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.cassette = Cassette(cassette) if cassette else None
+        self.seed = seed
+
+
+class SyntheticData:
+    """Детерминированный набор синтетических вакансий"""
+
+    def __init__(self, count: int, seed: int = 0):
+        rng = random.Random(seed)
+        now = datetime.now(MSK).replace(microsecond=0)
+        self.items: List[dict] = []
+        for i in range(count):
+            vacancy_id = FIRST_VACANCY_ID + i
+            area_id, area_name, country_id = rng.choice(LEAF_AREAS)
+            published_at = now - timedelta(seconds=rng.randint(0, 30 * 86400))
+            salary_from = rng.choice([None, 80000, 120000, 200000, 300000])
+            self.items.append({
+                "id": str(vacancy_id),
+                "name": f"Synthetic vacancy {vacancy_id}",
+                "area": {"id": area_id, "name": area_name, "url": f"/areas/{area_id}"},
+                "country_id": country_id,
+                "salary": {"from": salary_from, "to": None, "currency": "RUR", "gross": True} if salary_from else None,
+                "type": {"id": "open", "name": "Открытая"},
+                "experience": {"id": "between1And3", "name": "От 1 года до 3 лет"},
+                "schedule": {"id": "remote", "name": "Удаленная работа"},
+                "employment": {"id": "full", "name": "Полная занятость"},
+                "employer": {"id": str(1000 + vacancy_id % 300), "name": f"Employer {vacancy_id % 300}"},
+                "snippet": {"requirement": "Python, SQL", "responsibility": "Build models"},
+                "published_at": published_at.strftime(HH_DATE_FORMAT),
+                "created_at": published_at.strftime(HH_DATE_FORMAT),
+                "archived": False,
+                "alternate_url": f"https://hh.ru/vacancy/{vacancy_id}",
+            })
+        self.items.sort(key=lambda item: item["published_at"], reverse=True)
+        self.by_id: Dict[str, dict] = {item["id"]: item for item in self.items}
+
+    def search(self, params: Dict[str, str]) -> dict:
+        """Поиск с фильтрами area/date_from/date_to и пагинацией как у HH.ru"""
+        items = self.items
+        area = params.get("area")
+        if area:
+            items = [item for item in items if area in (item["area"]["id"], item["country_id"])]
+        if params.get("date_from"):
+            date_from = datetime.strptime(params["date_from"], HH_DATE_FORMAT)
+            items = [item for item in items if datetime.strptime(item["published_at"], HH_DATE_FORMAT) >= date_from]
+        if params.get("date_to"):
+            date_to = datetime.strptime(params["date_to"], HH_DATE_FORMAT)
+            items = [item for item in items if datetime.strptime(item["published_at"], HH_DATE_FORMAT) <= date_to]
+
+        per_page = int(params.get("per_page", 20))
+        page = int(params.get("page", 0))
+        reachable = items[:MAX_SEARCH_DEPTH]
+        page_items = reachable[page * per_page:(page + 1) * per_page]
+        return {
+            "items": [{k: v for k, v in item.items() if k != "country_id"} for item in page_items],
+            "found": len(items),
+            "pages": (len(reachable) + per_page - 1) // per_page if per_page else 0,
+            "page": page,
+            "per_page": per_page,
+        }
+
+    def detail(self, vacancy_id: str) -> Optional[dict]:
+        item = self.by_id.get(vacancy_id)
+        if item is None:
+            return None
+        detail = {k: v for k, v in item.items() if k not in ("country_id", "snippet")}
+        detail.update({
+            "description": f"<p><strong>{item['name']}</strong></p><ul><li>Python</li><li>SQL</li></ul>",
+            "key_skills": [{"name": "Python"}, {"name": "SQL"}],
+            "professional_roles": [{"id": "165", "name": "Дата-сайентист"}],
+        })
+        return detail
+
+    def similar(self, vacancy_id: str, params: Dict[str, str]) -> Optional[dict]:
+        """Похожие вакансии: соседи по ID (в пределах SIMILAR_SPAN) в формате выдачи поиска"""
+        if vacancy_id not in self.by_id:
+            return None
+        center = int(vacancy_id)
+        items = [self.by_id[str(vid)] for vid in range(center - SIMILAR_SPAN, center + SIMILAR_SPAN + 1)
+                 if vid != center and str(vid) in self.by_id]
+        per_page = int(params.get("per_page", 20))
+        page = int(params.get("page", 0))
+        return {
+            "items": [{k: v for k, v in item.items() if k != "country_id"}
+                      for item in items[page * per_page:(page + 1) * per_page]],
+            "found": len(items),
+            "pages": (len(items) + per_page - 1) // per_page if per_page else 0,
+            "page": page,
+            "per_page": per_page,
+        }
+
+    def employer(self, employer_id: str) -> Optional[dict]:
+        """Карточка работодателя, если у него есть хотя бы одна синтетическая вакансия"""
+        vacancies = [item for item in self.items if item["employer"]["id"] == employer_id]
+        if not vacancies:
+            return None
+        return {
+            **vacancies[0]["employer"],
+            "type": "company",
+            "site_url": f"https://employer{employer_id}.example",
+            "description": f"<p>{vacancies[0]['employer']['name']}</p>",
+            "area": dict(vacancies[0]["area"]),
+            "industries": [{"id": "7.540", "name": "Разработка программного обеспечения"}],
+            "open_vacancies": len(vacancies),
+        }
+
+
+def make_handler(config: StubConfig, data: SyntheticData):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Заголовки и тело уходят отдельными записями: с алгоритмом Нейгла и отложенным ACK клиента
+        # keep-alive соединение добавляло бы ~40 мс к каждому ответу поверх заданной latency
+        disable_nagle_algorithm = True
+
+        def send_json(self, status: int, payload, headers: Optional[dict] = None):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            delay = config.latency + (random.uniform(0, config.jitter) if config.jitter else 0)
+            if delay > 0:
+                time.sleep(delay)
+
+            if config.throttle_rate and random.random() < config.throttle_rate:
+                self.send_json(429, {"errors": [{"type": "too_many_requests"}]},
+                               {"Retry-After": f"{config.retry_after:g}"})
+                return
+
+            if config.cassette is not None:
+                entry = config.cassette.lookup("GET", httpx.URL(self.path))
+                if entry is not None:
+                    self.send_json(entry["status"], entry["body"].encode("utf-8"),
+                                   {k: v for k, v in entry["headers"].items() if k != "content-type"})
+                    return
+
+            url = urlsplit(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == "/vacancies":
+                self.send_json(200, data.search(params))
+            elif url.path == "/areas":
+                self.send_json(200, STUB_AREAS)
+            elif url.path == "/dictionaries":
+                self.send_json(200, STUB_DICTIONARIES)
+            elif match := re.fullmatch(r"/vacancies/(\d+)", url.path):
+                detail = data.detail(match.group(1))
+                if detail is None:
+                    self.send_json(404, {"errors": [{"type": "not_found"}]})
+                else:
+                    self.send_json(200, detail)
+            elif match := re.fullmatch(r"/vacancies/(\d+)/similar_vacancies", url.path):
+                similar = data.similar(match.group(1), params)
+                if similar is None:
+                    self.send_json(404, {"errors": [{"type": "not_found"}]})
+                else:
+                    self.send_json(200, similar)
+            elif match := re.fullmatch(r"/employers/(\d+)", url.path):
+                employer = data.employer(match.group(1))
+                if employer is None:
+                    self.send_json(404, {"errors": [{"type": "not_found"}]})
+                else:
+                    self.send_json(200, employer)
+            else:
+                self.send_json(404, {"errors": [{"type": "not_found"}]})
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+class HHStubServer:
+    """Заглушка API в фоновом потоке"""
+
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        self.config = config
+        self.data = SyntheticData(config.vacancies, config.seed)
+        self.server = ThreadingHTTPServer((host, port), make_handler(config, self.data))
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> str:
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local stand-in for the HH.ru API')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--vacancies', type=int, default=5000, help='Number of synthetic vacancies')
+    parser.add_argument('--latency', type=float, default=0.05, help='Base response latency (seconds)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra random latency up to this many seconds')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Share of requests answered with 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After value for injected 429s')
+    parser.add_argument('--cassette', help='Cassette file to replay before falling back to synthetic data')
+
+    args = parser.parse_args()
+
+    config = StubConfig(args.vacancies, args.latency, args.jitter, args.throttle_rate,
+                        args.retry_after, args.cassette)
+    server = HHStubServer(config, args.host, args.port)
+    print(f"HH API stub listening on {server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
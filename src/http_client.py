@@ -0,0 +1,195 @@
+"""
+Общая фабрика HTTP клиентов для запросов к API HH.ru с метриками пула соединений
+"""
+import math
+import os
+import time
+import logging
+from collections import defaultdict, deque
+from typing import AsyncIterator, Callable, Optional, Dict, List
+import httpx
+
+from cassette import RecordingTransport
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+API_BASE_URL = "https://api.hh.ru"
+# Переменные окружения для подмены API (локальная заглушка) и записи ответов в кассету
+BASE_URL_ENV = "HH_API_BASE_URL"
+RECORD_ENV = "HH_RECORD_CASSETTE"
+
+# Сколько последних замеров задержки храним для расчета перцентилей
+LATENCY_WINDOW = 10000
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль q (0-100) по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class HostMetrics:
+    """Счетчики запросов и соединений для одного хоста"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.http_versions: Dict[str, int] = defaultdict(int)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def summary(self) -> dict:
+        latencies = list(self.latencies)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'connections_opened': self.connections_opened,
+            'connections_reused': self.connections_reused,
+            'max_in_flight': self.max_in_flight,
+            'http_versions': dict(self.http_versions),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+        }
+
+
+class ClientMetrics:
+    """Метрики клиента по хостам"""
+
+    def __init__(self):
+        self.hosts: Dict[str, HostMetrics] = defaultdict(HostMetrics)
+
+    def summary(self) -> Dict[str, dict]:
+        return {host: metrics.summary() for host, metrics in self.hosts.items()}
+
+    def log_summary(self, logger: logging.Logger):
+        """Пишет метрики по каждому хосту в лог"""
+        for host, stats in self.summary().items():
+            logger.info(f"HTTP {host}: {stats['requests']} requests, {stats['errors']} errors, "
+                        f"connections opened {stats['connections_opened']} / reused {stats['connections_reused']}, "
+                        f"max in-flight {stats['max_in_flight']}, versions {stats['http_versions']}, "
+                        f"latency p50 {stats['p50_ms']}ms p95 {stats['p95_ms']}ms p99 {stats['p99_ms']}ms")
+
+
+class TimedByteStream(httpx.AsyncByteStream):
+    """Тело ответа, вызывающее on_close один раз, когда оно прочитано или закрыто"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self.stream = stream
+        self.on_close: Optional[Callable[[], None]] = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.on_close is not None:
+                self.on_close()
+                self.on_close = None
+
+
+class MetricsTransport(httpx.AsyncBaseTransport):
+    """Обертка над транспортом httpx, считающая соединения, параллельные запросы и задержки"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, metrics: ClientMetrics):
+        self.transport = transport
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host_metrics = self.metrics.hosts[request.url.host]
+        opened_connection = False
+        parent_trace = request.extensions.get("trace")
+
+        # httpcore сообщает об установке TCP соединения через trace-события
+        async def trace(event_name: str, info: dict):
+            nonlocal opened_connection
+            if event_name == "connection.connect_tcp.complete":
+                opened_connection = True
+            if parent_trace is not None:
+                await parent_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+
+        host_metrics.requests += 1
+        host_metrics.in_flight += 1
+        host_metrics.max_in_flight = max(host_metrics.max_in_flight, host_metrics.in_flight)
+        start = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            host_metrics.errors += 1
+            raise
+        finally:
+            host_metrics.in_flight -= 1
+            if opened_connection:
+                host_metrics.connections_opened += 1
+            else:
+                host_metrics.connections_reused += 1
+
+        # Задержка - до конца чтения тела ответа: по заголовкам не видны задержки при передаче тела
+        response.stream = TimedByteStream(response.stream,
+                                          lambda: host_metrics.latencies.append(time.perf_counter() - start))
+        host_metrics.http_versions[response.extensions.get("http_version", b"?").decode()] += 1
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def create_client(user_agent: str, metrics: Optional[ClientMetrics] = None,
+                  max_connections: int = 20, max_keepalive_connections: int = 10,
+                  keepalive_expiry: float = 30.0, connect_timeout: float = 5.0,
+                  read_timeout: float = 30.0, http2: Optional[bool] = None,
+                  base_url: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    Создает AsyncClient для API HH.ru
+
+    Args:
+        user_agent: Значение заголовка User-Agent
+        metrics: Куда складывать метрики соединений (None - без метрик)
+        max_connections: Максимум одновременно открытых соединений в пуле
+        max_keepalive_connections: Сколько простаивающих соединений держать открытыми
+        keepalive_expiry: Через сколько секунд закрывать простаивающее соединение
+        connect_timeout: Таймаут установки соединения
+        read_timeout: Таймаут чтения (а также записи и ожидания соединения из пула)
+        http2: Использовать HTTP/2 (по умолчанию - если установлен пакет h2)
+        base_url: Адрес API (по умолчанию HH_API_BASE_URL или https://api.hh.ru)
+    """
+    if http2 is None:
+        http2 = HTTP2_AVAILABLE
+    if base_url is None:
+        base_url = os.environ.get(BASE_URL_ENV, API_BASE_URL)
+
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+    )
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+    if metrics is not None:
+        transport = MetricsTransport(transport, metrics)
+    if os.environ.get(RECORD_ENV):
+        transport = RecordingTransport(transport, os.environ[RECORD_ENV])
+
+    return httpx.AsyncClient(
+        base_url=base_url,
+        transport=transport,
+        timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+        headers={
+            "User-Agent": user_agent,
+            "Accept": "application/json"
+        }
+    )
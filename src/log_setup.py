@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Настройка логирования для сборщиков с большим числом параллельных запросов.
+
+Обработчики (файл и консоль) работают в отдельном потоке QueueListener: в цикле событий
+запись в лог - только постановка записи в очередь, без блокирующего ввода-вывода.
+Логи httpx о каждом запросе по умолчанию скрыты (видны только при уровне DEBUG),
+а прогресс обработки выводится сводками не чаще заданного интервала.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import time
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# Логгеры HTTP клиента пишут строку на каждый запрос
+HTTP_LOGGERS = ("httpx", "httpcore")
+
+
+def setup_logging(level: str = "INFO", log_file: Optional[str] = None,
+                  queued: bool = True) -> Optional[logging.handlers.QueueListener]:
+    """
+    Настраивает корневой логгер: консоль и (если задан) файл
+
+    Args:
+        level: Уровень логирования
+        log_file: Файл лога в дополнение к консоли
+        queued: Писать через очередь и фоновый поток (False - синхронно, как basicConfig)
+
+    Returns:
+        Запущенный QueueListener (останавливается при выходе из процесса) или None
+    """
+    level = getattr(logging, level.upper())
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.setLevel(level)
+
+    # Запросы httpx видны только в отладочном режиме
+    for name in HTTP_LOGGERS:
+        logging.getLogger(name).setLevel(logging.DEBUG if level <= logging.DEBUG else logging.WARNING)
+
+    if not queued:
+        for handler in handlers:
+            root.addHandler(handler)
+        return None
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Остановка дожидается записи всех сообщений из очереди
+    atexit.register(listener.stop)
+    return listener
+
+
+class ProgressReporter:
+    """Сводка прогресса не чаще раза в interval секунд; итоговая сводка - явным вызовом finish"""
+
+    def __init__(self, logger: logging.Logger, total: int, interval: float = 10.0, unit: str = "vacancies"):
+        self.logger = logger
+        # Оценка объема: done может ее превысить (например, задания, добавленные во время обработки)
+        self.total = total
+        self.interval = interval
+        self.unit = unit
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+
+    def update(self, done: int, details: str = "") -> bool:
+        """Пишет сводку, если с прошлой прошло не меньше interval секунд; возвращает, была ли она записана"""
+        now = time.monotonic()
+        if now - self.reported_at < self.interval:
+            return False
+        self.reported_at = now
+        self.logger.info(self.format(done, now, details))
+        return True
+
+    def finish(self, done: int, details: str = "") -> None:
+        """Итоговая сводка"""
+        self.logger.info(self.format(done, time.monotonic(), details))
+
+    def format(self, done: int, now: float, details: str = "") -> str:
+        elapsed = max(now - self.started_at, 1e-9)
+        rate = done / elapsed
+        message = f"Progress: {done}/{self.total} {self.unit}"
+        if self.total:
+            message += f" ({done / self.total * 100:.1f}%)"
+        message += f", Rate: {rate * 60:.1f}/min"
+        if rate > 0 and done < self.total:
+            message += f", ETA: {(self.total - done) / rate / 60:.1f}min"
+        if details:
+            message += f", {details}"
+        return message
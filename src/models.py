@@ -52,6 +52,21 @@ class Employer(BaseModel):
     trusted: Optional[bool] = None
 
 
+class Industry(BaseModel):
+    id: str
+    name: str
+
+
+class EmployerDetails(Employer):
+    """Полная карточка работодателя из /employers/{id}"""
+    type: Optional[str] = None
+    site_url: Optional[str] = None
+    description: Optional[str] = None
+    area: Optional[Area] = None
+    industries: List[Industry] = []
+    open_vacancies: Optional[int] = None
+
+
 class Metro(BaseModel):
     station_name: str
     line_name: str
@@ -147,6 +162,46 @@ class Vacancy(BaseModel):
     raw_json: Optional[str] = None
 
 
+class Snippet(BaseModel):
+    requirement: Optional[str] = None
+    responsibility: Optional[str] = None
+
+
+class VacancySearchItem(BaseModel):
+    """Вакансия из выдачи поиска /vacancies: без описания и навыков, зато со сниппетом"""
+    id: str
+    name: str
+    area: Area
+    salary: Optional[Salary] = None
+    salary_range: Optional[dict] = None
+    type: Optional[VacancyType] = None
+    address: Optional[Address] = None
+    experience: Optional[Experience] = None
+    schedule: Optional[Schedule] = None
+    employment: Optional[Employment] = None
+    employer: Optional[dict] = None  # у анонимных вакансий работодатель без id
+    snippet: Optional[Snippet] = None
+    published_at: datetime
+    created_at: Optional[datetime] = None
+    premium: Optional[bool] = None
+    archived: Optional[bool] = None
+    accept_handicapped: Optional[bool] = None
+    accept_kids: Optional[bool] = None
+    work_format: Optional[List[WorkFormat]] = None
+    working_days: Optional[List[dict]] = None
+    working_time_intervals: Optional[List[dict]] = None
+    working_time_modes: Optional[List[dict]] = None
+    professional_roles: Optional[List[dict]] = None
+    alternate_url: Optional[str] = None
+    apply_alternate_url: Optional[str] = None
+    response_url: Optional[str] = None
+    response_letter_required: Optional[bool] = None
+    show_contacts: Optional[bool] = None
+    insider_interview: Optional[dict] = None
+    relations: Optional[List[dict]] = None
+    department: Optional[dict] = None
+
+
 class VacancyResponse(BaseModel):
     """Модель для полного ответа API"""
     vacancy: Vacancy
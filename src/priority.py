@@ -0,0 +1,56 @@
+"""
+Приоритет задач загрузки вакансий: чем больше значение, тем раньше вакансия загружается.
+
+Слагаемые линейны по меткам времени, поэтому приоритет считается один раз при постановке
+в очередь и не устаревает: с течением времени все задачи сдвигаются одинаково.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+# Вес одного часа свежести публикации
+RECENCY_WEIGHT = 1.0
+# Бонус вакансии, детали которой еще ни разу не загружались (сутки свежести = 24)
+NEVER_FETCHED_BONUS = 24 * 7
+# Вес часа, прошедшего с последней загрузки
+STALENESS_WEIGHT = 0.25
+# Бонус за каждый поисковый запрос, нашедший вакансию (если вес запроса не задан)
+DEFAULT_QUERY_WEIGHT = 12.0
+
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Разбирает метку времени из выдачи HH.ru или из SQLite"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def job_priority(published_at=None, last_fetched_at=None, queries: Iterable[str] = (),
+                 query_weights: Optional[Dict[str, float]] = None) -> float:
+    """
+    Приоритет задачи
+
+    Args:
+        published_at: Дата публикации из выдачи поиска (или из БД)
+        last_fetched_at: Когда детали загружались последний раз (None - ни разу)
+        queries: Поисковые запросы, нашедшие вакансию
+        query_weights: Вес каждого запроса (по умолчанию DEFAULT_QUERY_WEIGHT)
+    """
+    # Дата публикации неизвестна (CSV без published_at) - считаем вакансию опубликованной сейчас
+    published_hours = (parse_timestamp(published_at) or datetime.now()).timestamp() / 3600
+    priority = RECENCY_WEIGHT * published_hours
+
+    fetched = parse_timestamp(last_fetched_at)
+    if fetched is None:
+        # Без загрузки "возраст загрузки" отсчитывается от публикации
+        priority += NEVER_FETCHED_BONUS - STALENESS_WEIGHT * published_hours
+    else:
+        priority -= STALENESS_WEIGHT * fetched.timestamp() / 3600
+
+    weights = query_weights or {}
+    priority += sum(weights.get(name, DEFAULT_QUERY_WEIGHT) for name in queries if name)
+    return priority
@@ -0,0 +1,85 @@
+import time
+import asyncio
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Optional
+
+# Ответы, которыми HH.ru сигнализирует о превышении лимита
+THROTTLE_STATUSES = (429, 503)
+
+DEFAULT_MIN_RATE = 0.2
+DEFAULT_MAX_RATE = 20.0
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Общий для всех воркеров AIMD-регулятор частоты запросов.
+
+    Пока ответы успешные, частота растет аддитивно (примерно на increase req/s
+    за секунду), на 429/503 - умножается на decrease_factor. Retry-After
+    приостанавливает все запросы до указанного момента.
+    """
+
+    def __init__(self, rate: float, min_rate: float = DEFAULT_MIN_RATE,
+                 max_rate: Optional[float] = DEFAULT_MAX_RATE,
+                 increase: float = 0.5, decrease_factor: float = 0.5):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.max_rate = max(max_rate, rate) if max_rate else rate
+        self.min_rate = min(min_rate, rate)
+        self.rate = rate
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.throttle_events = 0
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        """Ждет следующий свободный слот в пределах текущей частоты"""
+        now = time.monotonic()
+        slot = max(self._next_slot, self._blocked_until, now)
+        # Резервируем слот до await, чтобы параллельные воркеры не получили один и тот же
+        self._next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def on_success(self):
+        """Аддитивное увеличение частоты после успешного ответа"""
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None):
+        """Мультипликативное снижение частоты и пауза после 429/503"""
+        self.throttle_events += 1
+        now = time.monotonic()
+
+        # Пачка 429 от параллельных запросов - один сигнал, а не несколько
+        if now - self._last_decrease >= 1.0 / self.rate:
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self._last_decrease = now
+
+        pause = retry_after if retry_after is not None else 1.0 / self.rate
+        self._blocked_until = max(self._blocked_until, now + pause)
+
+    def stats(self) -> dict:
+        """Текущее состояние регулятора для логов"""
+        return {"rate": round(self.rate, 3), "throttle_events": self.throttle_events}
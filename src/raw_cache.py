@@ -0,0 +1,126 @@
+"""
+Контентно-адресуемый кеш сырых ответов API HH.ru.
+
+Тела ответов хранятся сжатыми в objects/<2 символа хеша>/<sha256>.gz (одинаковые ответы - один файл),
+а index.db связывает (vacancy_id, fetched_at) с хешем содержимого. Записи индекса идут через одно
+соединение (WAL, synchronous=NORMAL) и фиксируются пачками, как сохранения в VacancyStorage.
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+import weakref
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Iterator, Tuple
+
+from storage import COMMIT_BATCH_SIZE, COMMIT_INTERVAL, call_later_in_loop, close_connection
+
+# Уровень сжатия объектов: gzip по умолчанию (9) заметно медленнее при почти том же размере
+COMPRESS_LEVEL = 6
+
+
+class RawResponseCache:
+    def __init__(self, root: str = "raw_cache", batch_size: int = COMMIT_BATCH_SIZE,
+                 commit_interval: float = COMMIT_INTERVAL):
+        self.root = Path(root)
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.root / "index.db"
+        # Одно долгоживущее соединение с индексом и пачка незафиксированных записей
+        self._conn: Optional[sqlite3.Connection] = None
+        self._finalizer: Optional[weakref.finalize] = None
+        self.batch_size = max(1, batch_size)
+        self.commit_interval = commit_interval
+        self._pending = 0
+        self._pending_since = 0.0
+        # Как в VacancyStorage: пачка фиксируется по таймеру, не удерживая блокировку индекса между ответами
+        self._flush_timer = None
+        with self.connection as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    vacancy_id TEXT NOT NULL,
+                    fetched_at TIMESTAMP NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    PRIMARY KEY (vacancy_id, fetched_at)
+                );
+                CREATE INDEX IF NOT EXISTS idx_responses_content_hash ON responses (content_hash);
+            """)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.index_path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._finalizer = weakref.finalize(self, close_connection, conn)
+            self._conn = conn
+        return self._conn
+
+    def flush(self) -> None:
+        """Фиксирует накопленные записи индекса"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if self._pending and self._conn is not None:
+            self._pending = 0
+            self._conn.commit()
+
+    def close(self) -> None:
+        self.flush()
+        if self._finalizer is not None:
+            self._finalizer()
+            self._conn = self._finalizer = None
+
+    def object_path(self, content_hash: str) -> Path:
+        return self.objects_dir / content_hash[:2] / f"{content_hash}.gz"
+
+    def put(self, vacancy_id: str, payload: bytes, fetched_at: Optional[datetime] = None) -> str:
+        """Сохраняет тело ответа и возвращает его sha256"""
+        content_hash = hashlib.sha256(payload).hexdigest()
+        path = self.object_path(content_hash)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            # Пишем через временный файл, чтобы прерванная запись не оставила битый объект
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with gzip.open(tmp_path, "wb", compresslevel=COMPRESS_LEVEL) as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses (vacancy_id, fetched_at, content_hash) VALUES (?, ?, ?)",
+            (vacancy_id, (fetched_at or datetime.now()).isoformat(), content_hash)
+        )
+        # Объект уже на диске, поэтому запись индекса, потерянная при сбое, только пропустит ответ
+        if not self._pending:
+            self._pending_since = time.monotonic()
+            self._flush_timer = call_later_in_loop(self.commit_interval, self.flush)
+        self._pending += 1
+        if self._pending >= self.batch_size or time.monotonic() - self._pending_since >= self.commit_interval:
+            self.flush()
+        return content_hash
+
+    def get(self, content_hash: str) -> bytes:
+        """Возвращает тело ответа по хешу"""
+        with gzip.open(self.object_path(content_hash), "rb") as f:
+            return f.read()
+
+    def count_latest(self) -> int:
+        """Количество вакансий в кеше"""
+        self.flush()
+        with self.connection as conn:
+            return conn.execute("SELECT COUNT(DISTINCT vacancy_id) FROM responses").fetchone()[0]
+
+    def iter_latest(self) -> Iterator[Tuple[str, str, str]]:
+        """Последний сохраненный ответ по каждой вакансии: (vacancy_id, fetched_at, путь к объекту)"""
+        self.flush()
+        with self.connection as conn:
+            cursor = conn.execute("""
+                SELECT vacancy_id, MAX(fetched_at), content_hash
+                FROM responses
+                GROUP BY vacancy_id
+                ORDER BY vacancy_id
+            """)
+            for vacancy_id, fetched_at, content_hash in cursor:
+                yield vacancy_id, fetched_at, str(self.object_path(content_hash))
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Дневные снимки выдачи поиска для аналитики жизненного цикла вакансий.
+
+Каждый полный обход поиска сохраняет множество ID каждого запроса за день как отсортированный
+массив int64: в БД хранятся разности соседних ID (uint32), сжатые zlib, - при ~10 тыс. вакансий
+это десятки КБ в день. Открытия, закрытия и кривые дожития считаются векторно по массивам.
+"""
+import logging
+import zlib
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Union
+import numpy as np
+
+from storage import VacancyStorage
+
+# Первый байт блоба - тип разностей: u - uint32, q - int64 (если соседние ID отстоят больше чем на 2^32)
+DELTA_DTYPES = {b"u": np.uint32, b"q": np.int64}
+
+
+def to_id_array(vacancy_ids: Iterable) -> np.ndarray:
+    """Отсортированный массив уникальных числовых ID"""
+    return np.unique(np.fromiter((int(vid) for vid in vacancy_ids if str(vid).isdigit()), dtype=np.int64))
+
+
+def encode_ids(ids: np.ndarray) -> bytes:
+    """Сжимает отсортированный массив уникальных ID"""
+    deltas = np.diff(ids, prepend=np.int64(0))
+    code = b"u" if not len(deltas) or deltas.max() <= np.iinfo(np.uint32).max else b"q"
+    return code + zlib.compress(deltas.astype(DELTA_DTYPES[code]).tobytes(), 6)
+
+
+def decode_ids(blob: bytes) -> np.ndarray:
+    """Обратное к encode_ids"""
+    deltas = np.frombuffer(zlib.decompress(blob[1:]), dtype=DELTA_DTYPES[blob[:1]])
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def to_day(value: Union[str, date]) -> str:
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+
+class SnapshotStore:
+    def __init__(self, db_path: str = "vacancies.db", storage: Optional[VacancyStorage] = None):
+        self.storage = storage or VacancyStorage(db_path)
+        self.logger = logging.getLogger(__name__)
+
+    def save(self, query_name: str, vacancy_ids: Iterable, day: Optional[Union[str, date]] = None) -> int:
+        """Добавляет ID к снимку дня (несколько обходов за день объединяются); возвращает размер снимка"""
+        day = to_day(day or date.today())
+        ids = to_id_array(vacancy_ids)
+        existing = self.storage.get_search_snapshots(query_name, day, day)
+        if existing:
+            ids = np.union1d(decode_ids(existing[0][1]), ids)
+        blob = encode_ids(ids)
+        self.storage.save_search_snapshot(query_name, day, blob, len(ids))
+        self.logger.info(f"Snapshot {query_name} {day}: {len(ids)} IDs, {len(blob) / 1024:.1f} KB")
+        return len(ids)
+
+    def load(self, query_name: str, start: Optional[Union[str, date]] = None,
+             end: Optional[Union[str, date]] = None) -> Dict[str, np.ndarray]:
+        """Снимки за дни [start, end]: день -> отсортированный массив ID"""
+        rows = self.storage.get_search_snapshots(query_name, start and to_day(start), end and to_day(end))
+        return {day: decode_ids(blob) for day, blob in rows}
+
+    def daily_flows(self, query_name: str, start: Optional[Union[str, date]] = None,
+                    end: Optional[Union[str, date]] = None) -> List[dict]:
+        """
+        Для каждого дня со снимком: сколько вакансий в выдаче, сколько появилось и пропало
+        относительно предыдущего снимка (у первого снимка opened/closed - None)
+        """
+        flows = []
+        previous = None
+        for day, ids in self.load(query_name, start, end).items():
+            flow = {'day': day, 'live': len(ids), 'opened': None, 'closed': None}
+            if previous is not None:
+                flow['opened'] = len(np.setdiff1d(ids, previous, assume_unique=True))
+                flow['closed'] = len(np.setdiff1d(previous, ids, assume_unique=True))
+            flows.append(flow)
+            previous = ids
+        return flows
+
+    def openings(self, query_name: str, day: Union[str, date]) -> np.ndarray:
+        """ID, которых не было в предыдущем снимке"""
+        current, previous = self._pair(query_name, day)
+        return np.setdiff1d(current, previous, assume_unique=True)
+
+    def closings(self, query_name: str, day: Union[str, date]) -> np.ndarray:
+        """ID из предыдущего снимка, пропавшие в снимке дня"""
+        current, previous = self._pair(query_name, day)
+        return np.setdiff1d(previous, current, assume_unique=True)
+
+    def _pair(self, query_name: str, day: Union[str, date]):
+        snapshots = self.load(query_name, end=day)
+        if to_day(day) not in snapshots:
+            raise KeyError(f"No snapshot of {query_name} for {to_day(day)}")
+        if len(snapshots) < 2:
+            raise KeyError(f"No snapshot of {query_name} before {to_day(day)}")
+        *_, previous, current = snapshots.values()
+        return current, previous
+
+    def lifetimes(self, query_name: str, start: Optional[Union[str, date]] = None,
+                  end: Optional[Union[str, date]] = None) -> Dict[str, np.ndarray]:
+        """
+        Срок жизни каждой вакансии в днях: от первого до последнего снимка с ней включительно
+
+        Returns:
+            ids, days (срок жизни), closed (False - вакансия есть в последнем снимке, срок цензурирован),
+            first_seen (номер дня первого появления, np.datetime64[D] как int)
+        """
+        snapshots = self.load(query_name, start, end)
+        if not snapshots:
+            empty = np.empty(0, dtype=np.int64)
+            return {'ids': empty, 'days': empty, 'closed': np.empty(0, dtype=bool), 'first_seen': empty}
+
+        day_numbers = np.array(list(snapshots), dtype='datetime64[D]').astype(np.int64)
+        all_ids = np.concatenate(list(snapshots.values()))
+        all_days = np.repeat(day_numbers, [len(ids) for ids in snapshots.values()])
+
+        # Дни в конкатенации уже по возрастанию, поэтому устойчивая сортировка по ID упорядочивает по (ID, день):
+        # первая и последняя строка каждого ID - первое и последнее появление
+        order = np.argsort(all_ids, kind='stable')
+        all_ids, all_days = all_ids[order], all_days[order]
+        starts = np.flatnonzero(np.r_[True, all_ids[1:] != all_ids[:-1]])
+        ends = np.r_[starts[1:], len(all_ids)] - 1
+        first_seen, last_seen = all_days[starts], all_days[ends]
+        return {
+            'ids': all_ids[starts],
+            'days': last_seen - first_seen + 1,
+            'closed': last_seen < day_numbers[-1],
+            'first_seen': first_seen,
+        }
+
+    def survival_curve(self, query_name: str, start: Optional[Union[str, date]] = None,
+                       end: Optional[Union[str, date]] = None, include_first_day: bool = False) -> np.ndarray:
+        """
+        Кривая дожития Каплана-Мейера: элемент t - доля вакансий, остающихся в выдаче дольше t дней
+        (элемент 0 равен 1). Вакансии из первого снимка по умолчанию не учитываются: дата их
+        появления неизвестна.
+        """
+        lifetimes = self.lifetimes(query_name, start, end)
+        days, closed = lifetimes['days'], lifetimes['closed']
+        if not include_first_day and len(days):
+            keep = lifetimes['first_seen'] > lifetimes['first_seen'].min()
+            days, closed = days[keep], closed[keep]
+        if not len(days):
+            return np.ones(1)
+
+        # В момент t под риском все с days >= t, закрываются - закрытые с days == t
+        closed_at = np.bincount(days[closed], minlength=days.max() + 1)
+        at_risk = np.cumsum(np.bincount(days, minlength=days.max() + 1)[::-1])[::-1]
+        hazard = np.divide(closed_at, at_risk, out=np.zeros(len(at_risk)), where=at_risk > 0)
+        return np.cumprod(1 - hazard)
+
+    def median_lifetime(self, query_name: str, start: Optional[Union[str, date]] = None,
+                        end: Optional[Union[str, date]] = None) -> Optional[int]:
+        """Медианный срок жизни в днях (время до закрытия); None, если половина вакансий еще открыта"""
+        curve = self.survival_curve(query_name, start, end)
+        below = np.flatnonzero(curve <= 0.5)
+        return int(below[0]) if len(below) else None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Opening/closing flows and survival from daily search snapshots')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
+    parser.add_argument('--query', help='Query name (default: all queries with snapshots)')
+    parser.add_argument('--start', help='First day, YYYY-MM-DD')
+    parser.add_argument('--end', help='Last day, YYYY-MM-DD')
+    parser.add_argument('--survival', action='store_true', help='Print the survival curve')
+
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.db)
+    for query_name in [args.query] if args.query else store.storage.get_snapshot_queries():
+        print(f"\n{query_name}")
+        for flow in store.daily_flows(query_name, args.start, args.end):
+            print(f"  {flow['day']}: live {flow['live']}, opened {flow['opened']}, closed {flow['closed']}")
+        print(f"  median lifetime: {store.median_lifetime(query_name, args.start, args.end)} days")
+        if args.survival:
+            curve = store.survival_curve(query_name, args.start, args.end)
+            print("  survival: " + ", ".join(f"{t}d {share:.2f}" for t, share in enumerate(curve)))
+
+
+if __name__ == "__main__":
+    main()
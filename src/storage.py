@@ -1,22 +1,414 @@
+import asyncio
 import sqlite3
 import json
-from typing import Optional, List
-from datetime import datetime
-from models import Vacancy, Employer, KeySkill
+import hashlib
+import time
+import weakref
+import zlib
+from itertools import islice
+from typing import Optional, List, Set, Dict, Tuple, Iterable, Iterator, Union
+from datetime import datetime, timedelta
+from models import Vacancy, VacancySearchItem, Employer, EmployerDetails, KeySkill
 from html_to_markdown import convert_html_to_markdown
+from priority import job_priority
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Колонки, добавленные после первой версии схемы: создаются в существующих БД через ALTER TABLE
+MIGRATED_COLUMNS = {
+    "vacancies": {
+        "content_hash": "TEXT",
+        "last_seen_at": "TIMESTAMP",
+        # Строки из lite-режима (только выдача поиска) получают 0 до загрузки деталей
+        "detail_fetched": "INTEGER DEFAULT 1",
+        "snippet_requirement": "TEXT",
+        "snippet_responsibility": "TEXT",
+        "closed_at": "TIMESTAMP",
+        # Названия навыков JSON-массивом, чтобы не собирать их из vacancy_skills и не разбирать raw_json
+        # (в новых БД колонка есть в CREATE TABLE, миграция - для созданных раньше)
+        "key_skills": "TEXT",
+    },
+    "fetch_jobs": {
+        "lease_owner": "TEXT",
+        "lease_expires_at": "TIMESTAMP",
+        "priority": "REAL DEFAULT 0",
+    },
+    "employers": {
+        # Заполняются обогащением из /employers/{id}
+        "type": "TEXT",
+        "site_url": "TEXT",
+        "description": "TEXT",
+        "area_id": "TEXT",
+        "area_name": "TEXT",
+        "industries": "TEXT",  # JSON
+        "open_vacancies": "INTEGER",
+        "enriched_at": "TIMESTAMP",
+    },
+}
+
+# Порядок колонок совпадает с порядком значений в prepare_vacancy_record
+VACANCY_COLUMNS = (
+    "id", "name", "description", "description_markdown", "branded_description", "branded_description_markdown",
+    "area_id", "area_name", "area_url",
+    "salary_from", "salary_to", "salary_currency", "salary_gross", "salary_range",
+    "experience_id", "experience_name", "schedule_id", "schedule_name",
+    "employment_id", "employment_name", "employer_id", "address",
+    "type_id", "type_name", "billing_type_id", "billing_type_name",
+    "alternate_url", "apply_alternate_url", "response_url",
+    "work_format", "working_days", "working_time_intervals", "working_time_modes",
+    "allow_messages", "show_contacts", "contacts", "response_letter_required",
+    "premium", "archived", "accept_handicapped", "accept_kids",
+    "specializations", "professional_roles",
+    "published_at", "created_at", "expires_at", "fetched_at",
+    "insider_interview", "vacancy_constructor_template", "relations", "department",
+    "raw_json", "content_hash", "last_seen_at", "detail_fetched", "key_skills",
+)
+
+# Колонки, которые заполняются из элемента выдачи поиска (порядок - как в prepare_search_item_row)
+SEARCH_ITEM_COLUMNS = (
+    "id", "name", "area_id", "area_name", "area_url",
+    "salary_from", "salary_to", "salary_currency", "salary_gross", "salary_range",
+    "experience_id", "experience_name", "schedule_id", "schedule_name",
+    "employment_id", "employment_name", "employer_id", "address",
+    "type_id", "type_name", "alternate_url", "apply_alternate_url", "response_url",
+    "work_format", "working_days", "working_time_intervals", "working_time_modes",
+    "show_contacts", "response_letter_required", "premium", "archived", "accept_handicapped", "accept_kids",
+    "professional_roles", "published_at", "created_at", "fetched_at",
+    "insider_interview", "relations", "department",
+    "raw_json", "last_seen_at", "detail_fetched", "snippet_requirement", "snippet_responsibility",
+)
+
+
+# Обновляет только поля из вакансии, не затирая данные обогащения и created_at
+EMPLOYER_UPSERT_SQL = """
+    INSERT INTO employers 
+    (id, name, url, alternate_url, logo_urls, vacancies_url, 
+     accredited_it_employer, trusted)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET
+        name = excluded.name, url = excluded.url, alternate_url = excluded.alternate_url,
+        logo_urls = excluded.logo_urls, vacancies_url = excluded.vacancies_url,
+        accredited_it_employer = excluded.accredited_it_employer, trusted = excluded.trusted
+"""
+
+VACANCY_UPSERT_SQL = f"""
+    INSERT INTO vacancies ({", ".join(VACANCY_COLUMNS)})
+    VALUES ({", ".join("?" * len(VACANCY_COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET
+    {", ".join(f"{col} = excluded.{col}" for col in VACANCY_COLUMNS[1:])}
+"""
+
+# Колонки справочников (без fetched_at) в порядке значений строк save_dictionary
+DICTIONARY_COLUMNS = {
+    "currencies": ("code", "abbr", "name", "rate", "in_use"),
+    "areas": ("id", "parent_id", "name", "region_id", "country_id", "depth"),
+}
+
+# Сколько ID очереди загрузки записывать за одну транзакцию
+FETCH_JOBS_BATCH_SIZE = 10000
+# Сколько секунд ждать снятия блокировки БД другим процессом
+BUSY_TIMEOUT = 60.0
+# Сохранения вакансий фиксируются пачками: commit раз в COMMIT_BATCH_SIZE записей или COMMIT_INTERVAL секунд
+COMMIT_BATCH_SIZE = 100
+COMMIT_INTERVAL = 2.0
+
+
+def shard_of(vacancy_id: str, shards: int) -> int:
+    """Номер шарда вакансии: остаток от деления числового ID (иначе crc32) на число шардов"""
+    vacancy_id = str(vacancy_id)
+    key = int(vacancy_id) if vacancy_id.isdigit() else zlib.crc32(vacancy_id.encode("utf-8"))
+    return key % shards
+
+
+# Строки с полными деталями из выдачи не перезаписываются: у них обновляются только сниппет и last_seen_at
+SEARCH_ITEM_UPSERT_SQL = f"""
+    INSERT INTO vacancies ({", ".join(SEARCH_ITEM_COLUMNS)})
+    VALUES ({", ".join("?" * len(SEARCH_ITEM_COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET
+    {", ".join(
+        f"{col} = CASE WHEN vacancies.detail_fetched = 0 THEN excluded.{col} ELSE vacancies.{col} END"
+        for col in SEARCH_ITEM_COLUMNS[1:]
+        if col not in ("last_seen_at", "snippet_requirement", "snippet_responsibility")
+    )},
+    last_seen_at = excluded.last_seen_at,
+    snippet_requirement = excluded.snippet_requirement,
+    snippet_responsibility = excluded.snippet_responsibility
+"""
+
+
+def compute_content_hash(raw: bytes) -> str:
+    """Хеш исходных байтов ответа API (без разбора JSON)"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+
+def call_later_in_loop(delay: float, callback) -> Optional[asyncio.TimerHandle]:
+    """Планирует callback в работающем цикле событий потока; без цикла (синхронный код) возвращает None"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    return loop.call_later(delay, callback)
+
+
+def close_connection(conn: sqlite3.Connection) -> None:
+    """Фиксирует незавершенную пачку и закрывает соединение (при сборке объекта хранилища или выходе)"""
+    try:
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def to_json(obj):
+    """Сериализует pydantic-модель, список или словарь в JSON строку"""
+    if obj is None:
+        return None
+    if hasattr(obj, 'dict'):
+        return json.dumps(obj.dict(), ensure_ascii=False)
+    if isinstance(obj, list):
+        return json.dumps([item.dict() if hasattr(item, 'dict') else item for item in obj], ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def employer_row(employer: Employer) -> tuple:
+    """Значения для EMPLOYER_UPSERT_SQL"""
+    # Конвертируем logo_urls в JSON если есть
+    logo_urls_json = None
+    if employer.logo_urls:
+        logo_urls_json = json.dumps(employer.logo_urls.dict())
+    
+    return (
+        employer.id,
+        employer.name,
+        employer.url,
+        employer.alternate_url,
+        logo_urls_json,
+        employer.vacancies_url,
+        employer.accredited_it_employer,
+        employer.trusted
+    )
+
+
+def prepare_vacancy_record(vacancy: Vacancy, raw_json: Optional[str] = None,
+                           content_hash: Optional[str] = None) -> dict:
+    """
+    Готовит все значения для записи вакансии (JSON поля, Markdown описания).
+    
+    Не обращается к БД, поэтому может выполняться в отдельном процессе.
+    """
+    fetched_at = vacancy.fetched_at or datetime.now()
+    
+    # Конвертируем HTML описания в Markdown
+    description_md = convert_html_to_markdown(vacancy.description) if vacancy.description else None
+    branded_description_md = convert_html_to_markdown(vacancy.branded_description) if vacancy.branded_description else None
+    skills = [skill.name for skill in vacancy.key_skills]
+    
+    row = (
+        vacancy.id,
+        vacancy.name,
+        vacancy.description,
+        description_md,
+        vacancy.branded_description,
+        branded_description_md,
+        vacancy.area.id,
+        vacancy.area.name,
+        vacancy.area.url if hasattr(vacancy.area, 'url') else None,
+        vacancy.salary.from_ if vacancy.salary else None,
+        vacancy.salary.to if vacancy.salary else None,
+        vacancy.salary.currency if vacancy.salary else None,
+        vacancy.salary.gross if vacancy.salary else None,
+        to_json(vacancy.salary_range),
+        vacancy.experience.id,
+        vacancy.experience.name,
+        vacancy.schedule.id,
+        vacancy.schedule.name,
+        vacancy.employment.id,
+        vacancy.employment.name,
+        vacancy.employer.id,
+        to_json(vacancy.address),
+        vacancy.type.id,
+        vacancy.type.name,
+        vacancy.billing_type.id if vacancy.billing_type else None,
+        vacancy.billing_type.name if vacancy.billing_type else None,
+        vacancy.alternate_url,
+        vacancy.apply_alternate_url,
+        vacancy.response_url,
+        to_json(vacancy.work_format),
+        to_json(vacancy.working_days),
+        to_json(vacancy.working_time_intervals),
+        to_json(vacancy.working_time_modes),
+        vacancy.allow_messages,
+        vacancy.show_contacts,
+        to_json(vacancy.contacts),
+        vacancy.response_letter_required,
+        vacancy.premium,
+        vacancy.archived,
+        vacancy.accept_handicapped,
+        vacancy.accept_kids,
+        to_json(vacancy.specializations),
+        to_json(vacancy.professional_roles),
+        vacancy.published_at,
+        vacancy.created_at,
+        vacancy.expires_at,
+        fetched_at,
+        to_json(vacancy.insider_interview),
+        to_json(vacancy.vacancy_constructor_template),
+        to_json(vacancy.relations),
+        to_json(vacancy.department),
+        raw_json,
+        content_hash,
+        fetched_at,
+        1,
+        json.dumps(skills, ensure_ascii=False)
+    )
+    
+    return {
+        'id': vacancy.id,
+        'row': row,
+        'skills': skills,
+        'employer': employer_row(vacancy.employer),
+    }
+
+
+def prepare_search_item_row(item: VacancySearchItem, raw_json: Optional[str] = None,
+                            fetched_at: Optional[datetime] = None) -> tuple:
+    """Значения для SEARCH_ITEM_UPSERT_SQL"""
+    fetched_at = fetched_at or datetime.now()
+    return (
+        item.id,
+        item.name,
+        item.area.id,
+        item.area.name,
+        item.area.url,
+        item.salary.from_ if item.salary else None,
+        item.salary.to if item.salary else None,
+        item.salary.currency if item.salary else None,
+        item.salary.gross if item.salary else None,
+        to_json(item.salary_range),
+        item.experience.id if item.experience else None,
+        item.experience.name if item.experience else None,
+        item.schedule.id if item.schedule else None,
+        item.schedule.name if item.schedule else None,
+        item.employment.id if item.employment else None,
+        item.employment.name if item.employment else None,
+        (item.employer or {}).get('id'),
+        to_json(item.address),
+        item.type.id if item.type else None,
+        item.type.name if item.type else None,
+        item.alternate_url,
+        item.apply_alternate_url,
+        item.response_url,
+        to_json(item.work_format),
+        to_json(item.working_days),
+        to_json(item.working_time_intervals),
+        to_json(item.working_time_modes),
+        item.show_contacts,
+        item.response_letter_required,
+        item.premium,
+        item.archived,
+        item.accept_handicapped,
+        item.accept_kids,
+        to_json(item.professional_roles),
+        item.published_at,
+        item.created_at,
+        fetched_at,
+        to_json(item.insider_interview),
+        to_json(item.relations),
+        to_json(item.department),
+        raw_json,
+        fetched_at,
+        0,
+        item.snippet.requirement if item.snippet else None,
+        item.snippet.responsibility if item.snippet else None
+    )
+
 
 class VacancyStorage:
-    def __init__(self, db_path: str = "vacancies.db"):
+    def __init__(self, db_path: str = "vacancies.db", batch_size: int = COMMIT_BATCH_SIZE,
+                 commit_interval: float = COMMIT_INTERVAL):
         self.db_path = db_path
+        # Работодатели, уже записанные за время жизни объекта: повторно их не пишем
+        self._saved_employer_ids: Set[str] = set()
+        # Одно долгоживущее соединение на объект, открывается при первом обращении
+        self._conn: Optional[sqlite3.Connection] = None
+        self._finalizer: Optional[weakref.finalize] = None
+        # Пачка сохранений в открытой транзакции: сколько записей и с какого момента (time.monotonic)
+        self.batch_size = max(1, batch_size)
+        self.commit_interval = commit_interval
+        self._pending = 0
+        self._pending_since = 0.0
+        # Таймер фиксации пачки: между сохранениями идут сетевые ожидания, и без него открытая транзакция
+        # держала бы блокировку записи, пока другие процессы с той же БД ждут ее до BUSY_TIMEOUT
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
         self.init_database()
     
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Соединение с БД, ждущее блокировку, пока пишут другие процессы (шарды одной очереди)"""
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT)
+            # WAL: читатели (дашборды, выгрузки) не ждут писателя; NORMAL - без fsync на каждый commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Хеш-шардирование очереди выполняется прямо в SQL
+            conn.create_function("shard_of", 2, shard_of, deterministic=True)
+            self._finalizer = weakref.finalize(self, close_connection, conn)
+            self._conn = conn
+        return self._conn
+    
+    def connect(self) -> sqlite3.Connection:
+        """
+        Соединение для операции со своей транзакцией (with self.connect() as conn):
+        накопленная пачка сохранений фиксируется заранее, чтобы откат операции ее не затронул
+        """
+        self.flush()
+        return self.connection
+    
+    def flush(self) -> None:
+        """Фиксирует накопленную пачку сохранений"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending or self._conn is None:
+            return
+        try:
+            self._conn.commit()
+        except sqlite3.Error:
+            self._conn.rollback()
+            # Работодатели откатанной пачки не записаны
+            self._saved_employer_ids.clear()
+            raise
+        finally:
+            self._pending = 0
+    
+    def close(self) -> None:
+        """Фиксирует пачку и закрывает соединение (следующее обращение откроет новое)"""
+        self.flush()
+        if self._finalizer is not None:
+            self._finalizer()
+            self._conn = self._finalizer = None
+    
+    def add_to_batch(self, count: int) -> None:
+        """Учитывает записи в пачке и фиксирует ее, когда набрано batch_size записей или прошло commit_interval"""
+        if not self._pending:
+            self._pending_since = time.monotonic()
+            self._flush_timer = call_later_in_loop(self.commit_interval, self.flush_on_timer)
+        self._pending += count
+        if self._pending >= self.batch_size or time.monotonic() - self._pending_since >= self.commit_interval:
+            self.flush()
+    
+    def flush_on_timer(self) -> None:
+        """Фиксация пачки по таймеру в цикле событий: ошибку некому передать, поэтому она пишется в лог"""
+        self._flush_timer = None
+        try:
+            self.flush()
+        except sqlite3.Error as e:
+            logger.error(f"Error committing batch of saves: {e}")
+    
     def init_database(self):
         """Создает таблицы базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             conn.executescript("""
                 CREATE TABLE IF NOT EXISTS employers (
                     id TEXT PRIMARY KEY,
@@ -96,6 +488,7 @@ class VacancyStorage:
                     -- Professional data
                     specializations TEXT,  -- JSON array
                     professional_roles TEXT,  -- JSON array
+                    key_skills TEXT,  -- JSON array названий навыков
                     
                     -- Timestamps
                     published_at TIMESTAMP,
@@ -112,6 +505,18 @@ class VacancyStorage:
                     -- Raw data backup
                     raw_json TEXT,
                     
+                    -- Change detection
+                    content_hash TEXT,  -- sha256 сырого ответа API
+                    last_seen_at TIMESTAMP,  -- Последний раз, когда вакансия была получена из API
+                    
+                    -- Lite-режим: строка из выдачи поиска, детали (описание, навыки) еще не загружены
+                    detail_fetched INTEGER DEFAULT 1,
+                    snippet_requirement TEXT,
+                    snippet_responsibility TEXT,
+                    
+                    -- Когда вакансия пропала из поиска и закрытие подтвердилось (archived = 1)
+                    closed_at TIMESTAMP,
+                    
                     FOREIGN KEY (employer_id) REFERENCES employers (id)
                 );
                 
@@ -123,192 +528,741 @@ class VacancyStorage:
                     UNIQUE(vacancy_id, skill_name)
                 );
                 
+                -- Состояние инкрементальной синхронизации ID по каждому поисковому запросу
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    query_key TEXT PRIMARY KEY,
+                    last_published_at TIMESTAMP,  -- Максимальный published_at среди найденных вакансий
+                    last_run_at TIMESTAMP
+                );
+                
+                -- Дневные снимки выдачи: отсортированные ID вакансий запроса за день (см. snapshots.py)
+                CREATE TABLE IF NOT EXISTS search_snapshots (
+                    query_name TEXT NOT NULL,
+                    day TEXT NOT NULL,  -- YYYY-MM-DD
+                    id_count INTEGER NOT NULL,
+                    ids BLOB NOT NULL,  -- сжатые разности отсортированных ID
+                    PRIMARY KEY (query_name, day)
+                );
+                
+                -- Справочники HH.ru: курсы валют из /dictionaries (rate - единиц валюты за 1 рубль)
+                -- и плоское дерево регионов из /areas (region_id - предок первого уровня под страной)
+                CREATE TABLE IF NOT EXISTS currencies (
+                    code TEXT PRIMARY KEY,
+                    abbr TEXT,
+                    name TEXT,
+                    rate REAL,
+                    in_use INTEGER,
+                    fetched_at TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS areas (
+                    id TEXT PRIMARY KEY,
+                    parent_id TEXT,
+                    name TEXT,
+                    region_id TEXT,
+                    country_id TEXT,
+                    depth INTEGER,
+                    fetched_at TIMESTAMP
+                );
+                
+                -- Чекпоинты сбора ID: параметры незавершенного обхода запроса,
+                -- завершенные страницы (срез + номер) и собранные с них вакансии
+                CREATE TABLE IF NOT EXISTS search_crawls (
+                    query_key TEXT PRIMARY KEY,
+                    params TEXT NOT NULL,  -- JSON базовых параметров поиска, зафиксированных при старте
+                    started_at TIMESTAMP
+                );
+                
+                CREATE TABLE IF NOT EXISTS search_pages (
+                    query_key TEXT NOT NULL,
+                    slice_key TEXT NOT NULL,  -- JSON параметров среза (регион, окно дат)
+                    page INTEGER NOT NULL,
+                    found INTEGER,
+                    pages INTEGER,
+                    fetched_at TIMESTAMP,
+                    PRIMARY KEY (query_key, slice_key, page)
+                );
+                
+                CREATE TABLE IF NOT EXISTS search_items (
+                    query_key TEXT NOT NULL,
+                    vacancy_id TEXT NOT NULL,
+                    name TEXT,
+                    published_at TEXT,
+                    PRIMARY KEY (query_key, vacancy_id)
+                );
+                
+                -- Очередь загрузки вакансий: pending -> in_progress -> done,
+                -- неудачи возвращаются в pending с отложенным next_attempt_at, после лимита попыток - dead
+                CREATE TABLE IF NOT EXISTS fetch_jobs (
+                    vacancy_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP,
+                    last_error TEXT,
+                    updated_at TIMESTAMP,
+                    lease_owner TEXT,  -- Процесс, выполняющий задачу (host:pid)
+                    lease_expires_at TIMESTAMP,  -- После этого задачу может забрать другой процесс
+                    priority REAL DEFAULT 0  -- Больше - раньше (см. priority.py)
+                );
+                
                 -- Индексы для быстрого поиска
+                CREATE INDEX IF NOT EXISTS idx_fetch_jobs_status ON fetch_jobs (status, next_attempt_at);
                 CREATE INDEX IF NOT EXISTS idx_vacancies_employer_id ON vacancies (employer_id);
                 CREATE INDEX IF NOT EXISTS idx_vacancies_area_id ON vacancies (area_id);
                 CREATE INDEX IF NOT EXISTS idx_vacancies_published_at ON vacancies (published_at);
                 CREATE INDEX IF NOT EXISTS idx_vacancy_skills_vacancy_id ON vacancy_skills (vacancy_id);
                 CREATE INDEX IF NOT EXISTS idx_vacancy_skills_skill_name ON vacancy_skills (skill_name);
             """)
+            added = self.migrate_columns(conn)
+            if ("vacancies", "key_skills") in added:
+                # Новая колонка навыков заполняется из vacancy_skills для уже загруженных вакансий
+                conn.execute("""
+                    UPDATE vacancies SET key_skills = (
+                        SELECT json_group_array(skill_name) FROM vacancy_skills WHERE vacancy_id = vacancies.id
+                    )
+                    WHERE detail_fetched = 1
+                """)
+            # Индекс по колонке, которая могла появиться только после миграции
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fetch_jobs_priority ON fetch_jobs (status, priority DESC)")
             logger.info("Database initialized successfully")
     
+    def migrate_columns(self, conn: sqlite3.Connection) -> Set[Tuple[str, str]]:
+        """Добавляет в существующие таблицы колонки, появившиеся в новых версиях схемы; возвращает добавленные"""
+        added = set()
+        for table, columns in MIGRATED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+                    logger.info(f"Added column {table}.{column}")
+                    added.add((table, column))
+        return added
+    
     def vacancy_exists(self, vacancy_id: str) -> bool:
         """Проверяет существование вакансии в базе"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.execute("SELECT 1 FROM vacancies WHERE id = ?", (vacancy_id,))
             return cursor.fetchone() is not None
     
     def save_employer(self, employer: Employer) -> None:
         """Сохраняет информацию о работодателе"""
-        with sqlite3.connect(self.db_path) as conn:
-            # Конвертируем logo_urls в JSON если есть
-            logo_urls_json = None
-            if employer.logo_urls:
-                logo_urls_json = json.dumps(employer.logo_urls.dict())
+        if employer.id in self._saved_employer_ids:
+            return
+        with self.connect() as conn:
+            conn.execute(EMPLOYER_UPSERT_SQL, employer_row(employer))
+        self._saved_employer_ids.add(employer.id)
+    
+    def save_vacancy(self, vacancy: Vacancy, raw_json: Optional[str] = None,
+                     content_hash: Optional[str] = None) -> None:
+        """Сохраняет вакансию в базу данных"""
+        try:
+            self.save_records([prepare_vacancy_record(vacancy, raw_json, content_hash)])
+        except Exception as e:
+            logger.error(f"Error saving vacancy {vacancy.id}: {e}")
+            raise
+    
+    def save_records(self, records: List[dict]) -> None:
+        """
+        Сохраняет подготовленные prepare_vacancy_record записи в текущую пачку
+        
+        Записи видны этому объекту сразу, а другим соединениям - после фиксации пачки (flush);
+        при ошибке откатываются только записи этого вызова.
+        """
+        # Сначала сохраняем работодателей, которых еще не писали (несколько раз одного в пачке - тоже один раз)
+        employer_rows = {}
+        for record in records:
+            employer_id = record['employer'][0]
+            if employer_id not in self._saved_employer_ids:
+                employer_rows.setdefault(employer_id, record['employer'])
+        
+        conn = self.connection
+        if not conn.in_transaction:
+            conn.execute("BEGIN")
+        # Точка сохранения внутри пачки: откат при ошибке не трогает уже сохраненные записи
+        conn.execute("SAVEPOINT save_records")
+        try:
+            conn.executemany(EMPLOYER_UPSERT_SQL, list(employer_rows.values()))
             
+            # Сохраняем всю информацию о вакансии; при повторной загрузке обновляем строку на месте
+            conn.executemany(VACANCY_UPSERT_SQL, [record['row'] for record in records])
+            
+            for record in records:
+                # Синхронизируем навыки: удаляем исчезнувшие и добавляем новые, не трогая остальные
+                vacancy_id = record['id']
+                new_skills = set(record['skills'])
+                old_skills = {row[0] for row in conn.execute(
+                    "SELECT skill_name FROM vacancy_skills WHERE vacancy_id = ?", (vacancy_id,)
+                )}
+                conn.executemany(
+                    "DELETE FROM vacancy_skills WHERE vacancy_id = ? AND skill_name = ?",
+                    [(vacancy_id, name) for name in old_skills - new_skills]
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO vacancy_skills (vacancy_id, skill_name) VALUES (?, ?)",
+                    [(vacancy_id, name) for name in new_skills - old_skills]
+                )
+                
+                logger.debug(f"Vacancy {vacancy_id} saved successfully with {len(new_skills)} skills")
+        except Exception:
+            conn.execute("ROLLBACK TO save_records")
+            conn.execute("RELEASE save_records")
+            raise
+        conn.execute("RELEASE save_records")
+        
+        # Запоминаем только после успешной записи
+        self._saved_employer_ids.update(employer_rows)
+        self.add_to_batch(len(records))
+    
+    def get_employers_to_enrich(self, ttl: timedelta, limit: Optional[int] = None) -> List[str]:
+        """ID работодателей без обогащения или с обогащением старше ttl (сначала самые частые)"""
+        with self.connect() as conn:
+            cursor = conn.execute("""
+                SELECT e.id
+                FROM employers e
+                LEFT JOIN vacancies v ON v.employer_id = e.id
+                WHERE e.enriched_at IS NULL OR e.enriched_at < ?
+                GROUP BY e.id
+                ORDER BY COUNT(v.id) DESC
+                LIMIT ?
+            """, (datetime.now() - ttl, -1 if limit is None else limit))
+            return [row[0] for row in cursor.fetchall()]
+    
+    def save_employer_details(self, employer_id: str, details: Optional[EmployerDetails]) -> None:
+        """Сохраняет данные обогащения; None - работодатель не найден, отмечаем попытку, чтобы не повторять до TTL"""
+        with self.connect() as conn:
+            if details is None:
+                conn.execute("UPDATE employers SET enriched_at = ? WHERE id = ?", (datetime.now(), employer_id))
+                return
             conn.execute("""
-                INSERT OR REPLACE INTO employers 
-                (id, name, url, alternate_url, logo_urls, vacancies_url, 
-                 accredited_it_employer, trusted)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                UPDATE employers SET
+                    name = ?, type = ?, site_url = ?, description = ?, area_id = ?, area_name = ?,
+                    industries = ?, open_vacancies = ?, enriched_at = ?
+                WHERE id = ?
             """, (
-                employer.id,
-                employer.name,
-                employer.url,
-                employer.alternate_url,
-                logo_urls_json,
-                employer.vacancies_url,
-                employer.accredited_it_employer,
-                employer.trusted
+                details.name,
+                details.type,
+                details.site_url,
+                details.description,
+                details.area.id if details.area else None,
+                details.area.name if details.area else None,
+                to_json(details.industries),
+                details.open_vacancies,
+                datetime.now(),
+                employer_id
             ))
     
-    def save_vacancy(self, vacancy: Vacancy, raw_json: Optional[str] = None) -> None:
-        """Сохраняет вакансию в базу данных"""
-        try:
-            # Сначала сохраняем работодателя
-            self.save_employer(vacancy.employer)
-            
-            with sqlite3.connect(self.db_path) as conn:
-                # Подготавливаем JSON данные
-                def to_json(obj):
-                    if obj is None:
-                        return None
-                    if hasattr(obj, 'dict'):
-                        return json.dumps(obj.dict(), ensure_ascii=False)
-                    if isinstance(obj, list):
-                        return json.dumps([item.dict() if hasattr(item, 'dict') else item for item in obj], ensure_ascii=False)
-                    return json.dumps(obj, ensure_ascii=False)
+    def save_search_items(self, items: List[dict]) -> int:
+        """
+        Сохраняет элементы выдачи поиска как вакансии без деталей (detail_fetched = 0)
+        
+        Returns:
+            Сколько элементов прошло валидацию и сохранено
+        """
+        now = datetime.now()
+        rows = []
+        employers = {}
+        for data in items:
+            try:
+                item = VacancySearchItem(**data)
+            except Exception as e:
+                logger.error(f"Validation error for search item {data.get('id')}: {e}")
+                continue
+            rows.append(prepare_search_item_row(item, json.dumps(data, ensure_ascii=False, default=str), now))
+            employer_id = (item.employer or {}).get('id')
+            if employer_id and employer_id not in self._saved_employer_ids:
+                try:
+                    employers.setdefault(employer_id, employer_row(Employer(**item.employer)))
+                except Exception as e:
+                    logger.warning(f"Skipping employer {employer_id} of search item {item.id}: {e}")
+        
+        with self.connect() as conn:
+            conn.executemany(EMPLOYER_UPSERT_SQL, list(employers.values()))
+            conn.executemany(SEARCH_ITEM_UPSERT_SQL, rows)
+        self._saved_employer_ids.update(employers)
+        return len(rows)
+    
+    def get_content_hash(self, vacancy_id: str) -> Optional[str]:
+        """Возвращает хеш последнего сохраненного ответа API для вакансии"""
+        # Чтение видит и незафиксированную пачку, поэтому фиксировать ее не нужно
+        cursor = self.connection.execute("SELECT content_hash FROM vacancies WHERE id = ?", (vacancy_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def touch_vacancy(self, vacancy_id: str) -> None:
+        """
+        Отмечает, что вакансия получена повторно без изменений (в текущей пачке).
+        fetched_at тоже сдвигается: детали актуальны на этот момент, и enqueue_stale_vacancies
+        не должна снова ставить вакансию в очередь как устаревшую
+        """
+        now = datetime.now()
+        self.connection.execute("UPDATE vacancies SET fetched_at = ?, last_seen_at = ? WHERE id = ?",
+                                (now, now, vacancy_id))
+        self.add_to_batch(1)
+    
+    def get_active_vacancy_ids(self) -> List[str]:
+        """ID вакансий, которые в БД еще не отмечены архивными"""
+        with self.connect() as conn:
+            cursor = conn.execute("SELECT id FROM vacancies WHERE archived IS NULL OR archived = 0")
+            return [row[0] for row in cursor.fetchall()]
+    
+    def count_active_vacancies(self) -> int:
+        """Количество вакансий, которые в БД еще не отмечены архивными"""
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM vacancies WHERE archived IS NULL OR archived = 0").fetchone()[0]
+    
+    def mark_vacancies_closed(self, vacancy_ids: List[str], closed_at: Optional[datetime] = None) -> None:
+        """Отмечает вакансии архивными; closed_at не перезаписывается, если уже установлен"""
+        closed_at = closed_at or datetime.now()
+        with self.connect() as conn:
+            conn.executemany(
+                "UPDATE vacancies SET archived = 1, closed_at = COALESCE(closed_at, ?) WHERE id = ?",
+                [(closed_at, vacancy_id) for vacancy_id in vacancy_ids]
+            )
+    
+    def save_dictionary(self, table: str, rows: List[tuple]) -> None:
+        """Заменяет содержимое справочника (currencies или areas) одной транзакцией"""
+        columns = DICTIONARY_COLUMNS[table]
+        fetched_at = datetime.now()
+        with self.connect() as conn:
+            conn.execute(f"DELETE FROM {table}")
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}, fetched_at) VALUES ({', '.join('?' * (len(columns) + 1))})",
+                [(*row, fetched_at) for row in rows]
+            )
+    
+    def get_dictionary_fetched_at(self, table: str) -> Optional[datetime]:
+        """Когда справочник загружался последний раз (None - ни разу)"""
+        if table not in DICTIONARY_COLUMNS:
+            raise ValueError(f"Unknown dictionary table {table!r}")
+        with self.connect() as conn:
+            row = conn.execute(f"SELECT MAX(fetched_at) FROM {table}").fetchone()
+            return datetime.fromisoformat(row[0]) if row and row[0] else None
+    
+    def save_search_snapshot(self, query_name: str, day: str, ids_blob: bytes, id_count: int) -> None:
+        """Сохраняет (заменяет) снимок выдачи запроса за день"""
+        with self.connect() as conn:
+            conn.execute("""
+                INSERT INTO search_snapshots (query_name, day, id_count, ids) VALUES (?, ?, ?, ?)
+                ON CONFLICT(query_name, day) DO UPDATE SET id_count = excluded.id_count, ids = excluded.ids
+            """, (query_name, day, id_count, ids_blob))
+    
+    def get_search_snapshots(self, query_name: str, start: Optional[str] = None,
+                             end: Optional[str] = None) -> List[Tuple[str, bytes]]:
+        """Снимки запроса за дни [start, end] по возрастанию дня"""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT day, ids FROM search_snapshots
+                WHERE query_name = ? AND day >= COALESCE(?, '') AND day <= COALESCE(?, '9999-12-31')
+                ORDER BY day
+            """, (query_name, start, end)).fetchall()
+    
+    def get_snapshot_queries(self) -> List[str]:
+        """Запросы, по которым есть снимки"""
+        with self.connect() as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT query_name FROM search_snapshots ORDER BY 1")]
+    
+    def get_sync_state(self, query_key: str) -> Optional[dict]:
+        """Возвращает водяной знак последней синхронизации для поискового запроса"""
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "SELECT last_published_at, last_run_at FROM sync_state WHERE query_key = ?",
+                (query_key,)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return {'last_published_at': row[0], 'last_run_at': row[1]}
+    
+    def save_sync_state(self, query_key: str, last_published_at: Optional[str], last_run_at: str) -> None:
+        """Сохраняет водяной знак синхронизации (published_at не откатывается назад)"""
+        with self.connect() as conn:
+            conn.execute("""
+                INSERT INTO sync_state (query_key, last_published_at, last_run_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(query_key) DO UPDATE SET
+                    last_published_at = COALESCE(excluded.last_published_at, sync_state.last_published_at),
+                    last_run_at = excluded.last_run_at
+            """, (query_key, last_published_at, last_run_at))
+    
+    def start_search_crawl(self, query_key: str, params: Dict[str, str]) -> Dict[str, str]:
+        """Начинает обход запроса или возвращает параметры уже начатого (незавершенного) обхода"""
+        with self.connect() as conn:
+            row = conn.execute("SELECT params FROM search_crawls WHERE query_key = ?", (query_key,)).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+            conn.execute(
+                "INSERT INTO search_crawls (query_key, params, started_at) VALUES (?, ?, ?)",
+                (query_key, json.dumps(params, ensure_ascii=False, sort_keys=True), datetime.now())
+            )
+            return params
+    
+    def get_search_pages(self, query_key: str) -> Dict[Tuple[str, int], Tuple[int, int]]:
+        """Завершенные страницы обхода: (срез, страница) -> (found, pages)"""
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "SELECT slice_key, page, found, pages FROM search_pages WHERE query_key = ?", (query_key,)
+            )
+            return {(slice_key, page): (found, pages) for slice_key, page, found, pages in cursor}
+    
+    def save_search_page(self, query_key: str, slice_key: str, page: int, found: int, pages: int,
+                         items: List[dict]) -> None:
+        """Сохраняет вакансии страницы и отметку о ее завершении одной транзакцией"""
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO search_items (query_key, vacancy_id, name, published_at) VALUES (?, ?, ?, ?)",
+                [(query_key, item['id'], item['name'], item.get('published_at')) for item in items]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO search_pages (query_key, slice_key, page, found, pages, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (query_key, slice_key, page, found, pages, datetime.now())
+            )
+    
+    def get_search_items(self, query_key: str) -> List[dict]:
+        """Вакансии, собранные обходом запроса"""
+        with self.connect() as conn:
+            cursor = conn.execute(
+                "SELECT vacancy_id, name, published_at FROM search_items WHERE query_key = ? "
+                "ORDER BY published_at DESC",
+                (query_key,)
+            )
+            return [{'id': row[0], 'name': row[1], 'published_at': row[2]} for row in cursor]
+    
+    def clear_search_crawl(self, query_key: str) -> None:
+        """Удаляет чекпоинты обхода после того, как его результат записан"""
+        with self.connect() as conn:
+            for table in ("search_items", "search_pages", "search_crawls"):
+                conn.execute(f"DELETE FROM {table} WHERE query_key = ?", (query_key,))
+    
+    def enqueue_fetch_jobs(self, jobs: Iterable[Union[str, dict]], refetch: bool = False,
+                           query_weights: Optional[Dict[str, float]] = None,
+                           batch_size: int = FETCH_JOBS_BATCH_SIZE) -> int:
+        """
+        Добавляет вакансии в очередь загрузки пачками, не держа весь список в памяти
+        
+        Args:
+            jobs: ID вакансий или словари {'id', 'published_at', 'queries'} (например, генератор по строкам CSV)
+            refetch: Вернуть в очередь и уже загруженные вакансии
+            query_weights: Веса поисковых запросов для расчета приоритета
+        
+        Returns:
+            Сколько задач стало ожидающими (новые и возвращенные в очередь; уже ожидающие не считаются)
+        """
+        if refetch:
+            sql = """
+                INSERT INTO fetch_jobs (vacancy_id, status, attempts, next_attempt_at, updated_at, priority)
+                VALUES (?, ?, 0, NULL, ?, ?)
+                ON CONFLICT(vacancy_id) DO UPDATE SET
+                    status = 'pending', attempts = 0, next_attempt_at = NULL,
+                    updated_at = excluded.updated_at, priority = excluded.priority
+                WHERE fetch_jobs.status != 'in_progress'
+            """
+        else:
+            # Выполненная задача возвращается в очередь, только если деталей вакансии нет (строка lite-режима)
+            sql = """
+                INSERT INTO fetch_jobs (vacancy_id, status, updated_at, priority)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(vacancy_id) DO UPDATE SET
+                    priority = excluded.priority,
+                    attempts = CASE WHEN excluded.status = 'pending' AND fetch_jobs.status = 'done'
+                                    THEN 0 ELSE fetch_jobs.attempts END,
+                    status = CASE WHEN excluded.status = 'pending' AND fetch_jobs.status = 'done'
+                                  THEN 'pending' ELSE fetch_jobs.status END
+                WHERE fetch_jobs.status != 'in_progress'
+            """
+        
+        queued = 0
+        jobs = iter(jobs)
+        with self.connect() as conn:
+            while True:
+                batch = [job if isinstance(job, dict) else {'id': job} for job in islice(jobs, batch_size)]
+                if not batch:
+                    break
                 
-                address_json = to_json(vacancy.address)
-                work_format_json = to_json(vacancy.work_format)
-                salary_range_json = to_json(vacancy.salary_range)
-                contacts_json = to_json(vacancy.contacts)
-                specializations_json = to_json(vacancy.specializations)
-                professional_roles_json = to_json(vacancy.professional_roles)
-                working_days_json = to_json(vacancy.working_days)
-                working_time_intervals_json = to_json(vacancy.working_time_intervals)
-                working_time_modes_json = to_json(vacancy.working_time_modes)
-                insider_interview_json = to_json(vacancy.insider_interview)
-                vacancy_constructor_template_json = to_json(vacancy.vacancy_constructor_template)
-                relations_json = to_json(vacancy.relations)
-                department_json = to_json(vacancy.department)
+                # Что уже известно о вакансиях пачки: дата публикации, время последней загрузки деталей
+                # и текущее состояние задачи в очереди
+                known = {}
+                job_status = {}
+                for start in range(0, len(batch), 500):
+                    chunk = [job['id'] for job in batch[start:start + 500]]
+                    placeholders = ', '.join('?' * len(chunk))
+                    known.update((row[0], row[1:]) for row in conn.execute(
+                        f"SELECT id, published_at, fetched_at, detail_fetched FROM vacancies "
+                        f"WHERE id IN ({placeholders})", chunk
+                    ))
+                    job_status.update(conn.execute(
+                        f"SELECT vacancy_id, status FROM fetch_jobs WHERE vacancy_id IN ({placeholders})", chunk
+                    ))
                 
-                # Конвертируем HTML описания в Markdown
-                description_md = convert_html_to_markdown(vacancy.description) if vacancy.description else None
-                branded_description_md = convert_html_to_markdown(vacancy.branded_description) if vacancy.branded_description else None
+                now = datetime.now()
+                rows = []
+                for job in batch:
+                    published_at, fetched_at, detail_fetched = known.get(job['id'], (None, None, 0))
+                    last_fetched_at = fetched_at if detail_fetched else None
+                    # Вакансии, загруженные до появления очереди, сразу считаются выполненными
+                    status = 'done' if last_fetched_at and not refetch else 'pending'
+                    priority = job_priority(job.get('published_at') or published_at, last_fetched_at,
+                                            job.get('queries') or (), query_weights)
+                    rows.append((job['id'], status, now, priority))
+                    
+                    # Итоговое состояние задачи по тем же правилам, что в ON CONFLICT
+                    previous = job_status.get(job['id'])
+                    if previous is None or (previous != 'in_progress' and refetch):
+                        current = status
+                    elif status == 'pending' and previous == 'done':
+                        current = 'pending'
+                    else:
+                        current = previous
+                    if current == 'pending' and previous != 'pending':
+                        queued += 1
+                    job_status[job['id']] = current
                 
-                # Сохраняем всю информацию о вакансии
+                conn.executemany(sql, rows)
+                conn.commit()
+        return queued
+    
+    def iter_vacancies_without_details(self, batch_size: int = FETCH_JOBS_BATCH_SIZE) -> Iterator[dict]:
+        """Строки lite-режима (id, published_at) порциями, не удерживая чтение БД между порциями"""
+        last_rowid = 0
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(
+                    "SELECT rowid, id, published_at FROM vacancies WHERE detail_fetched = 0 AND rowid > ? "
+                    "ORDER BY rowid LIMIT ?", (last_rowid, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            for _, vacancy_id, published_at in rows:
+                yield {'id': vacancy_id, 'published_at': published_at}
+    
+    def enqueue_missing_details(self, query_weights: Optional[Dict[str, float]] = None) -> int:
+        """Ставит в очередь загрузку деталей для всех строк lite-режима"""
+        return self.enqueue_fetch_jobs(self.iter_vacancies_without_details(), query_weights=query_weights)
+    
+    def enqueue_stale_vacancies(self, max_age: timedelta, limit: int,
+                                query_weights: Optional[Dict[str, float]] = None) -> int:
+        """Ставит на повторную загрузку до limit открытых вакансий, загруженных раньше max_age назад (сначала самые старые)"""
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT id, published_at FROM vacancies
+                WHERE detail_fetched = 1 AND (archived IS NULL OR archived = 0) AND fetched_at < ?
+                  AND id NOT IN (SELECT vacancy_id FROM fetch_jobs WHERE status IN ('pending', 'in_progress'))
+                ORDER BY fetched_at
+                LIMIT ?
+            """, (datetime.now() - max_age, limit)).fetchall()
+        jobs = [{'id': vacancy_id, 'published_at': published_at} for vacancy_id, published_at in rows]
+        return self.enqueue_fetch_jobs(jobs, refetch=True, query_weights=query_weights)
+    
+    def reset_stale_fetch_jobs(self) -> int:
+        """Возвращает в очередь задачи, аренда которых истекла (процесс-исполнитель завершился аварийно)"""
+        with self.connect() as conn:
+            now = datetime.now()
+            cursor = conn.execute("""
+                UPDATE fetch_jobs SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE status = 'in_progress' AND (lease_expires_at IS NULL OR lease_expires_at <= ?)
+            """, (now, now))
+            return cursor.rowcount
+    
+    def claim_fetch_jobs(self, limit: int, owner: Optional[str] = None, lease_ttl: float = 900.0,
+                         shard: Optional[Tuple[int, int]] = None) -> List[Tuple[str, float]]:
+        """
+        Атомарно забирает до limit готовых задач с наибольшим приоритетом в аренду
+        и переводит их в in_progress; возвращает пары (vacancy_id, priority)
+        
+        Args:
+            owner: Идентификатор процесса-исполнителя
+            lease_ttl: Срок аренды в секундах; задачи с истекшей арендой забираются повторно
+            shard: (k, n) - брать только задачи шарда k из n
+        """
+        now = datetime.now()
+        shard_sql = "AND shard_of(vacancy_id, ?) = ?" if shard else ""
+        shard_params = (shard[1], shard[0]) if shard else ()
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            jobs = conn.execute(f"""
+                SELECT vacancy_id, priority FROM fetch_jobs
+                WHERE ((status = 'pending' AND (next_attempt_at IS NULL OR next_attempt_at <= ?))
+                       OR (status = 'in_progress' AND lease_expires_at <= ?))
+                {shard_sql}
+                ORDER BY priority DESC, rowid
+                LIMIT ?
+            """, (now, now, *shard_params, limit)).fetchall()
+            conn.executemany(
+                "UPDATE fetch_jobs SET status = 'in_progress', attempts = attempts + 1, "
+                "lease_owner = ?, lease_expires_at = ?, updated_at = ? WHERE vacancy_id = ?",
+                [(owner, now + timedelta(seconds=lease_ttl), now, vacancy_id) for vacancy_id, _ in jobs]
+            )
+            conn.commit()
+            return [(vacancy_id, priority or 0.0) for vacancy_id, priority in jobs]
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def release_fetch_jobs(self, vacancy_ids: List[str]) -> None:
+        """Возвращает в очередь взятые, но не начатые задачи (попытка не засчитывается)"""
+        with self.connect() as conn:
+            conn.executemany(
+                "UPDATE fetch_jobs SET status = 'pending', attempts = MAX(attempts - 1, 0), "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE vacancy_id = ? AND status = 'in_progress'",
+                [(datetime.now(), vacancy_id) for vacancy_id in vacancy_ids]
+            )
+    
+    def complete_fetch_jobs(self, vacancy_ids: List[str]) -> None:
+        """Отмечает задачи выполненными"""
+        with self.connect() as conn:
+            now = datetime.now()
+            conn.executemany(
+                "UPDATE fetch_jobs SET status = 'done', next_attempt_at = NULL, last_error = NULL, "
+                "lease_owner = NULL, lease_expires_at = NULL, updated_at = ? WHERE vacancy_id = ?",
+                [(now, vacancy_id) for vacancy_id in vacancy_ids]
+            )
+    
+    def fail_fetch_jobs(self, failures: List[Tuple[str, str, bool]], max_attempts: int = 5,
+                        base_delay: float = 30.0) -> None:
+        """
+        Записывает неудачи: повторяемые откладываются на base_delay * 2^(attempts-1) секунд,
+        неповторяемые и исчерпавшие max_attempts переводятся в dead
+        
+        Args:
+            failures: Список (vacancy_id, текст ошибки, можно ли повторить)
+        """
+        if not failures:
+            return
+        now = datetime.now()
+        with self.connect() as conn:
+            attempts = dict(conn.execute(
+                f"SELECT vacancy_id, attempts FROM fetch_jobs WHERE vacancy_id IN ({', '.join('?' * len(failures))})",
+                [vacancy_id for vacancy_id, _, _ in failures]
+            ))
+            rows = []
+            for vacancy_id, error, retryable in failures:
+                job_attempts = attempts.get(vacancy_id, 1)
+                if retryable and job_attempts < max_attempts:
+                    delay = base_delay * 2 ** (max(job_attempts, 1) - 1)
+                    rows.append(('pending', now + timedelta(seconds=delay), error, now, vacancy_id))
+                else:
+                    rows.append(('dead', None, error, now, vacancy_id))
+            # Задачу, которую уже выполнил другой процесс, не откатываем
+            conn.executemany(
+                "UPDATE fetch_jobs SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE vacancy_id = ? AND status = 'in_progress'",
+                rows
+            )
+    
+    def get_next_fetch_attempt_at(self, shard: Optional[Tuple[int, int]] = None) -> Optional[datetime]:
+        """Время ближайшей отложенной попытки или окончания чужой аренды"""
+        shard_sql = "AND shard_of(vacancy_id, ?) = ?" if shard else ""
+        with self.connect() as conn:
+            row = conn.execute(f"""
+                SELECT MIN(CASE WHEN status = 'pending' THEN next_attempt_at ELSE lease_expires_at END)
+                FROM fetch_jobs WHERE status IN ('pending', 'in_progress') {shard_sql}
+            """, (shard[1], shard[0]) if shard else ()).fetchone()
+            return datetime.fromisoformat(row[0]) if row and row[0] else None
+    
+    def get_fetch_job_counts(self, shard: Optional[Tuple[int, int]] = None) -> Dict[str, int]:
+        """Число задач очереди (шарда) по статусам"""
+        shard_sql = "WHERE shard_of(vacancy_id, ?) = ?" if shard else ""
+        with self.connect() as conn:
+            return dict(conn.execute(
+                f"SELECT status, COUNT(*) FROM fetch_jobs {shard_sql} GROUP BY status",
+                (shard[1], shard[0]) if shard else ()
+            ))
+    
+    def merge_shard(self, shard_path: str) -> dict:
+        """
+        Переносит данные из БД шарда: вакансии (побеждает более свежий fetched_at) вместе с навыками,
+        работодателей (данные обогащения не затираются пустыми) и состояние очереди загрузки
+        """
+        # Таблицы шарда, созданного более старой версией схемы, приводим к текущей
+        VacancyStorage(shard_path)
+        
+        with self.connect() as conn:
+            conn.execute("ATTACH DATABASE ? AS shard", (shard_path,))
+            try:
+                def shared_columns(table: str) -> List[str]:
+                    main_columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+                    shard_columns = {row[1] for row in conn.execute(f"PRAGMA shard.table_info({table})")}
+                    return [column for column in main_columns if column in shard_columns]
+                
+                # Вакансии шарда, которые новее (или отсутствуют) в основной БД
+                conn.execute("DROP TABLE IF EXISTS temp.merged_ids")
                 conn.execute("""
-                    INSERT OR REPLACE INTO vacancies 
-                    (id, name, description, description_markdown, branded_description, branded_description_markdown, 
-                     area_id, area_name, area_url,
-                     salary_from, salary_to, salary_currency, salary_gross, salary_range,
-                     experience_id, experience_name, schedule_id, schedule_name,
-                     employment_id, employment_name, employer_id, address,
-                     type_id, type_name, billing_type_id, billing_type_name,
-                     alternate_url, apply_alternate_url, response_url,
-                     work_format, working_days, working_time_intervals, working_time_modes,
-                     allow_messages, show_contacts, contacts, response_letter_required,
-                     premium, archived, accept_handicapped, accept_kids,
-                     specializations, professional_roles,
-                     published_at, created_at, expires_at, fetched_at,
-                     insider_interview, vacancy_constructor_template, relations, department,
-                     raw_json)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 
-                            ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    vacancy.id,
-                    vacancy.name,
-                    vacancy.description,
-                    description_md,
-                    vacancy.branded_description,
-                    branded_description_md,
-                    vacancy.area.id,
-                    vacancy.area.name,
-                    vacancy.area.url if hasattr(vacancy.area, 'url') else None,
-                    vacancy.salary.from_ if vacancy.salary else None,
-                    vacancy.salary.to if vacancy.salary else None,
-                    vacancy.salary.currency if vacancy.salary else None,
-                    vacancy.salary.gross if vacancy.salary else None,
-                    salary_range_json,
-                    vacancy.experience.id,
-                    vacancy.experience.name,
-                    vacancy.schedule.id,
-                    vacancy.schedule.name,
-                    vacancy.employment.id,
-                    vacancy.employment.name,
-                    vacancy.employer.id,
-                    address_json,
-                    vacancy.type.id,
-                    vacancy.type.name,
-                    vacancy.billing_type.id if vacancy.billing_type else None,
-                    vacancy.billing_type.name if vacancy.billing_type else None,
-                    vacancy.alternate_url,
-                    vacancy.apply_alternate_url,
-                    vacancy.response_url,
-                    work_format_json,
-                    working_days_json,
-                    working_time_intervals_json,
-                    working_time_modes_json,
-                    vacancy.allow_messages,
-                    vacancy.show_contacts,
-                    contacts_json,
-                    vacancy.response_letter_required,
-                    vacancy.premium,
-                    vacancy.archived,
-                    vacancy.accept_handicapped,
-                    vacancy.accept_kids,
-                    specializations_json,
-                    professional_roles_json,
-                    vacancy.published_at,
-                    vacancy.created_at,
-                    vacancy.expires_at,
-                    vacancy.fetched_at or datetime.now(),
-                    insider_interview_json,
-                    vacancy_constructor_template_json,
-                    relations_json,
-                    department_json,
-                    raw_json
-                ))
+                    CREATE TEMP TABLE merged_ids AS
+                    SELECT s.id FROM shard.vacancies s
+                    LEFT JOIN main.vacancies m ON m.id = s.id
+                    WHERE m.id IS NULL OR s.fetched_at > m.fetched_at
+                """)
                 
-                # Удаляем старые навыки для этой вакансии
-                conn.execute("DELETE FROM vacancy_skills WHERE vacancy_id = ?", (vacancy.id,))
+                columns = shared_columns("employers")
+                conn.execute(f"""
+                    INSERT INTO main.employers ({", ".join(columns)})
+                    SELECT {", ".join(columns)} FROM shard.employers WHERE true
+                    ON CONFLICT(id) DO UPDATE SET
+                    {", ".join(f"{col} = COALESCE(excluded.{col}, employers.{col})" for col in columns if col != "id")}
+                """)
                 
-                # Сохраняем навыки
-                for skill in vacancy.key_skills:
-                    conn.execute("""
-                        INSERT INTO vacancy_skills (vacancy_id, skill_name)
-                        VALUES (?, ?)
-                    """, (vacancy.id, skill.name))
+                columns = shared_columns("vacancies")
+                conn.execute(f"""
+                    INSERT INTO main.vacancies ({", ".join(columns)})
+                    SELECT {", ".join(columns)} FROM shard.vacancies WHERE id IN (SELECT id FROM temp.merged_ids)
+                    ON CONFLICT(id) DO UPDATE SET
+                    {", ".join(f"{col} = excluded.{col}" for col in columns if col != "id")}
+                """)
                 
-                logger.info(f"Vacancy {vacancy.id} saved successfully with {len(vacancy.key_skills)} skills")
+                conn.execute("DELETE FROM main.vacancy_skills WHERE vacancy_id IN (SELECT id FROM temp.merged_ids)")
+                conn.execute("""
+                    INSERT OR IGNORE INTO main.vacancy_skills (vacancy_id, skill_name)
+                    SELECT vacancy_id, skill_name FROM shard.vacancy_skills
+                    WHERE vacancy_id IN (SELECT id FROM temp.merged_ids)
+                """)
                 
-        except Exception as e:
-            logger.error(f"Error saving vacancy {vacancy.id}: {e}")
-            raise
+                # Выполненная задача важнее любого другого состояния
+                columns = shared_columns("fetch_jobs")
+                conn.execute(f"""
+                    INSERT INTO main.fetch_jobs ({", ".join(columns)})
+                    SELECT {", ".join(columns)} FROM shard.fetch_jobs WHERE true
+                    ON CONFLICT(vacancy_id) DO UPDATE SET
+                    {", ".join(f"{col} = excluded.{col}" for col in columns if col != "vacancy_id")}
+                    WHERE excluded.status = 'done' AND fetch_jobs.status != 'done'
+                """)
+                
+                merged = conn.execute("SELECT COUNT(*) FROM temp.merged_ids").fetchone()[0]
+                conn.execute("DROP TABLE temp.merged_ids")
+                conn.commit()
+            except BaseException:
+                # Внутри открытой транзакции DETACH падает ("database shard is locked") и скрыл бы исходную ошибку
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE shard")
+        
+        logger.info(f"Merged {merged} vacancies from {shard_path}")
+        return {'vacancies': merged}
     
     def get_processed_vacancy_ids(self) -> List[str]:
         """Возвращает список уже обработанных ID вакансий"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.execute("SELECT id FROM vacancies")
             return [row[0] for row in cursor.fetchall()]
     
     def get_vacancy_count(self) -> int:
         """Возвращает количество сохраненных вакансий"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.execute("SELECT COUNT(*) FROM vacancies")
             return cursor.fetchone()[0]
     
     def get_employer_count(self) -> int:
         """Возвращает количество уникальных работодателей"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             cursor = conn.execute("SELECT COUNT(*) FROM employers")
             return cursor.fetchone()[0]
     
     def get_stats(self) -> dict:
         """Возвращает статистику базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.connect() as conn:
             stats = {}
             
             # Общее количество вакансий
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Поиск закрытых вакансий без перезапроса каждой из них.
+
+ID из свежего обхода поиска (CSV от extract_vacancy_ids.py по тем же запросам) сравниваются
+с активными вакансиями в БД как отсортированные массивы int64; детальный запрос делается только
+для пропавших из выдачи, чтобы подтвердить закрытие (404 или archived = true).
+"""
+import asyncio
+import csv
+import logging
+import time
+from datetime import datetime
+from typing import List, Optional
+import numpy as np
+
+from fetch_vacancies import VacancyFetcher, FetchError
+from log_setup import setup_logging
+from snapshots import to_id_array
+
+# Если из выдачи пропала большая доля активных вакансий, обход, скорее всего, был неполным
+SUSPICIOUS_DISAPPEARED_SHARE = 0.5
+
+
+def find_disappeared_ids(active_ids: np.ndarray, crawl_ids: np.ndarray) -> np.ndarray:
+    """Активные в БД ID, которых нет в свежем обходе (оба массива отсортированы и уникальны)"""
+    return np.setdiff1d(active_ids, crawl_ids, assume_unique=True)
+
+
+def read_crawl_ids(csv_file: str) -> np.ndarray:
+    """ID из первой колонки CSV обхода поиска"""
+    with open(csv_file, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # заголовок
+        return to_id_array(row[0].strip() for row in reader if row)
+
+
+class ArchivedSweeper:
+    def __init__(self, fetcher: VacancyFetcher, concurrency: int = 4):
+        # Запросы, повторы и регулятор частоты - общие с загрузчиком вакансий
+        self.fetcher = fetcher
+        self.storage = fetcher.storage
+        self.concurrency = max(1, concurrency)
+        self.logger = logging.getLogger(__name__)
+
+    async def confirm(self, vacancy_id: str) -> Optional[bool]:
+        """True - вакансия закрыта, False - еще открыта, None - проверить не удалось"""
+        try:
+            data = await self.fetcher.fetch_vacancy(vacancy_id)
+        except FetchError as e:
+            if e.status_code == 404:
+                # Удаленная вакансия отдает 404
+                return True
+            self.logger.error(f"Could not confirm vacancy {vacancy_id}: {e}")
+            return None
+        return bool(data.get('archived'))
+
+    async def run(self, crawl_csv: str, max_confirm: Optional[int] = None) -> dict:
+        """Сравнивает обход с БД и подтверждает закрытие пропавших вакансий"""
+        start_time = time.time()
+        crawl_ids = read_crawl_ids(crawl_csv)
+        active_ids = to_id_array(self.storage.get_active_vacancy_ids())
+        disappeared = find_disappeared_ids(active_ids, crawl_ids)
+
+        self.logger.info(f"Crawl has {len(crawl_ids)} IDs, database has {len(active_ids)} active vacancies, "
+                         f"{len(disappeared)} disappeared from search")
+        if len(active_ids) and len(disappeared) / len(active_ids) > SUSPICIOUS_DISAPPEARED_SHARE:
+            self.logger.warning(f"{len(disappeared) / len(active_ids):.0%} of active vacancies are missing "
+                                f"from the crawl - was it run with the same queries?")
+        if max_confirm is not None and len(disappeared) > max_confirm:
+            self.logger.info(f"Confirming only {max_confirm} of them")
+            disappeared = disappeared[:max_confirm]
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for vacancy_id in disappeared:
+            queue.put_nowait(str(vacancy_id))
+        closed: List[str] = []
+        still_open: List[str] = []
+        unknown: List[str] = []
+
+        async def worker():
+            while True:
+                try:
+                    vacancy_id = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                result = await self.confirm(vacancy_id)
+                if result is None:
+                    unknown.append(vacancy_id)
+                elif result:
+                    closed.append(vacancy_id)
+                else:
+                    still_open.append(vacancy_id)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(disappeared)))))
+
+        self.storage.mark_vacancies_closed(closed, datetime.now())
+        for vacancy_id in still_open:
+            self.storage.touch_vacancy(vacancy_id)
+
+        stats = {'crawl': len(crawl_ids), 'active': len(active_ids), 'checked': len(disappeared),
+                 'closed': len(closed), 'still_open': len(still_open), 'unknown': len(unknown)}
+        self.logger.info(f"Sweep completed in {time.time() - start_time:.1f}s: {stats}")
+        self.logger.info(f"Rate limiter: {self.fetcher.rate_limiter.stats()}")
+        return stats
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Mark vacancies that disappeared from a fresh search crawl as archived')
+    parser.add_argument('crawl_csv', help='CSV from a fresh extract_vacancy_ids.py run with the same queries')
+    parser.add_argument('--db', default='vacancies.db', help='SQLite database path')
+    parser.add_argument('--concurrency', type=int, default=4, help='Number of parallel confirmation requests')
+    parser.add_argument('--rps', type=float, default=1.0, help='Initial requests-per-second rate')
+    parser.add_argument('--max-rps', type=float, default=20.0, help='Upper bound for the adaptive request rate')
+    parser.add_argument('--max-confirm', type=int, help='Confirm at most this many disappeared vacancies')
+    parser.add_argument('--log-level', default='INFO', help='Logging level')
+
+    args = parser.parse_args()
+
+    setup_logging(args.log_level)
+
+    # Подтверждающие ответы в кеш сырых ответов не пишем
+    async with VacancyFetcher(None, args.db, concurrency=args.concurrency, rps=args.rps,
+                              max_rps=args.max_rps, cache_dir=None) as fetcher:
+        await ArchivedSweeper(fetcher, args.concurrency).run(args.crawl_csv, args.max_confirm)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,12 +4,16 @@
 """
 
 import json
+import logging
 import time
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 import pandas as pd
 from openai import OpenAI
 
+# Строки о каждой вакансии и каждом запросе к API - на уровне DEBUG (--verbose)
+logger = logging.getLogger(__name__)
+
 
 class TechnologyExtractor:
     """Извлекает технологические стеки и характеристики компаний из вакансий с помощью LLM."""
@@ -199,7 +203,7 @@ class TechnologyExtractor:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                print(f"Отправляю запрос к {self.model} (попытка {attempt + 1}/{max_retries})...")
+                logger.debug(f"Отправляю запрос к {self.model} (попытка {attempt + 1}/{max_retries})...")
                 
                 response = self.client.chat.completions.create(
                     extra_headers={
@@ -221,7 +225,7 @@ class TechnologyExtractor:
                 if response.choices and response.choices[0].message:
                     llm_response = response.choices[0].message.content
                     if llm_response:
-                        print(f"Получен ответ длиной {len(llm_response)} символов")
+                        logger.debug(f"Получен ответ длиной {len(llm_response)} символов")
                     else:
                         print("Получен пустой ответ от модели")
                         continue
@@ -233,7 +237,7 @@ class TechnologyExtractor:
                 extracted_data = self.parse_llm_response(llm_response)
                 
                 if extracted_data:
-                    print(f"Успешно извлечено {len(extracted_data)} записей")
+                    logger.debug(f"Успешно извлечено {len(extracted_data)} записей")
                     return extracted_data
                 else:
                     print(f"Не удалось извлечь данные из ответа (попытка {attempt + 1})")
@@ -318,7 +322,7 @@ class TechnologyExtractor:
                 
                 validated_data.append(validated_item)
             
-            print(f"Валидировано {len(validated_data)} из {len(data)} записей")
+            logger.debug(f"Валидировано {len(validated_data)} из {len(data)} записей")
             return validated_data
             
         except json.JSONDecodeError as e:
@@ -382,7 +386,7 @@ class TechnologyExtractor:
             batch_data = []
             for _, row in batch_df.iterrows():
                 row_dict = row.to_dict()
-                print(f"Обрабатываю vacancy_id: {row_dict.get('id', 'Unknown')}")
+                logger.debug(f"Обрабатываю vacancy_id: {row_dict.get('id', 'Unknown')}")
                 batch_data.append(row_dict)
             
             # Извлекаем данные через LLM с актуальными категориями
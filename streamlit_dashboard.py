@@ -3,6 +3,11 @@ import pandas as pd
 import plotly.express as px
 import json, ast
 import numpy as np
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "src"))
+from dictionaries import load_area_tree, load_currency_rates
 
 st.set_page_config(page_title="DS Analytics Dashboard", layout="wide")
 st.title("DS Analytics Dashboard — Streamlit")
@@ -84,14 +89,14 @@ DS_COLUMNS = {
 # Salary normalization (quick version)
 @st.cache_data(show_spinner=False)
 def normalize_salary(df: pd.DataFrame) -> pd.DataFrame:
-    rates = {"RUR": 1, "RUB": 1, "USD": 95, "EUR": 105, "KZT": 0.2, "UZS": 0.0075,
-             "BYR": 0.035, "UAH": 2.5, "KGS": 1.1, "AZN": 55}
+    # rates from the HH dictionaries cache (src/dictionaries.py), fixed fallback rates without it
+    rates = load_currency_rates()
     d = df.copy()
     if not {"salary_from", "salary_to", "salary_currency", "salary_gross"}.issubset(d.columns):
         d["salary_from_rub"] = np.nan
         d["salary_to_rub"] = np.nan
         return d
-    cur = d["salary_currency"].fillna("RUR").map(rates).fillna(1)
+    cur = rates.rates_for(d["salary_currency"])
     d["salary_from_rub"] = d["salary_from"].fillna(0) * cur
     d["salary_to_rub"] = d["salary_to"].fillna(0) * cur
     gross_mask = d.get("salary_gross", 0).fillna(0).astype(float) == 1.0
@@ -104,6 +109,21 @@ def normalize_salary(df: pd.DataFrame) -> pd.DataFrame:
 
 df = normalize_salary(df)
 
+
+# Cities rolled up to first-level regions
+@st.cache_data(show_spinner=False)
+def add_regions(df: pd.DataFrame) -> pd.DataFrame:
+    # area tree from the HH dictionaries cache (src/dictionaries.py); without it region = city
+    tree = load_area_tree()
+    d = df.copy()
+    if "area_name" in d.columns:
+        names = d["area_name"]
+        d["region_name"] = pd.Series(tree.region_names(names.fillna("")), index=d.index).where(names.notna())
+    return d
+
+
+df = add_regions(df)
+
 # ---------- Sidebar Filters ----------
 with st.sidebar:
     st.subheader("Фильтры")
@@ -124,9 +144,11 @@ with st.sidebar:
     # Basic filters section
     with st.expander("Базовые фильтры", expanded=True):
         area_vals = sorted([v for v in df.get("area_name", pd.Series(dtype=str)).dropna().unique()])
+        region_vals = sorted([v for v in df.get("region_name", pd.Series(dtype=str)).dropna().unique()])
         experience_vals = sorted([v for v in df.get("experience_name", pd.Series(dtype=str)).dropna().unique()])
         employer_vals = sorted([v for v in df.get("employer_name", pd.Series(dtype=str)).dropna().unique()][:100])  # Limit for performance
 
+        region_sel = st.multiselect("Регион", region_vals)
         area_sel = st.multiselect("География", area_vals)
         exp_sel = st.multiselect("Опыт работы", experience_vals)
         employer_sel = st.multiselect("Компания", employer_vals)
@@ -193,6 +215,7 @@ def apply_filters(df: pd.DataFrame, **filters) -> pd.DataFrame:
     
     # Simple string filters
     for field, values in [
+        ("region_name", filters.get("region_sel", [])),
         ("area_name", filters.get("area_sel", [])),
         ("experience_name", filters.get("exp_sel", [])),
         ("employer_name", filters.get("employer_sel", []))
@@ -241,6 +264,7 @@ def apply_filters(df: pd.DataFrame, **filters) -> pd.DataFrame:
 # Apply all filters
 filtered = apply_filters(
     df,
+    region_sel=region_sel,
     area_sel=area_sel,
     exp_sel=exp_sel, 
     employer_sel=employer_sel,
@@ -356,6 +380,11 @@ with tabs[1]:  # География
             st.write("**Топ-5 городов:**")
             for i, (city, count) in enumerate(vc.head(5).items()):
                 st.write(f"{i+1}. {city}: **{count}** вакансий")
+    
+    vc_region = build_value_counts(filtered, "region_name", 20)
+    if len(vc_region):
+        fig = px.bar(x=vc_region.values, y=vc_region.index, orientation="h", title="Вакансии по регионам")
+        st.plotly_chart(fig, use_container_width=True)
 
 with tabs[2]:  # Технические навыки
     st.subheader("Технические навыки и языки программирования")